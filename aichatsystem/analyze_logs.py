@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Report latency percentiles, throughput and regressions of replies from the system log files.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import utilities.log_analysis_utilities as analysis_util
+import utilities.startup_utilities as startup_util
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+def parse_date(text: str) -> datetime:
+    """
+    Parse the date of the command line argument.
+
+    Args:
+        text(str): The date. (ex. '2024-06-01' or '2024-06-01 12:00')
+
+    Returns:
+        datetime: The date.
+    """
+    return datetime.fromisoformat(text)
+
+
+def load_replies(args: argparse.Namespace, since: datetime | None, until: datetime | None) -> Iterator[dict[str, Any]]:
+    """
+    Read the replies in the range from the log files.
+
+    Args:
+        args(argparse.Namespace): The command line arguments.
+        since(datetime | None): The start of the range.
+        until(datetime | None): The end of the range.
+
+    Returns:
+        Iterator[dict[str, Any]]: The replies.
+    """
+    file_names = sorted(Path(args.log_dir).glob(args.pattern), key=analysis_util.log_file_key)
+    replies = analysis_util.iter_replies(analysis_util.iter_log_lines(file_names))
+    return analysis_util.filter_replies(replies, since, until)
+
+
+if __name__ == '__main__':
+    startup_util.profile_if_requested()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(startup_util.PROFILE_FLAG, action='store_true', help='Report the startup time per module.')
+    parser.add_argument('--log-dir', default='./log_files/system', help='The directory of log files.')
+    parser.add_argument('--pattern', default='*.log*', help='The glob pattern of log files and segments.')
+    parser.add_argument('--format', choices=('table', 'csv'), default='table', help='The output format.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    summary_parser = subparsers.add_parser('summary', help='Percentiles of latency per group.')
+    summary_parser.add_argument('--group-by', choices=('llm', 'model', 'speaker'), help='The key to group by.')
+    summary_parser.add_argument('--since', type=parse_date, help='The start date. (ex. 2024-06-01)')
+    summary_parser.add_argument('--until', type=parse_date, help='The end date (exclusive).')
+
+    throughput_parser = subparsers.add_parser('throughput', help='Replies per hour.')
+    throughput_parser.add_argument('--since', type=parse_date, help='The start date. (ex. 2024-06-01)')
+    throughput_parser.add_argument('--until', type=parse_date, help='The end date (exclusive).')
+
+    compare_parser = subparsers.add_parser('compare', help='Regressions between two date ranges.')
+    compare_parser.add_argument('--before', type=parse_date, nargs=2, required=True, metavar=('START', 'END'))
+    compare_parser.add_argument('--after', type=parse_date, nargs=2, required=True, metavar=('START', 'END'))
+    compare_parser.add_argument('--group-by', choices=('llm', 'model', 'speaker'), help='The key to group by.')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='The relative increase of regression.')
+    args = parser.parse_args()
+
+    if args.command == 'summary':
+        rows = analysis_util.summarize(load_replies(args, args.since, args.until), args.group_by)
+    elif args.command == 'throughput':
+        rows = analysis_util.throughput_per_hour(load_replies(args, args.since, args.until))
+    else:
+        before = analysis_util.summarize(load_replies(args, *args.before), args.group_by)
+        after = analysis_util.summarize(load_replies(args, *args.after), args.group_by)
+        rows = analysis_util.compare(before, after, args.threshold)
+
+    if args.format == 'csv':
+        analysis_util.write_csv(rows, sys.stdout)
+    else:
+        print(analysis_util.format_table(rows))
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""
+Build the pre-encoded opus cache of fixed clips (ex. fillers).
+"""
+
+import argparse
+
+import utilities.opus_cache_utilities as opus_util
+import utilities.startup_utilities as startup_util
+
+if __name__ == '__main__':
+    startup_util.profile_if_requested()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(startup_util.PROFILE_FLAG, action='store_true', help='Report the startup time per module.')
+    parser.add_argument('--source-dir', default='./sound_files/filler/nojyaloli/', help='The directory of wav files.')
+    parser.add_argument('--cache-dir', default='./sound_files/opus_cache/', help='The cache directory.')
+    args = parser.parse_args()
+
+    keys = opus_util.build_cache(args.source_dir, args.cache_dir)
+    print(f'{len(keys)} clips encoded: {", ".join(keys)}')
@@ -3,12 +3,30 @@
 The console chat.
 """
 
+import asyncio
 import os
+from functools import partial
+
+import utilities.pipeline_utilities as pipeline_util
+import utilities.provider_utilities as provider_util
+import utilities.startup_utilities as startup_util
+
+
+def show_text(texts: list[str], txt: str) -> None:
+    """
+    Print the text as it arrives, and keep it.
+
+    Args:
+        texts (list[str]): The texts so far.
+        txt (str): The text of the chunk.
+    """
+    texts.append(txt)
+    print(txt, end='', flush=True)
+    return
 
-from llm.gemini_wrapper import GeminiWrapper
-from llm.openai_wrapper import OpenAIWrapper
 
 if __name__ == '__main__':
+    startup_util.profile_if_requested()
     PROMPT_LOG_NAME = './log_files/prompt/prompt_log.csv'
     SYSTEM_PROMPT_NAME = './prompt_files/system/consolechat.csv'
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
@@ -24,13 +42,16 @@ if __name__ == '__main__':
             break
         if use_ai == 'openai':
             init_config = {}
-            LLM_client = OpenAIWrapper(OPENAI_API_KEY, init_config, PROMPT_LOG_NAME)
+            with startup_util.phase('make LLM client'):
+                LLM_client = provider_util.get_llm_class(use_ai)(OPENAI_API_KEY, init_config, PROMPT_LOG_NAME)
             break
         elif use_ai == 'gemini':
             init_config = {}
-            LLM_client = GeminiWrapper(GEMINI_API_KEY, init_config, PROMPT_LOG_NAME)
+            with startup_util.phase('make LLM client'):
+                LLM_client = provider_util.get_llm_class(use_ai)(GEMINI_API_KEY, init_config, PROMPT_LOG_NAME)
             break
 
+    startup_util.ready()
     while not is_exit:
         question = input('\nAIに聞きたい内容を入力してください（終了時は"exit"と入力）\n\n')  # noqa: RUF001
         # NOTE: Japanese sentence, so use Full-width letter.
@@ -55,15 +76,23 @@ if __name__ == '__main__':
 
         system_prompt = LLM_client.load_prompt(SYSTEM_PROMPT_NAME)
         response, prompt = LLM_client.get_chat_response(question, llm_config, system_prompt)
+        print('\n============ Answer ============\n')
         if not streaming:
             text = LLM_client.read_text(response)
+            print(text, end='')
         else:
-            text = ''
-            for chunk in response:
-                text = text + LLM_client.read_text(chunk)
+            texts = []
+            pipeline = pipeline_util.Pipeline(
+                [
+                    pipeline_util.Source('llm', response),
+                    pipeline_util.Map('read', LLM_client.read_text),
+                    pipeline_util.Sink('print', partial(show_text, texts)),
+                ],
+            )
+            asyncio.run(pipeline.run())
+            text = ''.join(texts)
 
-        print('\n============ Answer ============\n')
-        print(f'{text}\n')
+        print('\n')
         print('================================')
 
         LLM_client.save_assistant_response(text)
@@ -8,83 +8,430 @@ The discord bot.
 from __future__ import annotations
 
 import asyncio
-import copy
 import os
-import random
+import signal
 import time
-from typing import Any
+from contextlib import suppress
+from typing import TYPE_CHECKING, Any
 
 import discord  # pip install discord.py[voice]
-import ffmpeg  # pip install ffmpeg-python
+import utilities.benchmark_utilities as bench_util
+import utilities.chunking_utilities as chunk_util
+import utilities.config_utilities as config_util
+import utilities.debounce_utilities as debounce_util
+import utilities.discord_text_utilities as text_reply_util
+import utilities.discord_voice_utilities as voice_util
+import utilities.latency_utilities as latency_util
 import utilities.log_utilities as log_util
+import utilities.memory_utilities as memory_util
+import utilities.metrics_utilities as metrics_util
+import utilities.opus_cache_utilities as opus_util
+import utilities.pipeline_utilities as pipeline_util
+import utilities.profiler_utilities as profiler_util
+import utilities.provider_utilities as provider_util
+import utilities.session_utilities as session_util
+import utilities.shard_utilities as shard_util
 import utilities.sound_utilities as sound_util
-import utilities.text_utilities as text_util
+import utilities.startup_utilities as startup_util
+import utilities.trace_utilities as trace_util
+import utilities.watchdog_utilities as watchdog_util
+import utilities.worker_utilities as worker_util
 from discord.ext import commands  # pip install discord.py[voice]
-from llm.gemini_wrapper import GeminiWrapper
-from llm.openai_wrapper import OpenAIWrapper
 from systemlogger import discord_logger
-from tts.voicevox_wrapper import VoicevoxWrapper
-
-# Common Config
-SOUND_DEBUG = False
-SYSTEM_LOG = True
-
-# Discord Config
-DISCORD_API_KEY = os.getenv('DISCORD_API_KEY')
-TARGET_TEXT_CHANNEL = 'bot操作用（ミュート推奨）'  # noqa: RUF001
-TARGET_VOICE_CHANNEL = '雑談ボイチャ'
-COMMAND_PREFIX = '*'
-
-# LLM Config
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-GEMINI_API_KEY = os.getenv('GOOGLE_GEMINI_API_KEY')
-LLM_CONFIG = {}
-LLM_CONFIG['use_llm'] = 'openai'
-LLM_CONFIG['use_model'] = 'gpt-4o'
-
-# TTS Config
-TTS_HOST_IP = '192.168.100.211'
-TTS_PORT = '50021'
-TTS_CONFIG = {}
-TTS_CONFIG['use_tts'] = 'voicevox'
-TTS_CONFIG['speaker_ID'] = 46  # Sayo
-TTS_CONFIG['speedScale'] = 1.2
-TTS_CONFIG['volumeScale'] = 0.4
-
-# FFmpeg Config
-FADE_LEN = 0.1
-
-# Character Config Value
-USE_PROMPT_LOG = True
-USE_FILLER = False
-PROMPT_LOG_NAME = './log_files/prompt/prompt_log.csv'
-CHARACTER_PROMPT_NAME = './prompt_files/character/nojyaloli.csv'
-SYSTEM_PROMPT_NAME = './prompt_files/system/voicechat.csv'
 
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+# Config File
+CONFIG_FILE_NAME = os.getenv('AICHAT_CONFIG', './configs/sample_config.yaml')
+# NOTE: Discord, LLM, TTS, FFmpeg and character settings are read from the config file.
+#       The file is watched, and new LLM and TTS settings are used from the next turn.
+
+# Chunking Config
+CHUNKING_POLICY = 'adaptive'  # 'sentence' or 'adaptive'
+FIRST_CHUNK_LEN = 15
+MAX_CHUNK_LEN = 120
+# NOTE: The first chunk is cut short to start speaking early,
+#       and later segments are merged while the voice stream has enough backlog.
+
+# Pipeline Config
+TTS_CONCURRENCY = 2
+PIPELINE_BUFFER_SIZE = 4
+# NOTE: Voice is generated by the pipeline of LLM -> segment -> tts -> decode -> playback.
+#       TTS of the next segments runs while the previous segment is decoded, and clips are played in order.
+
+# Text Reply Config
+STREAM_TEXT_REPLY = True
+TEXT_EDIT_INTERVAL = 1.0  # sec
+# NOTE: Without voice, the reply is posted at the first LLM tokens and edited as the text grows.
+#       Edits are coalesced to once per TEXT_EDIT_INTERVAL to keep under the rate limit of discord.
+
+# Shard Config
+USE_AUTO_SHARDING = False
+# NOTE: Run launch_shards.py to split shards over multiple processes.
+#       The shard settings are passed by the environment variables. (see shard_utilities)
+
+# Debounce Config
+USE_DEBOUNCE = True
+DEBOUNCE_QUIET_PERIOD = 1.5  # sec
+DEBOUNCE_MAX_WAIT = 6.0  # sec
+USE_TYPING_EARLY_START = True
+TYPING_QUIET_PERIOD = 0.6  # sec
+TYPING_WAIT = 5.0  # sec
+# NOTE: Quick messages of the same user are merged into one question.
+#       With USE_TYPING_EARLY_START, the answer starts TYPING_QUIET_PERIOD after the last message
+#       unless the user starts typing again. Discord has no typing-stop event, so no typing event means stopped.
+
+# Worker Config
+GUILD_QUEUE_SIZE = 4
+OVERLOAD_POLICY = 'drop_oldest'  # 'drop_oldest', 'merge' or 'reply_busy'
+MAX_CONCURRENT_TURNS = 4
+MAX_CONCURRENT_TTS = 2
+# NOTE: Each guild has its own worker and queue, so a slow guild does not block other guilds.
+#       LLM and TTS requests run in threads, and the number of them at the same time is limited.
+#       Each guild has its own prompt log (ex. prompt_log.<guild ID>.csv), so the conversation histories of
+#       the turns at the same time do not interleave.
+
+# Log Config
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_COMPRESSION = 'gzip'  # 'gzip', 'zstd' or None
+LOG_MAX_AGE = None  # sec
+LOG_RETENTION_DAYS = 30
+# NOTE: Log files over LOG_MAX_BYTES or LOG_MAX_AGE are rotated to numbered segments and compressed in the background.
+#       The system log is switched to the file of the new date at midnight.
+#       Files older than LOG_RETENTION_DAYS are removed when a file is opened, and every hour.
+USE_TRACE = True
+TRACE_DIR = './log_files/trace'
+TOKEN_TRACE_DIR = None  # ex. './log_files/token_trace'
+# NOTE: With TOKEN_TRACE_DIR, the LLM text chunks of voice replies are saved with their timings,
+#       to replay them with benchmarks/bench_pipeline.py.
+USE_METRICS = True
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9100
+# NOTE: Metrics are served at http://METRICS_HOST:METRICS_PORT/metrics in Prometheus text format.
+#       The bot process of shards uses METRICS_PORT + the process index.
+
+# Profile Config
+PROFILE_DIR = './log_files/profile'
+PROFILE_INTERVAL = 0.1  # sec
+PROFILE_MAX_SECONDS = 300
+PROFILE_SIGNAL = 'SIGUSR2'  # None to disable
+PROFILE_SIGNAL_SECONDS = 30
+# NOTE: '*profile <seconds>' by the bot owner, or the signal (ex. kill -USR2 <pid>), samples all threads.
+#       The collapsed stacks are written to PROFILE_DIR, and the hot functions are posted to the control channel.
+#       The control channel is DISCORD.CONTROL_TXTCHANNEL_ID of the config. If 0, the result of the command is
+#       posted to the channel of the command, and the result of the signal is only logged.
+
+# Watchdog Config
+USE_LOOP_WATCHDOG = True
+LOOP_BLOCK_THRESHOLD = 0.1  # sec
+LOOP_WATCHDOG_INTERVAL = 0.05  # sec
+# NOTE: The event loop stalls over LOOP_BLOCK_THRESHOLD are logged with the blocking function and the stack,
+#       and counted by the call site in the metrics. (ex. requests.post() of TTS called in a coroutine)
+
+# Memory Config
+MEMORY_DIR = './log_files/memory'
+MEMORY_TOP = 5
+TRACEMALLOC_FRAMES = 10
+USE_TRACEMALLOC = False
+MEMORY_SNAPSHOT_INTERVAL = None  # sec, ex. 3600
+# NOTE: '*memory' by the bot owner takes the tracemalloc snapshot, and posts the growth since the last
+#       snapshot by allocation site and subsystem to the control channel. '*memory stop' stops tracing.
+#       Tracing starts at the first snapshot, or at the start with USE_TRACEMALLOC. It slows down allocations.
+#       The snapshots are dumped to MEMORY_DIR. With MEMORY_SNAPSHOT_INTERVAL, they are also taken periodically.
+#       RSS and the traced memory are in the metrics at every scrape.
+
+# Filler Config
 filler_words = ['あー', 'ふむ', 'ほう', 'なるほど', 'うむ']
-FILLER_DIR = './sound_files/filler/'
+FILLER_THRESHOLD = 1.0  # sec
+# NOTE: Play filler only when the predicted time to first audio is longer than the threshold.
+
+# Opus Cache Config
+# NOTE: Build the cache of fillers with build_opus_cache.py.
+OPUS_CACHE_DIR = './sound_files/opus_cache/'
+USE_TTS_CACHE = True
+TTS_CACHE_MAX_LEN = 20
+TTS_CACHE_MAX_ENTRIES = 256
+# NOTE: Synthesized utterances up to TTS_CACHE_MAX_LEN letters are cached,
+#       and the least recently used ones over TTS_CACHE_MAX_ENTRIES are removed.
 
 # Grobal Value
 
 # other
 
 if __name__ == '__main__':
+    startup_util.profile_if_requested()
+    # NOTE: With --profile-startup, the bot runs in the child process and the startup profile is reported.
+
     # Discord bot permission settings
     intents = discord.Intents.default()
     intents.message_content = True  # permission to retrieve message content
     intents.voice_states = True
-    discord_client = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
+    with startup_util.phase('load config'):
+        config_service = config_util.ConfigService(CONFIG_FILE_NAME)
+        config_service.start_watching()
+
+    shard_config = shard_util.ShardConfig.from_env()
+    bot_class = commands.AutoShardedBot if USE_AUTO_SHARDING or shard_config.is_sharded else commands.Bot
+    discord_client = bot_class(
+        command_prefix=lambda _bot, _message: config_service.snapshot.discord.command_prefix,
+        intents=intents,
+        **shard_config.bot_options(),
+    )
+    process_name = shard_config.process_name()
+    # NOTE: Caches, sessions and metrics are per process. Log files and traces are written per process.
+
+    clients = {}
+    # NOTE: Clients are cached per slot with their settings, and made again when the settings are changed.
+    #       The old client of the slot is dropped, so the cache does not grow on each reload.
+
+    def get_llm_client(config: config_util.AppConfig, guild_id: int | None = None) -> Any:  # noqa: ANN401
+        """
+        Get the LLM client of the config. Each guild has its own client and conversation history.
+
+        Args:
+            config (config_util.AppConfig): The config snapshot.
+            guild_id (int | None, optional): The guild ID. Defaults to None (the shared prompt log).
+
+        Returns:
+            Any: The language model client (OpenAI or Gemini).
+
+        Raises:
+            ValueError: If the LLM is not supported.
+        """
+        if guild_id is None:
+            prompt_log_name = config.character.prompt_log_path
+        else:
+            prompt_log_name = config.character.guild_prompt_log_path(guild_id)
+
+        if config.llm.use_llm == 'openai':
+            api_key = config.llm.openai_api_key
+        elif config.llm.use_llm == 'gemini':
+            api_key = config.llm.gemini_api_key
+        else:
+            raise_message = f'Invalid LLM: {config.llm.use_llm}'
+            raise ValueError(raise_message)
+
+        slot = ('llm', guild_id)
+        settings = (config.llm.use_llm, api_key, prompt_log_name)
+        if slot not in clients or clients[slot][0] != settings:
+            llm_class = provider_util.get_llm_class(config.llm.use_llm)
+            # NOTE: The SDK of the LLM is imported only when the config selects it.
+            clients[slot] = (settings, llm_class(api_key, prompt_log_name=prompt_log_name))
+
+        return clients[slot][1]
+
+    def get_tts_client(config: config_util.AppConfig) -> Any:  # noqa: ANN401
+        """
+        Get the TTS client of the config.
+
+        Args:
+            config (config_util.AppConfig): The config snapshot.
+
+        Returns:
+            Any: The text-to-speech client.
+
+        Raises:
+            ValueError: If the TTS is not supported.
+        """
+        if config.tts.use_tts != 'voicevox':
+            raise_message = f'Invalid TTS: {config.tts.use_tts}'
+            raise ValueError(raise_message)
+
+        slot = 'tts'
+        settings = ('voicevox', config.tts.address)
+        if slot not in clients or clients[slot][0] != settings:
+            clients[slot] = (settings, provider_util.get_tts_class('voicevox')(config.tts.address))
+
+        return clients[slot][1]
+
+    def load_filler_bank(filler_dir: str) -> voice_util.FillerBank:
+        """
+        Make the filler bank of the directory, and decode all filler clips.
+
+        Args:
+            filler_dir (str): The directory of filler wav files.
+
+        Returns:
+            voice_util.FillerBank: The loaded filler bank.
+        """
+        filler_bank = voice_util.FillerBank(filler_words, filler_dir, opus_cache)
+        filler_bank.load()
+        return filler_bank
+
+    def set_filler_bank(filler_dir: str, future: asyncio.Future) -> None:
+        """
+        Swap in the filler bank loaded in the thread, unless the directory is changed again while loading.
+
+        Args:
+            filler_dir (str): The directory of filler wav files.
+            future (asyncio.Future): The future of load_filler_bank().
+        """
+        log_background_error('filler', future)
+        if clients.get('filler') != (filler_dir, None) or future.cancelled() or future.exception() is not None:
+            return
+
+        clients['filler'] = (filler_dir, future.result())
+        return
+
+    def get_filler_bank(config: config_util.AppConfig) -> voice_util.FillerBank | None:
+        """
+        Get the filler bank of the config.
+        When the filler directory is changed by reload, the new bank is loaded in a thread.
+
+        NOTE: Decoding fillers with ffmpeg blocks, so it does not run on the event loop.
+              No filler is used until the new bank is loaded.
+
+        Args:
+            config (config_util.AppConfig): The config snapshot.
+
+        Returns:
+            voice_util.FillerBank | None: The loaded filler bank, or None if fillers are not used or being loaded.
+        """
+        if not config.character.use_filler:
+            return None
+
+        filler_dir, filler_bank = clients.get('filler', (None, None))
+        if filler_dir != config.character.filler_dir:
+            filler_dir, filler_bank = config.character.filler_dir, None
+            clients['filler'] = (filler_dir, filler_bank)
+            future = asyncio.get_running_loop().run_in_executor(None, load_filler_bank, filler_dir)
+            future.add_done_callback(lambda done: set_filler_bank(filler_dir, done))
+
+        return filler_bank
+
+    startup_config = config_service.snapshot
+    voice_streams = voice_util.VoiceStreamManager(startup_config.ffmpeg.crossfade_len, startup_config.ffmpeg.fade_len)
+    with startup_util.phase('load opus cache'):
+        opus_cache = opus_util.OpusCache(OPUS_CACHE_DIR, TTS_CACHE_MAX_ENTRIES)
+        opus_cache.load()
+
+    with startup_util.phase('make LLM client'):
+        get_llm_client(startup_config)
+
+    with startup_util.phase('make TTS client'):
+        get_tts_client(startup_config)
+
+    with startup_util.phase('load fillers'):
+        if startup_config.character.use_filler:
+            filler_dir = startup_config.character.filler_dir
+            clients['filler'] = (filler_dir, load_filler_bank(filler_dir))
 
-    if LLM_CONFIG['use_llm'] == 'openai':
-        llm_client = OpenAIWrapper(OPENAI_API_KEY, prompt_log_name=PROMPT_LOG_NAME)
-    elif LLM_CONFIG['use_llm'] == 'gemini':
-        llm_client = GeminiWrapper(GEMINI_API_KEY, prompt_log_name=PROMPT_LOG_NAME)
+    ttfa_predictor = latency_util.LatencyPredictor()
+    tts_predictor = latency_util.LatencyPredictor()
+    sessions = session_util.SessionManager()
+    workers = worker_util.WorkerPool(
+        lambda item: process_message(*item),
+        GUILD_QUEUE_SIZE,
+        OVERLOAD_POLICY,
+        merge=lambda queued, item: merge_messages(queued, item),  # noqa: PLW0108
+        on_rejected=lambda item: reject_message(*item),
+        max_concurrency=MAX_CONCURRENT_TURNS,
+    )
+    # NOTE: The handlers are wrapped in lambdas, because they are defined below.
+    limits = {}
+    debouncer = debounce_util.MessageDebouncer(
+        lambda _key, item: submit_turn(item),
+        lambda items: merge_burst(items),  # noqa: PLW0108
+        DEBOUNCE_QUIET_PERIOD,
+        DEBOUNCE_MAX_WAIT,
+        TYPING_QUIET_PERIOD if USE_TYPING_EARLY_START else None,
+        TYPING_WAIT,
+    )
+    # NOTE: The semaphore of TTS is made in the event loop at on_ready().
 
-    if TTS_CONFIG['use_tts'] == 'voicevox':
-        tts_address = f'{TTS_HOST_IP}:{TTS_PORT}'
-        tts_client = VoicevoxWrapper(tts_address)
+    log_rotation = log_util.LogRotation(
+        LOG_MAX_BYTES, LOG_MAX_AGE, compression=LOG_COMPRESSION, retention_days=LOG_RETENTION_DAYS,
+    )
+    log_util.log_writer.rotation = log_rotation
+    log_file_name = log_util.open_log_file(suffix='' if process_name is None else f'.{process_name}')
+    tracer = trace_util.Tracer(TRACE_DIR if process_name is None else f'{TRACE_DIR}/{process_name}', USE_TRACE)
+    tracer.writer.rotation = log_rotation
+    tracer.open()
 
-    log_file_name = log_util.open_log_file()
+    metrics = metrics_util.MetricsRegistry()
+    ttft_histogram = metrics.histogram('aichat_llm_ttft_seconds', 'Time to first LLM token.', ('llm', 'model'))
+    ttfa_histogram = metrics.histogram('aichat_ttfa_seconds', 'Time to first generated audio.', ('llm', 'model'))
+    tts_histogram = metrics.histogram('aichat_tts_latency_seconds', 'TTS synthesis latency.', ('engine',))
+    lag_histogram = metrics.histogram(
+        'aichat_event_loop_lag_seconds', 'Event loop lag.', buckets=metrics_util.LAG_BUCKETS,
+    )
+    blocked_counter = metrics.counter('aichat_loop_blocked', 'Event loop stalls by the call site.', ('site',))
+    blocked_seconds_counter = metrics.counter(
+        'aichat_loop_blocked_seconds', 'Event loop stall time by the call site.', ('site',),
+    )
+    message_counter = metrics.counter('aichat_messages', 'Processed messages.')
+    cancel_counter = metrics.counter('aichat_cancelled', 'Cancelled answers.')
+    metrics.gauge('aichat_voice_connections', 'Active voice connections.').set_function(
+        lambda: len(discord_client.voice_clients),
+    )
+    metrics.gauge('aichat_playback_queue_length', 'Clips waiting for playback.').set_function(
+        lambda: sum(scheduler.queue_length() for _, scheduler in list(voice_streams.streams.values())),
+    )
+    metrics.gauge('aichat_playback_buffered_seconds', 'Buffered audio in voice streams.').set_function(
+        lambda: sum(voice_streams.buffered_time(guild_id) for guild_id in list(voice_streams.streams)),
+    )
+    metrics.counter('aichat_opus_cache_hits', 'Opus cache hits.').set_function(lambda: opus_cache.hits)
+    metrics.counter('aichat_opus_cache_misses', 'Opus cache misses.').set_function(lambda: opus_cache.misses)
+    metrics.gauge('aichat_opus_cache_hit_ratio', 'Opus cache hit ratio.').set_function(
+        lambda: opus_cache.hits / max(1, opus_cache.hits + opus_cache.misses),
+    )
+    metrics.gauge('aichat_workers', 'Guild workers.').set_function(lambda: len(workers.workers))
+    metrics.gauge('aichat_active_turns', 'Turns in progress over all guilds.').set_function(lambda: workers.active)
+    metrics.gauge('aichat_guild_queue_depth_total', 'Messages waiting or in progress.').set_function(
+        lambda: sum(workers.queue_depths().values()),
+    )
+    metrics.gauge('aichat_guild_queue_depth_max', 'The deepest guild queue.').set_function(
+        lambda: max(workers.queue_depths().values(), default=0),
+    )
+    overload_counter = metrics.counter('aichat_overloaded', 'Messages hit the full guild queue.', ('policy',))
+    for policy in worker_util.OVERLOAD_POLICIES:
+        overload_counter.labels(policy=policy).set_function(lambda policy=policy: workers.overloads[policy])
+
+    def on_loop_blocked(site: str, seconds: float, stack: list[str]) -> None:
+        """
+        Log the event loop stall, and count it by the call site.
+
+        Args:
+            site (str): The blocking function in this project.
+            seconds (float): The stall in seconds.
+            stack (list[str]): The stack of the event loop thread, innermost first.
+        """
+        discord_logger.loop_blocked(site, seconds, stack)
+        blocked_counter.labels(site=site).inc()
+        blocked_seconds_counter.labels(site=site).inc(seconds)
+        return
+
+    loop_watchdog = watchdog_util.LoopWatchdog(
+        LOOP_BLOCK_THRESHOLD, LOOP_WATCHDOG_INTERVAL, on_loop_blocked, lag_histogram,
+    )
+    profiler = profiler_util.SamplingProfiler(PROFILE_INTERVAL)
+    memory_profiler = memory_util.MemoryProfiler(TRACEMALLOC_FRAMES, MEMORY_TOP)
+    if USE_TRACEMALLOC:
+        memory_profiler.start()
+
+    metrics.gauge('aichat_process_rss_bytes', 'Resident set size of the process.').set_function(
+        lambda: metrics_util.process_rss() or 0,
+    )
+    metrics.gauge('aichat_tracemalloc_traced_bytes', 'Memory traced by tracemalloc.').set_function(
+        memory_profiler.traced_memory,
+    )
+    background_tasks = {}
+    if USE_METRICS:
+        metrics_util.start_metrics_server(metrics, METRICS_HOST, METRICS_PORT + (shard_config.process_index or 0))
+
+    def log_background_error(name: str, future: asyncio.Future) -> None:
+        """
+        Log the exception of the background work which is not awaited, such as saving the cache.
+
+        Args:
+            name (str): The name of the work.
+            future (asyncio.Future): The future of the work.
+        """
+        if not future.cancelled() and future.exception() is not None:
+            discord_logger.background_failed(name, future.exception())
+
+        return
 
     @discord_client.command()
     async def join(ctx: commands.Context) -> None:
@@ -94,11 +441,12 @@ if __name__ == '__main__':
         Args:
             ctx (commands.Context): The context of the command invocation.
         """
-        is_target_text_channel = ctx.channel.name == TARGET_TEXT_CHANNEL
+        is_target_text_channel = ctx.channel.name == config_service.snapshot.discord.target_txtchannel
         is_user_in_voice_channel = ctx.message.author.voice is not None
         if is_target_text_channel:
             if is_user_in_voice_channel:
-                await ctx.message.author.voice.channel.connect()
+                voice_client = await ctx.message.author.voice.channel.connect()
+                voice_streams.get_stream(voice_client)
                 send_text = '接続したのじゃ。 Powered by VOICEVOX 小夜'
                 await send_message(ctx.message.channel, send_text)
             else:
@@ -113,10 +461,11 @@ if __name__ == '__main__':
         Args:
             ctx (commands.Context): The context of the command invocation.
         """
-        is_target_text_channel = ctx.channel.name == TARGET_TEXT_CHANNEL
+        is_target_text_channel = ctx.channel.name == config_service.snapshot.discord.target_txtchannel
         is_bot_in_voice_channel = ctx.message.guild.voice_client is not None
         if is_target_text_channel:
             if is_bot_in_voice_channel:
+                voice_streams.stop_stream(ctx.message.guild.id)
                 await ctx.message.guild.voice_client.disconnect()
                 send_text = 'さらばじゃ。'
                 await send_message(ctx.message.channel, send_text)
@@ -124,6 +473,159 @@ if __name__ == '__main__':
                 send_text = 'わしはボイスチャンネルに入っておらぬぞ。'
                 await send_message(ctx.message.channel, send_text)
 
+    @discord_client.command()
+    async def stop(ctx: commands.Context) -> None:
+        """
+        Stop the answer in progress.
+
+        Args:
+            ctx (commands.Context): The context of the command invocation.
+        """
+        is_target_text_channel = ctx.channel.name == config_service.snapshot.discord.target_txtchannel
+        if is_target_text_channel:
+            if sessions.cancel(ctx.message.guild.id):
+                send_text = '話すのをやめたのじゃ。'
+            else:
+                send_text = 'わしは何も話しておらぬぞ。'
+            await send_message(ctx.message.channel, send_text)
+
+    @discord_client.command()
+    @commands.is_owner()
+    async def profile(ctx: commands.Context, seconds: float = 10.0) -> None:
+        """
+        Profile all threads for the seconds, and post the hot functions to the control channel.
+
+        Args:
+            ctx (commands.Context): The context of the command invocation.
+            seconds (float, optional): The duration in seconds. Defaults to 10.
+        """
+        if profiler.is_running:
+            await send_message(ctx.message.channel, 'もう計測しておるぞ。')
+            return
+
+        seconds = min(max(seconds, 1.0), PROFILE_MAX_SECONDS)
+        await send_message(ctx.message.channel, f'{seconds:.0f}秒間、計測するのじゃ。')
+        await run_profile(seconds, ctx)
+
+    @profile.error
+    async def profile_error(ctx: commands.Context, error: commands.CommandError) -> None:
+        """
+        Reply when the user is not the bot owner, or the argument is invalid.
+
+        Args:
+            ctx (commands.Context): The context of the command invocation.
+            error (commands.CommandError): The error.
+        """
+        if isinstance(error, commands.CheckFailure):
+            await send_message(ctx.message.channel, 'お主には許されておらぬぞ。')
+        elif isinstance(error, commands.BadArgument):
+            await send_message(ctx.message.channel, '秒数を指定するのじゃ。')
+        else:
+            raise error
+
+    async def run_profile(seconds: float, ctx: commands.Context | None = None) -> None:
+        """
+        Run the sampling profiler, write the collapsed stacks, and post the summary to the control channel.
+
+        Args:
+            seconds (float): The duration in seconds.
+            ctx (commands.Context | None, optional): The context of the command invocation. Defaults to None.
+        """
+        await profiler.profile(seconds)
+        suffix = '' if process_name is None else f'.{process_name}'
+        file_name = f'{PROFILE_DIR}/{time.strftime("%Y_%m%d_%H%M%S")}{suffix}.collapsed'
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, profiler.write_collapsed, file_name)
+        summary = profiler.summary()
+        discord_logger.profiled(profiler.duration, file_name, summary)
+        await send_control_message(f'```\n{summary}\n```{file_name}', ctx)
+
+    @discord_client.command()
+    @commands.is_owner()
+    async def memory(ctx: commands.Context, action: str = 'snapshot') -> None:
+        """
+        Take the memory snapshot, and post the growth since the last snapshot to the control channel.
+
+        Args:
+            ctx (commands.Context): The context of the command invocation.
+            action (str, optional): 'snapshot', or 'stop' to stop tracing. Defaults to 'snapshot'.
+        """
+        if action == 'stop':
+            memory_profiler.stop()
+            await send_message(ctx.message.channel, 'メモリの計測をやめたのじゃ。')
+            return
+
+        if not memory_profiler.is_tracing:
+            await send_message(ctx.message.channel, 'メモリの計測を始めるのじゃ。次からは前回との差を出すぞ。')
+
+        summary, file_name = await run_memory_snapshot()
+        await send_control_message(f'```\n{summary}\n```{file_name}', ctx)
+
+    @memory.error
+    async def memory_error(ctx: commands.Context, error: commands.CommandError) -> None:
+        """
+        Reply when the user is not the bot owner.
+
+        Args:
+            ctx (commands.Context): The context of the command invocation.
+            error (commands.CommandError): The error.
+        """
+        if isinstance(error, commands.CheckFailure):
+            await send_message(ctx.message.channel, 'お主には許されておらぬぞ。')
+        else:
+            raise error
+
+    async def run_memory_snapshot() -> tuple[str, str]:
+        """
+        Take the memory snapshot in the executor, dump it to MEMORY_DIR and log the summary.
+
+        Returns:
+            str: The summary.
+            str: The snapshot file.
+        """
+        suffix = '' if process_name is None else f'.{process_name}'
+        file_name = f'{MEMORY_DIR}/{time.strftime("%Y_%m%d_%H%M%S")}{suffix}.tracemalloc'
+        loop = asyncio.get_running_loop()
+        summary = await loop.run_in_executor(None, memory_profiler.take_snapshot, file_name)
+        discord_logger.memory_snapshot(file_name, summary)
+        return summary, file_name
+
+    async def snapshot_memory_periodically() -> None:
+        """
+        Take the memory snapshot every MEMORY_SNAPSHOT_INTERVAL until cancelled.
+        """
+        while True:
+            await asyncio.sleep(MEMORY_SNAPSHOT_INTERVAL)
+            await run_memory_snapshot()
+
+    async def send_control_message(send_text: str, ctx: commands.Context | None = None) -> None:
+        """
+        Send the message to the control channel, which is DISCORD.CONTROL_TXTCHANNEL_ID of the config.
+        If it is not set, the message is sent to the channel of the command, or not sent without the command.
+
+        NOTE: The message has the stacks and the files of the process, so it is not sent to the other guilds.
+
+        Args:
+            send_text (str): The text content of the message to send.
+            ctx (commands.Context | None, optional): The context of the command invocation. Defaults to None.
+        """
+        control_txtchannel_id = config_service.snapshot.discord.control_txtchannel_id
+        channel = discord_client.get_channel(control_txtchannel_id) if control_txtchannel_id else None
+        if channel is None and ctx is not None:
+            channel = ctx.message.channel
+
+        if channel is not None:
+            await send_message(channel, send_text)
+
+    def on_profile_signal() -> None:
+        """
+        Signal handler. Profile for PROFILE_SIGNAL_SECONDS unless already profiling.
+        """
+        if not profiler.is_running:
+            background_tasks['profile'] = asyncio.create_task(run_profile(PROFILE_SIGNAL_SECONDS))
+
+        return
+
     @discord_client.listen()
     async def on_ready() -> None:
         """
@@ -131,12 +633,31 @@ if __name__ == '__main__':
         Sends a greeting message to the target text channel.
         """
         discord_logger.on_ready(discord_client)
+        if 'tts' not in limits:
+            limits['tts'] = asyncio.Semaphore(MAX_CONCURRENT_TTS)
+
+        if USE_LOOP_WATCHDOG and 'watchdog' not in background_tasks:
+            background_tasks['watchdog'] = asyncio.create_task(loop_watchdog.run())
+
+        if USE_METRICS and not USE_LOOP_WATCHDOG and 'loop_lag' not in background_tasks:
+            # NOTE: The watchdog observes the loop lag too.
+            background_tasks['loop_lag'] = asyncio.create_task(metrics_util.monitor_loop_lag(lag_histogram))
+
+        if MEMORY_SNAPSHOT_INTERVAL is not None and 'memory' not in background_tasks:
+            background_tasks['memory'] = asyncio.create_task(snapshot_memory_periodically())
+
+        if PROFILE_SIGNAL is not None and hasattr(signal, PROFILE_SIGNAL):
+            with suppress(NotImplementedError):
+                asyncio.get_running_loop().add_signal_handler(getattr(signal, PROFILE_SIGNAL), on_profile_signal)
+            # NOTE: The event loop on Windows has no signal handlers, so only the command is available.
+
         for channel in discord_client.get_all_channels():
-            if channel.name == TARGET_TEXT_CHANNEL:
+            if channel.name == config_service.snapshot.discord.target_txtchannel:
                 greeting = 'お疲れ様なのじゃ。'
                 await send_message(channel, greeting)
 
         discord_logger.standby()
+        startup_util.ready()
 
     @discord_client.event
     async def on_message(message: discord.Message) -> None:
@@ -146,11 +667,13 @@ if __name__ == '__main__':
         Args:
             message (discord.Message): The received message object.
         """
+        config = config_service.snapshot
+        # NOTE: The snapshot is read once per turn, so the settings do not change in the middle of the turn.
         is_human = not message.author.bot
-        is_target_text_channel = message.channel.name == TARGET_TEXT_CHANNEL
+        is_target_text_channel = message.channel.name == config.discord.target_txtchannel
         is_mentioned = discord_client.user in message.mentions  # noqa: F841
         # NOTE: The value will be used in a future.
-        is_command = message.content[0] == COMMAND_PREFIX
+        is_command = message.content.startswith(config.discord.command_prefix)
 
         if is_human and is_command and is_target_text_channel:
             await discord_client.process_commands(message)
@@ -159,11 +682,126 @@ if __name__ == '__main__':
         if is_human and is_target_text_channel:
             question = message.content
             discord_logger.mentioned(message, question)
-            reply_text = await aichat(message, question, llm_client, tts_client)
-            await reply_massage(message, reply_text)
-            discord_logger.standby()
+            message_counter.inc()
+            if USE_DEBOUNCE:
+                debouncer.add((message.guild.id, message.author.id), (message, question, config))
+            else:
+                submit_turn((message, question, config))
+
             return
 
+    @discord_client.listen()
+    async def on_typing(channel: discord.abc.Messageable, user: discord.abc.User, _when: Any) -> None:  # noqa: ANN401
+        """
+        Event handler for typing. The debounce waits for the next message of the user.
+
+        Args:
+            channel (discord.abc.Messageable): The channel.
+            user (discord.abc.User): The user who started typing.
+            _when (Any): The time typing started. (unused)
+        """
+        is_target_text_channel = getattr(channel, 'name', None) == config_service.snapshot.discord.target_txtchannel
+        if USE_DEBOUNCE and is_target_text_channel and not user.bot:
+            debouncer.typing((channel.guild.id, user.id))
+
+        return
+
+    def submit_turn(item: tuple[discord.Message, str, config_util.AppConfig]) -> bool:
+        """
+        Queue the question to the worker of the guild. If accepted, the answer in progress to the same user
+        is cancelled, and the answers to other users are not.
+
+        Args:
+            item (tuple[discord.Message, str, config_util.AppConfig]): The message, the question and the config.
+
+        Returns:
+            bool: False if the question is rejected.
+        """
+        message = item[0]
+        if not workers.submit(message.guild.id, item):
+            return False
+
+        sessions.cancel(message.guild.id, message.author.id)
+        return True
+
+    async def process_message(message: discord.Message, question: str, config: config_util.AppConfig) -> None:
+        """
+        Answer the message. Called by the worker of the guild in order of messages.
+
+        Args:
+            message (discord.Message): The received message object.
+            question (str): The question text.
+            config (config_util.AppConfig): The config snapshot when the message is received.
+        """
+        scope = await sessions.start(message.guild.id, message.author.id)
+        turn = log_util.current_turn.set(None)
+        try:
+            llm_client = get_llm_client(config, message.guild.id)
+            tts_client = get_tts_client(config)
+            text_reply = text_reply_util.StreamingReply(
+                message.channel.send,
+                lambda sent, content: sent.edit(content=content),
+                prefix=f'{message.author.mention} ',
+                min_interval=TEXT_EDIT_INTERVAL,
+            )
+            reply_text = await aichat(message, question, llm_client, tts_client, scope, config, text_reply)
+            await text_reply.finish(reply_text)
+            discord_logger.reply_massage(message, reply_text)
+        finally:
+            sessions.finish(message.guild.id, scope)
+            log_util.current_turn.reset(turn)
+
+        discord_logger.standby()
+        return
+
+    def merge_burst(
+        items: list[tuple[discord.Message, str, config_util.AppConfig]],
+    ) -> tuple[discord.Message, str, config_util.AppConfig]:
+        """
+        Merge the quick messages of the user into one question.
+
+        Args:
+            items (list[tuple[discord.Message, str, config_util.AppConfig]]): The messages, questions and configs.
+
+        Returns:
+            tuple[discord.Message, str, config_util.AppConfig]: The merged item. The reply is sent to the last message.
+        """
+        message, _, config = items[-1]
+        return message, '\n'.join(question for _, question, _ in items), config
+
+    def merge_messages(
+        queued: tuple[discord.Message, str, config_util.AppConfig],
+        item: tuple[discord.Message, str, config_util.AppConfig],
+    ) -> tuple[discord.Message, str, config_util.AppConfig]:
+        """
+        Merge the new message into the waiting message of 'merge' overload policy.
+
+        Args:
+            queued (tuple[discord.Message, str, config_util.AppConfig]): The waiting message, question and config.
+            item (tuple[discord.Message, str, config_util.AppConfig]): The new message, question and config.
+
+        Returns:
+            tuple[discord.Message, str, config_util.AppConfig]: The merged item. The reply is sent to the new message.
+        """
+        message, question, config = item
+        discord_logger.overloaded(queued[0], 'merge')
+        return message, f'{queued[1]}\n{question}', config
+
+    async def reject_message(message: discord.Message, _question: str, _config: config_util.AppConfig) -> None:
+        """
+        Handle the message dropped or rejected by the full queue of the guild.
+
+        Args:
+            message (discord.Message): The message.
+            _question (str): The question text. (unused)
+            _config (config_util.AppConfig): The config snapshot. (unused)
+        """
+        discord_logger.overloaded(message, workers.policy)
+        if workers.policy == 'reply_busy':
+            await reply_massage(message, '今は手が離せぬのじゃ。少し待つのじゃ。')
+
+        return
+
     async def send_message(channel: discord.TextChannel, send_text: str) -> None:
         """
         Send a message to a specified Discord channel.
@@ -187,7 +825,15 @@ if __name__ == '__main__':
         await message.channel.send(reply)
         discord_logger.reply_massage(message, reply_text)
 
-    async def aichat(message: discord.Message, input_text: str, llm_client: Any, tts_client: Any) -> str:  # noqa: ANN401, C901, PLR0912, PLR0915
+    async def aichat(  # noqa: C901, PLR0912, PLR0913, PLR0915, PLR0917
+        message: discord.Message,
+        input_text: str,
+        llm_client: Any,  # noqa: ANN401
+        tts_client: Any,  # noqa: ANN401
+        scope: session_util.CancelScope,
+        config: config_util.AppConfig,
+        text_reply: text_reply_util.StreamingReply,
+    ) -> str:
         # TODO: Declare each client when it is used within a function.  # noqa: FIX002
         # ISSUE-006
         # TODO: Refactor this function. Too long and complex.  # noqa: FIX002
@@ -200,116 +846,290 @@ if __name__ == '__main__':
             input_text (str): The input text to generate a response for.
             llm_client (Any): The language model client (OpenAI or Gemini).
             tts_client (Any): The text-to-speech client.
+            scope (session_util.CancelScope): The cancellation scope of the turn.
+            config (config_util.AppConfig): The config snapshot of the turn.
+            text_reply (text_reply_util.StreamingReply): The reply, which is streamed without voice.
 
         Returns:
-            str: The generated response text.
+            str: The generated response text. If cancelled, the text which was actually spoken or posted.
         """
         voice_client = message.guild.voice_client
-        llm_config = copy.deepcopy(LLM_CONFIG)
-        voice_config = copy.deepcopy(TTS_CONFIG)
+        sound_debug = config.common.sound_debug
+        llm_config = config.llm_config()
+        voice_config = config.voice_config()
         if voice_config['speaker_ID'] == -1 or voice_client is None:
-            llm_config['streaming'] = False
+            llm_config['streaming'] = STREAM_TEXT_REPLY
             llm_config['model_name'] = llm_config['use_model']
             voice_config['speaker_ID'] = -1
+            use_voice = False
         else:
             llm_config['streaming'] = True
+            use_voice = True
             llm_config['model_name'] = llm_config['use_model']
             voice_config['speaker'] = voice_config['speaker_ID']
-            sound_controler = sound_util.SoundControler()
+            playback = voice_streams.get_stream(voice_client)
             talk_counter = 0
 
-        if SOUND_DEBUG:
+        if sound_debug:
             llm_config['streaming'] = True
             llm_config['model_name'] = llm_config['use_model']
-            voice_config['speaker_ID'] = TTS_CONFIG['speaker_ID']
+            voice_config['speaker_ID'] = config.tts.speaker_id
             voice_config['speaker'] = voice_config['speaker_ID']
-            sound_controler = sound_util.SoundControler()
+            playback = sound_util.PlaybackScheduler(sound_util.play_wav_clip, sound_util.stop_wav)
             talk_counter = 0
+            use_voice = True
 
+        if use_voice:
+            scope.add_callback(playback.cancel)
+
+        time_start = time.perf_counter()
+        trace = tracer.start_trace(
+            guild_id=message.guild.id,
+            llm=llm_config['use_llm'],
+            model=llm_config['model_name'],
+            speaker=voice_config['speaker_ID'],
+        )
+        log_util.current_turn.set(trace.trace_id)
+        # NOTE: The log lines of the turn have the trace ID, so the turns at the same time can be told apart.
         discord_logger.speach_generate_start(
             llm_config['use_llm'],
             llm_config['model_name'],
             voice_config['speaker_ID'],
             tts_client.speakers_name_dict[voice_config['speaker_ID']],
-            USE_PROMPT_LOG,
+            config.character.use_prompt_log,
         )
 
-        time_start = time.perf_counter()
+        with trace.span('prompt_load'):
+            system_prompt = llm_client.load_prompt(config.character.system_prompt_path)
+            character_prompt = llm_client.load_prompt(config.character.character_prompt_path)
+            add_prompt = llm_client.add_prompt(system_prompt, character_prompt)
 
-        system_prompt = llm_client.load_prompt(SYSTEM_PROMPT_NAME)
-        character_prompt = llm_client.load_prompt(CHARACTER_PROMPT_NAME)
-        if not USE_PROMPT_LOG:
-            prompt = llm_client.add_prompt(system_prompt, character_prompt)
-            response = llm_client.get_response(prompt, llm_config)
+        loop = asyncio.get_running_loop()
+        llm_span = trace.start_span('llm_ttft', streaming=llm_config['streaming'])
+        time_llm_start = time.perf_counter()
+        if not config.character.use_prompt_log:
+            prompt = add_prompt
+            response = await loop.run_in_executor(None, llm_client.get_response, prompt, llm_config)
         else:
-            add_prompt = llm_client.add_prompt(system_prompt, character_prompt)
-            response, prompt = llm_client.get_chat_response(input_text, llm_config, add_prompt)
+            response, prompt = await loop.run_in_executor(
+                None, llm_client.get_chat_response, input_text, llm_config, add_prompt,
+            )
+        # NOTE: LLM requests run in threads, so other guilds are not blocked while waiting for the response.
 
         discord_logger.prompt(prompt)
-        if llm_config['streaming'] and USE_FILLER:
-            filler_num = random.randint(0, len(filler_words))  # noqa: S311
-            # NOTE: Use random module because do not need secure here.
-            if filler_num != 0:
+        prompt_len = latency_util.prompt_length(prompt)
+        filler = None
+        if use_voice:
+            predicted_time = ttfa_predictor.predict(llm_config['use_llm'], llm_config['model_name'], prompt_len)
+            is_slow = predicted_time is None or predicted_time > FILLER_THRESHOLD
+            filler_bank = get_filler_bank(config)
+            filler = filler_bank.choose() if filler_bank is not None and is_slow else None
+            if filler is not None:
                 speach_start_time = await first_talk_prosess(time_start)
-
-                text = filler_words[filler_num - 1]
-                filler_file_name = f'{FILLER_DIR}{text}.wav'
-
-                sound_controler.append_thread(filler_file_name)
-                sound_controler.thread_control()
+                text, filler_file_name, filler_clip, filler_duration = filler
+                discord_logger.filler(text, predicted_time)
+                playback.submit(filler_file_name if sound_debug else filler_clip)
+                filler = (speach_start_time, filler_duration)
                 talk_counter += 1
 
         if not llm_config['streaming']:
             generated_raw_text = llm_client.read_text(response)
+            llm_span.end(text_length=len(generated_raw_text))
             generation_time = time.perf_counter() - time_start
             discord_logger.generate_finish(generation_time)
+        elif not use_voice:
+            generated_raw_text = await stream_text_reply(
+                response, llm_client, text_reply, scope, llm_span, llm_config, time_llm_start,
+            )
+            generation_time = time.perf_counter() - time_start
+            discord_logger.generate_finish(generation_time)
+            if scope.is_cancelled:
+                if hasattr(response, 'close'):
+                    response.close()
+
+                cancel_counter.inc()
+                discord_logger.cancelled(generated_raw_text)
         else:
-            word_marks = text_util.WordMarks()
-            generated_raw_text = ''
-            text_buffer = ''
-            is_make_voice = False
-            for chunk in response:
-                txt = llm_client.read_text(chunk)
-                if txt is not None:
-                    generated_raw_text = generated_raw_text + txt
-                    for letter in txt:
-                        is_sp, is_p, is_e, is_q, is_n = word_marks.check_letter(letter)
-                        if not is_sp and is_make_voice and len(text_buffer) > 0:
-                            if talk_counter == 0:
-                                speach_start_time = await first_talk_prosess(time_start)
-
-                            sound_controler = await play_voice_process(
-                                message,
-                                sound_controler,
-                                text_buffer,
-                                voice_config,
+            tts_engine = voice_config['use_tts']
+            chunking_policy = chunk_util.make_chunking_policy(
+                CHUNKING_POLICY,
+                first_len=FIRST_CHUNK_LEN,
+                max_len=MAX_CHUNK_LEN,
+                estimate_synthesis=lambda length: tts_predictor.predict('tts', tts_engine, length),
+                get_backlog=lambda: 0.0 if sound_debug else voice_streams.buffered_time(message.guild.id),
+            )
+            chunking_metrics = chunk_util.ChunkingMetrics(time_start)
+            generated_texts = []
+            first_audio_time = None
+            spoken_clips = []
+            token_recorder = bench_util.TokenTraceRecorder(time_llm_start) if TOKEN_TRACE_DIR else None
+
+            def read_texts() -> Iterator[str]:
+                """
+                Read text chunks from the LLM stream until cancelled.
+
+                Yields:
+                    str: The text chunk.
+                """
+                for chunk in response:
+                    if scope.is_cancelled:
+                        return
+
+                    txt = llm_client.read_text(chunk)
+                    if txt:
+                        if not llm_span.is_ended:
+                            ttft_histogram.labels(llm=llm_config['use_llm'], model=llm_config['model_name']).observe(
+                                time.perf_counter() - time_llm_start,
                             )
-                            text_buffer = ''
-                            is_make_voice = False
-                            talk_counter += 1
-                            await asyncio.sleep(0.1)
 
-                        if not is_n:
-                            text_buffer = text_buffer + letter
+                        llm_span.end()
+                        trace.event('token_chunk', length=len(txt))
+                        generated_texts.append(txt)
+                        if token_recorder is not None:
+                            token_recorder.add(txt)
+
+                        yield txt
+
+            async def synthesize(segment: str) -> tuple[str, Any, str | None] | None:
+                """
+                The tts stage. Log the first talk, and generate voice of the segment.
 
-                        if is_sp:
-                            is_make_voice = True
+                Args:
+                    segment (str): The segment.
 
+                Returns:
+                    tuple[str, Any, str | None] | None: See synthesize_voice().
+                """
+                nonlocal talk_counter, speach_start_time
+                if talk_counter == 0:
+                    speach_start_time = await first_talk_prosess(time_start)
+
+                talk_counter += 1
+                trace.event('segment', length=len(segment), policy=chunking_policy.name)
+                return await synthesize_voice(segment, voice_config, scope, trace, tts_client, sound_debug)
+
+            async def decode(item: tuple[str, Any, str | None]) -> tuple[str, Any] | None:
+                """
+                The decode stage. See decode_voice().
+
+                Args:
+                    item (tuple[str, Any, str | None]): The segment, the voice data and the cache key.
+
+                Returns:
+                    tuple[str, Any] | None: The segment and the clip, or None if cancelled.
+                """
+                return None if scope.is_cancelled else await decode_voice(*item, sound_debug)
+
+            def submit(item: tuple[str, Any]) -> None:
+                """
+                The playback stage. Submit the clip to the playback scheduler.
+
+                Args:
+                    item (tuple[str, Any]): The segment and the clip.
+                """
+                nonlocal first_audio_time
+                segment, clip = item
+                if scope.is_cancelled:
+                    return
+
+                played = playback.submit(clip)
+                spoken_clips.append((segment, played))
+                chunking_metrics.on_submit(segment, played)
+                trace.playback(played, length=len(segment))
+                if first_audio_time is None:
+                    first_audio_time = first_voice_process(time_start, llm_config, prompt_len, filler)
+
+            pipeline = pipeline_util.Pipeline(
+                [
+                    pipeline_util.Source('llm', read_texts()),
+                    pipeline_util.Transform(
+                        'segment', chunking_policy.feed, chunking_policy.flush, chunking_policy.poll,
+                    ),
+                    pipeline_util.Map('tts', synthesize, TTS_CONCURRENCY),
+                    pipeline_util.Map('decode', decode),
+                    pipeline_util.Sink('playback', submit),
+                ],
+                PIPELINE_BUFFER_SIZE,
+            )
+            scope.add_callback(pipeline.cancel)
+            await pipeline.run()
+            if token_recorder is not None and not scope.is_cancelled:
+                loop.run_in_executor(
+                    None, token_recorder.save, f'{TOKEN_TRACE_DIR}/{trace.trace_id}.jsonl',
+                ).add_done_callback(lambda future: log_background_error('token_trace', future))
+
+            generated_raw_text = ''.join(generated_texts)
             if talk_counter == 0:
                 speach_start_time = await first_talk_prosess(time_start)
 
-            sound_controler = await play_voice_process(message, sound_controler, text_buffer, voice_config)
-            while not sound_controler.is_finish_all_thread():
-                await asyncio.sleep(0.1)
-                sound_controler.thread_control()
+            await asyncio.wrap_future(playback.all_done())
+            if sound_debug:
+                playback.close()
 
             speach_finish_time = time.perf_counter() - time_start
             discord_logger.speach_finish(speach_start_time, speach_finish_time)
+            discord_logger.chunking(chunking_policy.name, chunking_metrics.report())
+            discord_logger.pipeline(pipeline.report())
+            if scope.is_cancelled:
+                if hasattr(response, 'close'):
+                    response.close()
+
+                generated_raw_text = ''.join(
+                    text for text, clip in spoken_clips if clip.done() and not clip.cancelled() and clip.result()
+                )
+                # NOTE: Only the clips played to the end are recorded to the prompt log.
+                cancel_counter.inc()
+                discord_logger.cancelled(generated_raw_text)
 
+        trace.event('trace_end', cancelled=scope.is_cancelled, text_length=len(generated_raw_text))
         discord_logger.speach_generate_finish(generated_raw_text)
         llm_client.save_assistant_response(generated_raw_text)
         return generated_raw_text
 
+    async def stream_text_reply(  # noqa: PLR0913, PLR0917
+        response: Any,  # noqa: ANN401
+        llm_client: Any,  # noqa: ANN401
+        text_reply: text_reply_util.StreamingReply,
+        scope: session_util.CancelScope,
+        llm_span: trace_util.Span,
+        llm_config: dict[str, Any],
+        time_llm_start: float,
+    ) -> str:
+        """
+        Read text chunks from the LLM stream, and feed them to the reply until cancelled.
+
+        Args:
+            response (Any): The streaming response of the LLM.
+            llm_client (Any): The language model client (OpenAI or Gemini).
+            text_reply (text_reply_util.StreamingReply): The reply.
+            scope (session_util.CancelScope): The cancellation scope of the turn.
+            llm_span (trace_util.Span): The span of the time to first token.
+            llm_config (dict[str, Any]): Configuration for the LLM.
+            time_llm_start (float): The start time of the LLM request.
+
+        Returns:
+            str: The generated text.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = iter(response)
+        generated_texts = []
+        while (chunk := await loop.run_in_executor(None, next, chunks, None)) is not None:
+            if scope.is_cancelled:
+                break
+
+            txt = llm_client.read_text(chunk)
+            if txt:
+                if not llm_span.is_ended:
+                    ttft_histogram.labels(llm=llm_config['use_llm'], model=llm_config['model_name']).observe(
+                        time.perf_counter() - time_llm_start,
+                    )
+                    llm_span.end()
+
+                generated_texts.append(txt)
+                text_reply.feed(txt)
+
+        return ''.join(generated_texts)
+
     async def first_talk_prosess(time_start: float) -> float:
         """
         Process the first talk event and log the speech start time.
@@ -324,66 +1144,121 @@ if __name__ == '__main__':
         discord_logger.first_speach(speach_start_time)
         return speach_start_time
 
-    async def play_voice_process(
-        message: discord.Message,
-        sound_controler: sound_util.SoundControler,
+    def first_voice_process(
+        time_start: float,
+        llm_config: dict[str, Any],
+        prompt_len: int,
+        filler: tuple[float, float] | None,
+    ) -> float:
+        """
+        Record the time to first audio of generated voice, and log the latency hidden by the filler.
+
+        Args:
+            time_start (float): The start time of the entire process.
+            llm_config (dict[str, Any]): Configuration for the LLM.
+            prompt_len (int): The prompt length.
+            filler (tuple[float, float] | None): The filler start time and duration, or None if not played.
+
+        Returns:
+            float: The time to first audio.
+        """
+        first_audio_time = time.perf_counter() - time_start
+        ttfa_predictor.record(llm_config['use_llm'], llm_config['model_name'], prompt_len, first_audio_time)
+        ttfa_histogram.labels(llm=llm_config['use_llm'], model=llm_config['model_name']).observe(first_audio_time)
+        if filler is not None:
+            filler_start_time, filler_duration = filler
+            hidden_time = min(first_audio_time - filler_start_time, filler_duration)
+            discord_logger.filler_hidden(first_audio_time, hidden_time)
+
+        return first_audio_time
+
+    async def synthesize_voice(  # noqa: PLR0913, PLR0917
         text_buffer: str,
         voice_config: dict[str, Any],
-    ) -> sound_util.SoundControler:
+        scope: session_util.CancelScope,
+        trace: trace_util.Trace,
+        tts_client: Any,  # noqa: ANN401
+        sound_debug: bool,  # noqa: FBT001
+    ) -> tuple[str, Any, str | None] | None:
         """
-        Generate and play voice for the given text buffer.
+        Generate voice for the given text buffer, or get the cached clip.
 
         Args:
-            message (discord.Message): The received message object.
-            sound_controler (sound_util.SoundControler): The sound controller object.
             text_buffer (str): The text to convert to speech.
             voice_config (Dict[str, Any]): Configuration for the voice generation.
+            scope (session_util.CancelScope): The cancellation scope of the turn.
+            trace (trace_util.Trace): The trace of the turn.
+            tts_client (Any): The text-to-speech client.
+            sound_debug (bool): Play with the local sound device instead of discord.
 
         Returns:
-            sound_util.SoundControler: The updated sound controller.
+            tuple[str, Any, str | None] | None: The text, the wav data or the cached clip,
+                and the cache key to cache the clip. None if cancelled.
         """
+        if scope.is_cancelled:
+            return None
+
         discord_logger.output_voice(text_buffer)
-        audio_query = tts_client.generate_audio_query(text_buffer, voice_config)
-        voice_data = tts_client.generate_voice(audio_query, voice_config)
-        file_name = sound_util.generate_temp_wav(voice_data)
-        # play voice
-        # NOTE: Play audio while generating text with GPT and generating voice with VOICEVOX.
-        #       For that purpose, we implemented parallel processing using threading.
-        if SOUND_DEBUG:
-            sound_controler.append_thread(sound_util.play_wav, (file_name,))
-        else:
-            sound_controler.append_thread(
-                play_sound,
-                (
-                    message,
-                    file_name,
-                ),
-            )
+        cache_key = None
+        if USE_TTS_CACHE and not sound_debug and len(text_buffer) <= TTS_CACHE_MAX_LEN:
+            cache_key = opus_cache.utterance_key(text_buffer, voice_config)
+            cached_clip = opus_cache.get(cache_key)
+            if cached_clip is not None:
+                trace.event('tts_cache_hit', length=len(text_buffer))
+                return text_buffer, cached_clip, None
+
+        loop = asyncio.get_running_loop()
+        async with limits['tts']:
+            tts_start = time.perf_counter()
+            with trace.span('tts', engine=voice_config['use_tts'], length=len(text_buffer)):
+                audio_query = await loop.run_in_executor(
+                    None, tts_client.generate_audio_query, text_buffer, voice_config,
+                )
+                voice_data = await loop.run_in_executor(None, tts_client.generate_voice, audio_query, voice_config)
+
+            tts_time = time.perf_counter() - tts_start
+
+        tts_predictor.record('tts', voice_config['use_tts'], len(text_buffer), tts_time)
+        tts_histogram.labels(engine=voice_config['use_tts']).observe(tts_time)
+        if scope.is_cancelled:
+            return None
 
-        sound_controler.thread_control()
-        return sound_controler
+        return text_buffer, voice_data, cache_key
 
-    def play_sound(message: discord.Message, file_name: str) -> None:
+    async def decode_voice(
+        text_buffer: str,
+        voice_data: Any,  # noqa: ANN401
+        cache_key: str | None,
+        sound_debug: bool,  # noqa: FBT001
+    ) -> tuple[str, Any]:
         """
-        Play a sound file through the Discord voice client.
+        Convert the voice data to the clip for the playback scheduler.
+
+        NOTE: The voice stream keeps playing while generating text with GPT and generating voice with VOICEVOX,
+              so clips are played without gaps.
 
         Args:
-            message (discord.Message): The received message object.
-            file_name (str): The path to the sound file to play.
+            text_buffer (str): The text of the voice.
+            voice_data (Any): The wav data, or the cached clip which is passed through.
+            cache_key (str | None): If set, the clip is encoded to opus once and cached.
+            sound_debug (bool): Play with the local sound device instead of discord.
+
+        Returns:
+            tuple[str, Any]: The text and the clip. (see PlaybackScheduler.submit())
         """
-        voice_client = message.guild.voice_client
-        video_info = ffmpeg.probe(file_name)
-        dur = float(video_info['format']['duration'])
-        opt = f'"afade=t=in:st=0:d={FADE_LEN},afade=t=out:st={dur-FADE_LEN}:d={FADE_LEN}"'
-        ffmpeg_options = {
-            'options': f'-vn -af {opt}',
-        }
-        voice = discord.FFmpegPCMAudio(file_name, **ffmpeg_options)
+        if not isinstance(voice_data, bytes):
+            return text_buffer, voice_data
 
-        voice_client.play(voice)
-        while voice_client.is_playing():
-            time.sleep(0.1)
+        if sound_debug:
+            return text_buffer, sound_util.generate_temp_wav(voice_data)
+
+        loop = asyncio.get_running_loop()
+        clip = await loop.run_in_executor(None, voice_util.decode_pcm, voice_data)
+        if cache_key is not None:
+            loop.run_in_executor(None, opus_cache.put, cache_key, clip).add_done_callback(
+                lambda future: log_background_error('opus_cache', future),
+            )
 
-        voice_client.stop()
+        return text_buffer, clip
 
-    discord_client.run(DISCORD_API_KEY)
+    discord_client.run(startup_config.discord.api_key)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Run the discord bot in multiple processes, each owning a subset of shards.
+
+Run from the repository root, the same as discord_bot.py:
+    python ./aichatsystem/launch_shards.py --processes 2 --shards 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+import utilities.shard_utilities as shard_util
+import utilities.startup_utilities as startup_util
+
+if __name__ == '__main__':
+    startup_util.profile_if_requested()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(startup_util.PROFILE_FLAG, action='store_true', help='Report the startup time per module.')
+    parser.add_argument('--processes', type=int, default=2, help='The number of bot processes.')
+    parser.add_argument('--shards', type=int, help='The total number of shards. Defaults to the number of processes.')
+    parser.add_argument('--restart-delay', type=float, default=5.0, help='The delay to restart the exited process.')
+    args = parser.parse_args()
+
+    command = [sys.executable, str(Path(__file__).with_name('discord_bot.py'))]
+    launcher = shard_util.ShardLauncher(command, args.shards or args.processes, args.processes, args.restart_delay)
+    launcher.run()
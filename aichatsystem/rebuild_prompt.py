@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Rebuild the prompt of any turn from the delta prompt log in the system log files.
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import utilities.log_analysis_utilities as analysis_util
+import utilities.prompt_log_utilities as prompt_log_util
+import utilities.startup_utilities as startup_util
+
+if __name__ == '__main__':
+    startup_util.profile_if_requested()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(startup_util.PROFILE_FLAG, action='store_true', help='Report the startup time per module.')
+    parser.add_argument('--log-dir', default='./log_files/system', help='The directory of log files.')
+    parser.add_argument('--pattern', default='*.log*', help='The glob pattern of log files and segments.')
+    parser.add_argument('--turn', help='The prompt ID, or the turn number from 1. Defaults to list all turns.')
+    args = parser.parse_args()
+
+    file_names = sorted(Path(args.log_dir).glob(args.pattern), key=analysis_util.log_file_key)
+    prompts = prompt_log_util.rebuild_prompts(analysis_util.iter_log_lines(file_names))
+    for number, (prompt_id, prompt) in enumerate(prompts, start=1):
+        if args.turn is None:
+            missing = sum(message['role'] == prompt_log_util.MISSING_ROLE for message in prompt)
+            print(f'{number}\t{prompt_id}\t{len(prompt)} messages' + (f' ({missing} missing)' if missing else ''))
+        elif args.turn in (prompt_id, str(number)):
+            print(json.dumps(prompt, ensure_ascii=False, indent=2))
+            break
@@ -3,16 +3,21 @@
 The sound test.
 """
 
+import asyncio
 import time
+from typing import Any
 
+import utilities.pipeline_utilities as pipeline_util
+import utilities.provider_utilities as provider_util
 import utilities.sound_utilities as sound_util
+import utilities.startup_utilities as startup_util
 import utilities.text_utilities as text_util
-from tts.google_tts_wrapper import GoogleTTSWrapper
-from tts.voicevox_wrapper import VoicevoxWrapper
 
 if __name__ == '__main__':
+    startup_util.profile_if_requested()
     voice_host_port = 50021
     voice_host_ip = '192.168.100.211'
+    tts_concurrency = 2
     text = 'いろはにほへとちりぬるを！！？わかよたれそつねならむ。\n'  # noqa: RUF001
     text += 'ういのおくやまきょうこえて！\nあさきゆめみしえひもせす。'  # noqa: RUF001
     # NOTE: Japanese sentence, so use Full-width letter.
@@ -28,12 +33,16 @@ if __name__ == '__main__':
         init_config = {}
         if use_tts == 'voicevox':
             voice_host_address = f'{voice_host_ip}:{voice_host_port}'
-            TTS_client = VoicevoxWrapper(voice_host_address)
+            with startup_util.phase('make TTS client'):
+                TTS_client = provider_util.get_tts_class(use_tts)(voice_host_address)
             break
         elif use_tts == 'google-tts':
-            TTS_client = GoogleTTSWrapper(None)
+            with startup_util.phase('make TTS client'):
+                TTS_client = provider_util.get_tts_class(use_tts)(None)
             break
+        # NOTE: Only the TTS stack of the selected engine is imported.
 
+    startup_util.ready()
     voice_config = {}
     if use_tts == 'voicevox':
         voice_config['speaker'] = 46  # sayo
@@ -53,24 +62,50 @@ if __name__ == '__main__':
     time_s = time.perf_counter()
     word_marks = text_util.WordMarks()
     texts = word_marks.split_text_for_voice(text)
-    sound_controler = sound_util.SoundControler()
-    for txt in texts:
+    playback = sound_util.PlaybackScheduler(sound_util.play_wav_clip, sound_util.stop_wav)
+
+    def synthesize(txt: str) -> tuple[str, bytes, float]:
+        """
+        The tts stage.
+
+        Args:
+            txt (str): The text.
+
+        Returns:
+            tuple[str, bytes, float]: The text, the wav data and the generation time.
+        """
         time_g_s = time.perf_counter()
         audio_query = TTS_client.generate_audio_query(txt, voice_config)
         voice_data = TTS_client.generate_voice(audio_query, voice_config)
-        time_g_e = time.perf_counter()
+        return txt, voice_data, time.perf_counter() - time_g_s
+
+    def play(item: tuple[str, Any, float]) -> None:
+        """
+        The playback stage.
+
+        Args:
+            item (tuple[str, Any, float]): The text, the wav file name and the generation time.
+        """
+        txt, file_name, generation_time = item
         print(f'{txt}')
-        print(f'generate speech: {time_g_e - time_g_s} sec')
-        file_name = sound_util.generate_temp_wav(voice_data)
-        # play voice
-        # NOTE: Play audio while generating text with GPT and generating voice with VOICEVOX.
-        #       For that purpose, we implemented parallel processing using threading.
-        sound_controler.append_thread(sound_util.play_wav, file_name)
-        sound_controler.thread_control()
+        print(f'generate speech: {generation_time} sec')
+        playback.submit(file_name)
 
-    while not sound_controler.is_finish_all_thread():
-        time.sleep(0.1)
-        sound_controler.thread_control()
+    pipeline = pipeline_util.Pipeline(
+        [
+            pipeline_util.Source('text', texts),
+            pipeline_util.Map('tts', synthesize, tts_concurrency),
+            pipeline_util.Map('wav', lambda item: (item[0], sound_util.generate_temp_wav(item[1]), item[2])),
+            pipeline_util.Sink('playback', play),
+        ],
+    )
+    # NOTE: Play audio while generating voice with VOICEVOX.
+    #       The scheduler plays clips in order on its worker thread.
+    asyncio.run(pipeline.run())
+    playback.all_done().result()
+    playback.close()
 
     time_e = time.perf_counter()
     print(f'speech finish: {time_e - time_s} sec')
+    for stage, timing in pipeline.report().items():
+        print(f'{stage}: {timing}')
@@ -5,9 +5,13 @@ The functions required to obtain log data, and the format of the contents to be
 
 from __future__ import annotations
 
+from functools import partial
 from typing import Any
 
-from utilities.log_utilities import Time, logger
+from utilities.log_utilities import Time, TimeForm, log_writer, logger
+from utilities.prompt_log_utilities import PromptDeltaEncoder
+
+prompt_encoder = PromptDeltaEncoder()
 
 
 def standby() -> None:
@@ -20,21 +24,38 @@ def standby() -> None:
 
 def prompt(input_prompt: list[dict[str, str]]) -> None:
     """
-    At make prompt.
+    At make prompt. Only new messages and the references are logged. (see prompt_log_utilities)
+    The lines are made in the writer thread, so the messages are logged again in each log file or segment,
+    and each file can be rebuilt.
 
     Args:
         input_prompt(list[dict[str, str]]): Prompt.
     """
-    datetime_now = Time()
-    for p in input_prompt:
-        role = p['role']
-        content = p['content']
-        text = f'role:{role} content:{content}'
-        logger('prompt', text, datetime_now)
-
+    log_writer.write_deferred(partial(prompt_lines, list(input_prompt), Time()))
     return
 
 
+def prompt_lines(input_prompt: list[dict[str, str]], datetime_now: Time, file_id: int) -> list[str]:
+    """
+    Make the log lines of the prompt in the writer thread.
+
+    Args:
+        input_prompt(list[dict[str, str]]): Prompt.
+        datetime_now(Time): The time of the prompt.
+        file_id(int): The ID of the log file the lines are written to. (LogWriter.opened_files)
+
+    Returns:
+        list[str]: The log lines.
+    """
+    now_str = datetime_now.get_time_str(TimeForm.SYSTEM_LOG)
+    lines = []
+    for status, text in prompt_encoder.encode(input_prompt, file_id):
+        logger(status, text, datetime_now, target='p')
+        lines.append(f'{now_str} [{status}] {text}')
+
+    return lines
+
+
 def on_ready(discord_client: Any) -> None:
     """
     At last of on_ready().
@@ -136,6 +157,34 @@ def first_speach(speach_start_time: float) -> None:
     return
 
 
+def filler(filler_word: str, predicted_time: float | None) -> None:
+    """
+    At aichat() in filler play.
+
+    Args:
+        filler_word(str): The filler word.
+        predicted_time(float | None): The predicted time to first audio. None if not enough measurements.
+    """
+    datetime_now = Time()
+    logger('output:voice', filler_word, datetime_now)
+    logger('system', f'predicted_first_audio_time:{predicted_time}', datetime_now)
+    return
+
+
+def filler_hidden(first_audio_time: float, hidden_time: float) -> None:
+    """
+    At aichat() in first generated voice after filler.
+
+    Args:
+        first_audio_time(float): time of input to first generated voice.
+        hidden_time(float): The latency hidden by the filler.
+    """
+    datetime_now = Time()
+    logger('system', f'first_audio_time:{first_audio_time}', datetime_now)
+    logger('system', f'filler_hidden_time:{hidden_time}', datetime_now)
+    return
+
+
 def output_voice(speach_text: str) -> None:
     """
     At at aichat() in speech.
@@ -161,6 +210,129 @@ def speach_finish(speach_start_time: float, speach_finish_time: float) -> None:
     return
 
 
+def chunking(policy_name: str, metrics: dict[str, Any]) -> None:
+    """
+    At aichat() in all speech finish, with the metrics of the chunking policy.
+
+    Args:
+        policy_name(str): The chunking policy name.
+        metrics(dict[str, Any]): The metrics. (see ChunkingMetrics.report())
+    """
+    datetime_now = Time()
+    logger('system', f'chunking_policy:{policy_name}', datetime_now)
+    for key, value in metrics.items():
+        logger('system', f'chunking_{key}:{value}', datetime_now)
+
+    return
+
+
+def pipeline(report: dict[str, dict[str, Any]]) -> None:
+    """
+    At aichat() in all speech finish, with the timing of each pipeline stage.
+
+    Args:
+        report(dict[str, dict[str, Any]]): The timing per stage. (see Pipeline.report())
+    """
+    datetime_now = Time()
+    for stage, timing in report.items():
+        for key, value in timing.items():
+            logger('system', f'pipeline_{stage}_{key}:{value}', datetime_now)
+
+    return
+
+
+def cancelled(spoken_text: str) -> None:
+    """
+    At aichat() in cancelled by new input or stop command.
+
+    Args:
+        spoken_text(str): The text which was actually spoken.
+    """
+    datetime_now = Time()
+    logger('system', '==== Cancelled ====', datetime_now)
+    logger('system', f'spoken_length:{len(spoken_text)}', datetime_now)
+    return
+
+
+def profiled(seconds: float, file_name: str, summary: str) -> None:
+    """
+    At run_profile() in the sampling profile finish.
+
+    Args:
+        seconds(float): The profiled duration.
+        file_name(str): The collapsed stack file.
+        summary(str): The summary of the hot functions.
+    """
+    datetime_now = Time()
+    logger('system', '==== Profile ====', datetime_now)
+    logger('system', f'profile_seconds:{seconds}', datetime_now)
+    logger('system', f'profile_file:{file_name}', datetime_now)
+    logger('system', f'profile_summary:{summary}', datetime_now)
+    return
+
+
+def memory_snapshot(file_name: str, summary: str) -> None:
+    """
+    At run_memory_snapshot() in the memory snapshot finish.
+
+    Args:
+        file_name(str): The tracemalloc snapshot file.
+        summary(str): The summary of the growth since the last snapshot.
+    """
+    datetime_now = Time()
+    logger('system', '==== MemorySnapshot ====', datetime_now)
+    logger('system', f'memory_snapshot_file:{file_name}', datetime_now)
+    logger('system', f'memory_summary:{summary}', datetime_now)
+    return
+
+
+def loop_blocked(site: str, seconds: float, stack: list[str]) -> None:
+    """
+    At the watchdog in the event loop stall over the threshold.
+
+    Args:
+        site(str): The blocking function in this project.
+        seconds(float): The stall in seconds.
+        stack(list[str]): The stack of the event loop thread, innermost first.
+    """
+    datetime_now = Time()
+    logger('system', '==== LoopBlocked ====', datetime_now)
+    logger('system', f'blocked_site:{site}', datetime_now)
+    logger('system', f'blocked_seconds:{seconds}', datetime_now)
+    logger('system', f'blocked_stack:{" <- ".join(stack)}', datetime_now)
+    return
+
+
+def overloaded(message: Any, policy: str) -> None:
+    """
+    At on_message() in the message is dropped or rejected by the full queue of the guild.
+
+    Args:
+        message(Any): The discord.Message object.
+        policy(str): The overload policy.
+    """
+    datetime_now = Time()
+    logger('system', '==== Overloaded ====', datetime_now)
+    logger('system', f'overload_policy:{policy}', datetime_now)
+    logger('system', f'message_ID:{message.id}', datetime_now)
+    return
+
+
+def background_failed(name: str, error: BaseException) -> None:
+    """
+    At the background work which is not awaited failed, such as saving the opus cache.
+
+    Args:
+        name(str): The name of the work.
+        error(BaseException): The exception.
+    """
+    datetime_now = Time()
+    logger('system', '==== BackgroundFailed ====', datetime_now)
+    logger('system', f'background_name:{name}', datetime_now)
+    logger('system', f'background_error:{error!r}', datetime_now)
+    return
+
+
 def generate_finish(generation_time: float) -> None:
     """
     At at aichat() in finish generate text when no voice.
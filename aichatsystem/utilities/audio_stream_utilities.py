@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+The class and functions for continuous pcm audio stream.
+"""
+
+from __future__ import annotations
+
+import threading
+from array import array
+from collections import deque
+from contextlib import suppress
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+# NOTE: Discord voice requires 48kHz, 16bit, stereo pcm in 20ms frames.
+SAMPLING_RATE = 48000
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+FRAME_LENGTH = 0.02
+SAMPLE_SIZE = CHANNELS * SAMPLE_WIDTH
+FRAME_SIZE = int(SAMPLING_RATE * FRAME_LENGTH) * SAMPLE_SIZE
+
+
+def sec_to_bytes(sec: float) -> int:
+    """
+    Convert seconds to the pcm byte length aligned to a sample.
+
+    Args:
+        sec(float): Length in seconds.
+
+    Returns:
+        int: Length in bytes.
+    """
+    return int(SAMPLING_RATE * sec) * SAMPLE_SIZE
+
+
+def bytes_to_sec(length: int) -> float:
+    """
+    Convert pcm byte length to seconds.
+
+    Args:
+        length(int): Length in bytes.
+
+    Returns:
+        float: Length in seconds.
+    """
+    return length / (SAMPLING_RATE * SAMPLE_SIZE)
+
+
+def fade(pcm: bytes, *, fade_in: bool) -> bytes:
+    """
+    Apply linear fade in or fade out to the pcm.
+
+    Args:
+        pcm(bytes): Sample aligned pcm.
+        fade_in(bool): Fade in if True, otherwise fade out.
+
+    Returns:
+        bytes: Faded pcm.
+    """
+    samples = array('h', pcm)
+    frames = len(samples) // CHANNELS
+    if frames == 0:
+        return pcm
+
+    for idx in range(len(samples)):
+        pos = (idx // CHANNELS) / frames
+        gain = pos if fade_in else 1.0 - pos
+        samples[idx] = int(samples[idx] * gain)
+
+    return samples.tobytes()
+
+
+def crossfade(tail: bytes, head: bytes) -> bytes:
+    """
+    Mix the tail of a clip and the head of the next clip with linear crossfade.
+
+    Args:
+        tail(bytes): Sample aligned pcm of the previous clip tail.
+        head(bytes): Sample aligned pcm of the next clip head. Same length as tail.
+
+    Returns:
+        bytes: Mixed pcm.
+    """
+    tail_samples = array('h', tail)
+    head_samples = array('h', head)
+    frames = len(tail_samples) // CHANNELS
+    if frames == 0:
+        return head
+
+    for idx in range(len(tail_samples)):
+        gain = (idx // CHANNELS) / frames
+        tail_samples[idx] = int(tail_samples[idx] * (1.0 - gain) + head_samples[idx] * gain)
+        # NOTE: Convex combination of int16 values, so never overflow.
+
+    return tail_samples.tobytes()
+
+
+class OpusClip:
+    """
+    The clip of pre-encoded opus packets, one packet per 20ms frame.
+    """
+
+    def __init__(self, packets: Sequence[bytes], mapping: Any = None) -> None:  # noqa: ANN401
+        """
+        Initialize the clip.
+
+        Args:
+            packets(Sequence[bytes]): Opus packets. (ex. memoryview slices of mmap)
+            mapping(Any, optional): The mmap of the packets, which is closed by close(). Defaults to None.
+        """
+        self.packets = packets
+        self.mapping = mapping
+
+    def close(self) -> None:
+        """
+        Release the packets, and close the mapping.
+
+        NOTE: The packets queued for playback are not released here,
+              and the mapping is closed when they are released after playback.
+        """
+        mapping = self.mapping
+        self.packets = []
+        self.mapping = None
+        if mapping is not None:
+            with suppress(BufferError):
+                mapping.close()
+
+        return
+
+    def duration(self) -> float:
+        """
+        Get the length of the clip.
+
+        Returns:
+            float: Length in seconds.
+        """
+        return len(self.packets) * FRAME_LENGTH
+
+
+class JitterBuffer:
+    """
+    The pcm buffer which is read frame by frame and appended clip by clip.
+
+    Pre-encoded opus clips are queued at the position of the pcm written before them,
+    and are passed through without decoding when the pcm is read up to the position.
+
+    NOTE: read_packet() is called from the audio player thread, and append() is called from the event loop.
+          So all buffer access is guarded by the lock.
+    """
+
+    def __init__(self, crossfade_len: float = 0.03, fade_len: float = 0.01) -> None:
+        """
+        Initialize the jitter buffer.
+
+        Args:
+            crossfade_len(float, optional): Crossfade length in seconds at clip boundaries. Defaults to 0.03.
+            fade_len(float, optional): Fade length in seconds from or to silence. Defaults to 0.01.
+        """
+        self.crossfade_size = sec_to_bytes(crossfade_len)
+        self.fade_size = sec_to_bytes(fade_len)
+        self._buffer = bytearray()
+        self._read_pos = 0
+        self._write_pos = 0
+        self._markers = deque()
+        self._opus_clips = deque()
+        self._opus_packets = None
+        self._opus_length = 0
+        self._is_crossfade = True
+        self._lock = threading.Lock()
+        self._drained = threading.Event()
+        self._drained.set()
+        self._silence = bytes(FRAME_SIZE)
+
+    def append(self, pcm: bytes, on_played: Callable[[bool], None] | None = None) -> None:
+        """
+        Append a clip to the buffer.
+
+        Args:
+            pcm(bytes): 48kHz 16bit stereo pcm.
+            on_played(Callable[[bool], None] | None, optional): Called with True when the last frame of the clip
+                was read, or with False when the clip was dropped by clear(). Defaults to None.
+        """
+        pcm = pcm[: len(pcm) - len(pcm) % SAMPLE_SIZE]
+        with self._lock:
+            size = min(self.crossfade_size, len(self._buffer), len(pcm)) if self._is_crossfade else 0
+            if size > 0:
+                mixed = crossfade(bytes(self._buffer[-size:]), pcm[:size])
+                self._buffer[-size:] = mixed
+                self._buffer.extend(pcm[size:])
+                self._write_pos += len(pcm) - size
+            else:
+                size = min(self.fade_size, len(pcm))
+                self._buffer.extend(fade(pcm[:size], fade_in=True))
+                self._buffer.extend(pcm[size:])
+                self._write_pos += len(pcm)
+
+            self._is_crossfade = True
+            if on_played is not None:
+                self._markers.append((self._write_pos, on_played))
+
+            if len(self._buffer) > 0:
+                self._drained.clear()
+
+        if len(pcm) == 0:
+            self._fire_markers()
+
+        return
+
+    def append_opus(self, clip: OpusClip, on_played: Callable[[bool], None] | None = None) -> None:
+        """
+        Append a pre-encoded opus clip to the buffer.
+
+        NOTE: Opus packets can not be mixed, so the clip is not crossfaded.
+              Fades should be applied before encoding.
+
+        Args:
+            clip(OpusClip): The opus clip.
+            on_played(Callable[[bool], None] | None, optional): Called with True when the last packet of the clip
+                was read, or with False when the clip was dropped by clear(). Defaults to None.
+        """
+        if len(clip.packets) == 0:
+            if on_played is not None:
+                on_played(True)  # noqa: FBT003
+
+            return
+
+        with self._lock:
+            self._opus_clips.append((self._write_pos, clip.packets, on_played))
+            self._opus_length += len(clip.packets)
+            self._is_crossfade = False
+            self._drained.clear()
+
+        return
+
+    def read_packet(self) -> tuple[bytes, bool]:
+        """
+        Read one frame, or one opus packet if an opus clip is playing.
+
+        Returns:
+            bytes: 20ms pcm frame, or opus packet. Silence pcm when starved.
+            bool: True if it is opus packet.
+        """
+        with self._lock:
+            packet, fired = self._read_opus()
+            if packet is None:
+                limit = len(self._buffer)
+                if self._opus_clips:
+                    limit = min(limit, self._opus_clips[0][0] - self._read_pos)
+
+                if limit >= FRAME_SIZE:
+                    frame = bytes(self._buffer[:FRAME_SIZE])
+                    del self._buffer[:FRAME_SIZE]
+                    self._read_pos += FRAME_SIZE
+                elif limit > 0:
+                    rest = fade(bytes(self._buffer[:limit]), fade_in=False)
+                    frame = rest + self._silence[limit:]
+                    del self._buffer[:limit]
+                    self._read_pos += limit
+                else:
+                    return self._silence, False
+
+        if packet is not None:
+            if fired is not None:
+                fired(True)  # noqa: FBT003
+
+            return packet, True
+
+        self._fire_markers()
+        return frame, False
+
+    def clear(self) -> None:
+        """
+        Drop all buffered pcm and opus clips, and notify unplayed clips.
+        """
+        with self._lock:
+            self._read_pos = self._write_pos
+            self._buffer.clear()
+            markers = [on_played for _, on_played in self._markers]
+            markers += [on_played for _, _, on_played in self._opus_clips if on_played is not None]
+            if self._opus_packets is not None and self._opus_packets[2] is not None:
+                markers.append(self._opus_packets[2])
+
+            self._markers.clear()
+            self._opus_clips.clear()
+            self._opus_packets = None
+            self._opus_length = 0
+            self._drained.set()
+
+        for on_played in markers:
+            on_played(False)  # noqa: FBT003
+
+        return
+
+    def buffered_time(self) -> float:
+        """
+        Get the length of unplayed pcm and opus clips.
+
+        Returns:
+            float: Buffered time in seconds.
+        """
+        return bytes_to_sec(len(self._buffer)) + self._opus_length * FRAME_LENGTH
+
+    def wait_drained(self, timeout: float | None = None) -> bool:
+        """
+        Block until all buffered pcm and opus clips were read.
+
+        Args:
+            timeout(float | None, optional): Timeout in seconds. Defaults to None.
+
+        Returns:
+            bool: False if timed out.
+        """
+        return self._drained.wait(timeout)
+
+    def _read_opus(self) -> tuple[bytes | None, Callable[[bool], None] | None]:
+        """
+        Read one opus packet if an opus clip is playing or starts at the read position. Call with the lock.
+
+        Returns:
+            bytes | None: Opus packet, or None if no opus clip is playing.
+            Callable[[bool], None] | None: The callback to call if the packet is the last of the clip.
+        """
+        if self._opus_packets is None:
+            if not self._opus_clips or self._opus_clips[0][0] > self._read_pos:
+                return None, None
+
+            _, packets, on_played = self._opus_clips.popleft()
+            self._opus_packets = [packets, 0, on_played]
+
+        packets, idx, on_played = self._opus_packets
+        packet = bytes(packets[idx])
+        self._opus_length -= 1
+        if idx + 1 < len(packets):
+            self._opus_packets[1] = idx + 1
+            return packet, None
+
+        self._opus_packets = None
+        if len(self._buffer) == 0 and not self._opus_clips:
+            self._drained.set()
+
+        return packet, on_played
+
+    def _fire_markers(self) -> None:
+        """
+        Call the callbacks of clips which were played to the end.
+        """
+        fired = []
+        with self._lock:
+            while self._markers and self._markers[0][0] <= self._read_pos:
+                fired.append(self._markers.popleft()[1])
+
+            if len(self._buffer) == 0 and self._opus_packets is None and not self._opus_clips:
+                self._drained.set()
+
+        for on_played in fired:
+            on_played(True)  # noqa: FBT003
+
+        return
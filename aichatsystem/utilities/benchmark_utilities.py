@@ -0,0 +1,644 @@
+#!/usr/bin/env python3
+"""
+The classes and functions for the reproducible benchmark of the voice pipeline.
+
+The LLM stream is replaced by the recorded token trace, which is replayed with its timings.
+The TTS server is replaced by the local stand-in with the VOICEVOX API and configurable synthesis latency,
+and the discord voice client is replaced by the fake sink which reads 20ms frames and timestamps them.
+
+The token trace is JSON lines of the text chunks with the offset from the LLM request:
+{"offset": 0.412, "text": "こんにちは"}
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import logging
+import math
+import random
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
+from urllib.parse import parse_qs, urlsplit
+
+from .audio_stream_utilities import CHANNELS, FRAME_LENGTH, FRAME_SIZE, SAMPLE_WIDTH, SAMPLING_RATE, JitterBuffer
+from .log_analysis_utilities import percentile
+from .pipeline_utilities import Map, Pipeline, Sink, Source, Transform
+from .sound_utilities import PlaybackScheduler
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+TONE_FREQUENCY = 480  # Hz
+# NOTE: 48000 / 480 = 100 samples per period, so the tone is made by repeating one period.
+
+
+class TokenTraceRecorder:
+    """
+    Record the text chunks of the LLM stream with their offsets.
+    """
+
+    def __init__(self, time_start: float | None = None) -> None:
+        """
+        Initialize the recorder.
+
+        Args:
+            time_start(float | None, optional): The time of the LLM request. (time.perf_counter())
+                Defaults to None (now).
+        """
+        self.time_start = time.perf_counter() if time_start is None else time_start
+        self.chunks = []
+
+    def add(self, text: str) -> None:
+        """
+        Record the text chunk received now.
+
+        Args:
+            text(str): The text chunk.
+        """
+        self.chunks.append((time.perf_counter() - self.time_start, text))
+        return
+
+    def save(self, file_name: str | Path) -> None:
+        """
+        Save the token trace.
+
+        Args:
+            file_name(str | Path): The file name. (ex. './log_files/token_trace/xxx.jsonl')
+        """
+        save_token_trace(file_name, self.chunks)
+        return
+
+
+def save_token_trace(file_name: str | Path, chunks: list[tuple[float, str]]) -> None:
+    """
+    Save the token trace as JSON lines.
+
+    Args:
+        file_name(str | Path): The file name.
+        chunks(list[tuple[float, str]]): The offsets in seconds and the text chunks.
+    """
+    Path(file_name).parent.mkdir(parents=True, exist_ok=True)
+    lines = (json.dumps({'offset': round(offset, 4), 'text': text}, ensure_ascii=False) for offset, text in chunks)
+    with Path(file_name).open('w', encoding='utf-8') as f:
+        f.writelines(f'{line}\n' for line in lines)
+
+    return
+
+
+def load_token_trace(file_name: str | Path) -> list[tuple[float, str]]:
+    """
+    Load the token trace.
+
+    Args:
+        file_name(str | Path): The file name.
+
+    Returns:
+        list[tuple[float, str]]: The offsets in seconds and the text chunks, in order of the offset.
+
+    Raises:
+        ValueError: If a line is not the token trace.
+    """
+    chunks = []
+    with Path(file_name).open(encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+
+            try:
+                record = json.loads(line)
+                chunks.append((float(record['offset']), str(record['text'])))
+            except (ValueError, KeyError, TypeError) as e:
+                raise_message = f'Invalid token trace at {file_name}:{line_number}: {e!s}'
+                raise ValueError(raise_message) from e
+
+    return sorted(chunks, key=lambda chunk: chunk[0])
+
+
+def replay_token_trace(chunks: list[tuple[float, str]], speed: float = 1.0) -> Iterator[str]:
+    """
+    Yield the text chunks at their offsets from the first call, like the LLM stream.
+    It blocks like the stream of the LLM client, so the pipeline pulls it in the executor the same as the bot.
+
+    Args:
+        chunks(list[tuple[float, str]]): The token trace.
+        speed(float, optional): The replay speed. 2.0 halves the waits. Defaults to 1.0.
+
+    Yields:
+        str: The text chunk.
+    """
+    time_start = time.perf_counter()
+    for offset, text in chunks:
+        delay = time_start + offset / speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        yield text
+
+
+def make_wav(duration: float) -> bytes:
+    """
+    Make the wav of the tone. The format is the same as the discord voice, so it needs no resampling.
+
+    Args:
+        duration(float): The length in seconds.
+
+    Returns:
+        bytes: 48kHz 16bit stereo wav.
+    """
+    period_length = SAMPLING_RATE // TONE_FREQUENCY
+    period = b''.join(
+        int(8000 * math.sin(2 * math.pi * idx / period_length)).to_bytes(SAMPLE_WIDTH, 'little', signed=True)
+        * CHANNELS
+        for idx in range(period_length)
+    )
+    periods = max(1, round(duration * TONE_FREQUENCY))
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wf:
+        wf.setnchannels(CHANNELS)
+        wf.setsampwidth(SAMPLE_WIDTH)
+        wf.setframerate(SAMPLING_RATE)
+        wf.writeframes(period * periods)
+
+    return buffer.getvalue()
+
+
+def decode_wav(data: bytes) -> bytes:
+    """
+    Read pcm from the wav made by make_wav(). It is the stand-in of decode_pcm() without ffmpeg.
+
+    Args:
+        data(bytes): The wav data.
+
+    Returns:
+        bytes: 48kHz 16bit stereo pcm.
+
+    Raises:
+        ValueError: If the wav is not 48kHz 16bit stereo.
+    """
+    with wave.open(io.BytesIO(data), 'rb') as wf:
+        if (wf.getframerate(), wf.getsampwidth(), wf.getnchannels()) != (SAMPLING_RATE, SAMPLE_WIDTH, CHANNELS):
+            raise_message = 'The wav is not 48kHz 16bit stereo. Decode it with ffmpeg.'
+            raise ValueError(raise_message)
+
+        return wf.readframes(wf.getnframes())
+
+
+class FakeTTSServer:
+    """
+    The local stand-in of the VOICEVOX engine. VoicevoxWrapper works with it as it is.
+
+    The synthesis waits latency + latency_per_char * length (+ random jitter),
+    and returns the tone of speech_time_per_char * length seconds.
+    """
+
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        latency: float = 0.3,
+        latency_per_char: float = 0.01,
+        jitter: float = 0.0,
+        speech_time_per_char: float = 0.12,
+        max_concurrency: int | None = None,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        seed: int = 0,
+    ) -> None:
+        """
+        Initialize the server.
+
+        Args:
+            latency(float, optional): The base synthesis latency in seconds. Defaults to 0.3.
+            latency_per_char(float, optional): The synthesis latency per letter in seconds. Defaults to 0.01.
+            jitter(float, optional): The max random latency added in seconds. Defaults to 0.
+            speech_time_per_char(float, optional): The voice length per letter in seconds. Defaults to 0.12.
+            max_concurrency(int | None, optional): The number of syntheses at the same time, like the workers
+                of the engine. Other requests wait. Defaults to None (no limit).
+            host(str, optional): The host. Defaults to '127.0.0.1'. (local only)
+            port(int, optional): The port. Defaults to 0. (any free port)
+            seed(int, optional): The seed of the jitter. Defaults to 0.
+        """
+        self.latency = latency
+        self.latency_per_char = latency_per_char
+        self.jitter = jitter
+        self.speech_time_per_char = speech_time_per_char
+        self.max_concurrency = max_concurrency
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self._random = random.Random(seed)  # noqa: S311
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._server = None
+
+    @property
+    def address(self) -> str:
+        """
+        The address for VoicevoxWrapper, such as '127.0.0.1:50021'.
+
+        Returns:
+            str: The host and the port.
+        """
+        return f'{self.host}:{self.port}'
+
+    def synthesis_time(self, text: str) -> float:
+        """
+        Get the synthesis latency of the text.
+
+        Args:
+            text(str): The text.
+
+        Returns:
+            float: The latency in seconds.
+        """
+        with self._lock:
+            jitter = self._random.uniform(0.0, self.jitter) if self.jitter > 0 else 0.0
+
+        return self.latency + self.latency_per_char * len(text) + jitter
+
+    def start(self) -> None:
+        """
+        Serve the VOICEVOX API in the background thread.
+        """
+        fake = self
+
+        class FakeTTSHandler(BaseHTTPRequestHandler):
+            """
+            The handler of /speakers, /audio_query and /synthesis.
+            """
+
+            def do_GET(self) -> None:
+                """
+                Respond the speakers.
+                """
+                if urlsplit(self.path).path != '/speakers':
+                    self.send_error(404)
+                    return
+
+                self._respond(json.dumps([{'name': 'bench', 'styles': [{'id': 1, 'name': 'tone'}]}]).encode())
+                return
+
+            def do_POST(self) -> None:
+                """
+                Respond the audio query, or the voice after the synthesis latency.
+                """
+                url = urlsplit(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if url.path == '/audio_query':
+                    audio_query = {'text': params.get('text', ''), 'speedScale': float(params.get('speedScale', 1))}
+                    self._respond(json.dumps(audio_query, ensure_ascii=False).encode())
+                elif url.path == '/synthesis':
+                    audio_query = json.loads(body or b'{}')
+                    text = audio_query.get('text', '')
+                    with fake._lock:
+                        fake.requests += 1
+
+                    if fake._slots is None:
+                        time.sleep(fake.synthesis_time(text))
+                    else:
+                        with fake._slots:
+                            time.sleep(fake.synthesis_time(text))
+
+                    duration = fake.speech_time_per_char * len(text) / audio_query.get('speedScale', 1.0)
+                    self._respond(make_wav(duration), 'audio/wav')
+                else:
+                    self.send_error(404)
+
+                return
+
+            def _respond(self, body: bytes, content_type: str = 'application/json') -> None:
+                """
+                Send the body.
+
+                Args:
+                    body(bytes): The body.
+                    content_type(str, optional): The content type. Defaults to 'application/json'.
+                """
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002, ANN401, ARG002
+                """
+                Do not print access logs.
+                """
+                return
+
+        self._server = ThreadingHTTPServer((self.host, self.port), FakeTTSHandler)
+        self.port = self._server.server_address[1]
+        thread = threading.Thread(target=self._server.serve_forever, name='fake-tts-server', daemon=True)
+        thread.start()
+        logging.info('Fake TTS server started at http://%s', self.address)
+        return
+
+    def stop(self) -> None:
+        """
+        Stop the server.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+        return
+
+
+class FakeVoiceSink:
+    """
+    The stand-in of the discord voice client. The thread reads a frame from the jitter buffer every 20ms,
+    like the audio player of discord, and timestamps the frames which are not silence.
+    """
+
+    def __init__(self, crossfade_len: float = 0.03, fade_len: float = 0.01) -> None:
+        """
+        Initialize the sink. The scheduler is the same as VoiceStreamManager.get_stream().
+
+        Args:
+            crossfade_len(float, optional): Crossfade length in seconds at clip boundaries. Defaults to 0.03.
+            fade_len(float, optional): Fade length in seconds from or to silence. Defaults to 0.01.
+        """
+        self.jitter_buffer = JitterBuffer(crossfade_len, fade_len)
+        self.scheduler = PlaybackScheduler(self.jitter_buffer.append, self.jitter_buffer.clear, max_in_flight=2)
+        self.frame_times = []
+        self._silence = bytes(FRAME_SIZE)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='fake-voice-sink', daemon=True)
+
+    def start(self) -> None:
+        """
+        Start reading frames.
+        """
+        self._thread.start()
+        return
+
+    def stop(self) -> None:
+        """
+        Stop reading frames and close the scheduler.
+        """
+        self._stop.set()
+        self._thread.join()
+        self.scheduler.close()
+        return
+
+    def buffered_time(self) -> float:
+        """
+        Get the playback backlog in the same way as VoiceStreamManager.buffered_time().
+
+        Returns:
+            float: Buffered time in seconds.
+        """
+        return self.jitter_buffer.buffered_time()
+
+    def _run(self) -> None:
+        """
+        Reader thread. The frames are read on the fixed schedule, so a late frame does not shift later frames.
+        """
+        next_time = time.perf_counter()
+        while not self._stop.is_set():
+            packet, is_opus = self.jitter_buffer.read_packet()
+            if is_opus or packet != self._silence:
+                self.frame_times.append(time.perf_counter())
+
+            next_time += FRAME_LENGTH
+            self._stop.wait(max(0.0, next_time - time.perf_counter()))
+
+
+def summarize_frames(frame_times: list[float], time_start: float) -> dict[str, Any]:
+    """
+    Get TTFA, gaps and duration from the timestamps of audio frames.
+    A gap is the silence between audio frames, which is heard as a break in the voice.
+
+    Args:
+        frame_times(list[float]): The timestamps of audio frames. (time.perf_counter())
+        time_start(float): The start time of the turn. (time.perf_counter())
+
+    Returns:
+        dict[str, Any]: 'ttfa', 'duration', 'audio_time' and 'gaps' in seconds.
+            'gaps' has 'count', 'total', 'max', 'p50' and 'p90'.
+    """
+    gaps = sorted(
+        later - earlier - FRAME_LENGTH
+        for earlier, later in zip(frame_times, frame_times[1:])
+        if later - earlier > FRAME_LENGTH * 1.5
+    )
+    # NOTE: The reader wakes up late sometimes, so the delay under half a frame is not a gap.
+    return {
+        'ttfa': frame_times[0] - time_start if frame_times else None,
+        'duration': frame_times[-1] + FRAME_LENGTH - time_start if frame_times else None,
+        'audio_time': len(frame_times) * FRAME_LENGTH,
+        'gaps': {
+            'count': len(gaps),
+            'total': math.fsum(gaps),
+            'max': gaps[-1] if gaps else 0.0,
+            'p50': percentile(gaps, 50) if gaps else 0.0,
+            'p90': percentile(gaps, 90) if gaps else 0.0,
+        },
+    }
+
+
+class Samples:
+    """
+    Collect the observed values in place of the histogram, such as the lag of monitor_loop_lag().
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the samples.
+        """
+        self.values = []
+
+    def observe(self, value: float) -> None:
+        """
+        Add the value.
+
+        Args:
+            value(float): The value.
+        """
+        self.values.append(value)
+        return
+
+    def summary(self) -> dict[str, Any]:
+        """
+        Get the percentiles of the values.
+
+        Returns:
+            dict[str, Any]: 'count', 'mean', 'p50', 'p90', 'p99' and 'max'. None if no values.
+        """
+        values = sorted(self.values)
+        if not values:
+            return {'count': 0, 'mean': None, 'p50': None, 'p90': None, 'p99': None, 'max': None}
+
+        return {
+            'count': len(values),
+            'mean': math.fsum(values) / len(values),
+            'p50': percentile(values, 50),
+            'p90': percentile(values, 90),
+            'p99': percentile(values, 99),
+            'max': values[-1],
+        }
+
+
+def find_saturation(  # noqa: PLR0913, PLR0917
+    steps: list[dict[str, Any]],
+    max_ttfa_increase: float = 1.0,
+    ttfa_slo: float | None = None,
+    max_gap_increase: float = 0.05,
+    max_loop_lag: float = 0.1,
+    min_efficiency: float = 0.5,
+) -> dict[str, Any]:
+    """
+    Find the first step of the ramp which the process can not sustain.
+
+    A step is saturated if TTFA p90 increases from the first step over the limit or is over the SLO,
+    the gap time per audio time increases from the first step over the limit,
+    loop lag p99 is over the limit, messages are dropped, or the throughput per channel falls
+    under the efficiency of the first step.
+
+    Args:
+        steps(list[dict[str, Any]]): The steps in order of channels. Each step has 'channels', 'throughput',
+            'ttfa' and 'loop_lag' (see Samples.summary()), 'gap_ratio' and 'dropped'.
+        max_ttfa_increase(float, optional): The limit of TTFA p90 increase from the first step in seconds.
+            TTFA includes the first token time of the traces, so the increase shows the wait by the load.
+            Defaults to 1.0.
+        ttfa_slo(float | None, optional): The limit of TTFA p90 in seconds. Defaults to None (no limit).
+        max_gap_increase(float, optional): The limit of the gap time per audio time increase from the first step.
+            Defaults to 0.05.
+        max_loop_lag(float, optional): The limit of loop lag p99 in seconds. Defaults to 0.1.
+        min_efficiency(float, optional): The limit of the throughput per channel,
+            relative to the first step. A reply takes as long as its voice,
+            so the step should be several times longer than the replies. Defaults to 0.5.
+
+    Returns:
+        dict[str, Any]: 'max_channels' (the last sustained channels, 0 if none),
+            'saturated_channels' (None if not saturated) and 'reasons'.
+    """
+    base = steps[0]['throughput'] / steps[0]['channels'] if steps and steps[0]['throughput'] else None
+    base_ttfa = steps[0]['ttfa']['p90'] if steps else None
+    base_gap = steps[0]['gap_ratio'] if steps else 0.0
+    max_channels = 0
+    for step in steps:
+        reasons = []
+        ttfa_p90 = step['ttfa']['p90']
+        is_slow = ttfa_p90 is not None and base_ttfa is not None and ttfa_p90 > base_ttfa + max_ttfa_increase
+        if ttfa_p90 is None or is_slow or (ttfa_slo is not None and ttfa_p90 > ttfa_slo):
+            reasons.append('ttfa')
+
+        if step['gap_ratio'] > base_gap + max_gap_increase:
+            reasons.append('gaps')
+
+        if step['loop_lag']['p99'] is not None and step['loop_lag']['p99'] > max_loop_lag:
+            reasons.append('loop_lag')
+
+        if step['dropped'] > 0:
+            reasons.append('dropped')
+
+        if base is not None and step['throughput'] / step['channels'] < base * min_efficiency:
+            reasons.append('throughput')
+
+        if reasons:
+            return {'max_channels': max_channels, 'saturated_channels': step['channels'], 'reasons': reasons}
+
+        max_channels = step['channels']
+
+    return {'max_channels': max_channels, 'saturated_channels': None, 'reasons': []}
+
+
+def round_report(value: Any, digits: int = 3) -> Any:  # noqa: ANN401
+    """
+    Round the floats of the report, so the JSON is easy to diff.
+
+    Args:
+        value(Any): The report or its value.
+        digits(int, optional): The digits. Defaults to 3. (ms)
+
+    Returns:
+        Any: The rounded report.
+    """
+    if isinstance(value, float):
+        return round(value, digits)
+
+    if isinstance(value, dict):
+        return {key: round_report(item, digits) for key, item in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [round_report(item, digits) for item in value]
+
+    return value
+
+
+async def run_replay(  # noqa: PLR0913, PLR0917
+    chunks: list[tuple[float, str]],
+    chunking_policy: Any,  # noqa: ANN401
+    synthesize: Callable[[str], Any],
+    decode: Callable[[bytes], bytes],
+    sink: FakeVoiceSink,
+    tts_concurrency: int = 2,
+    buffer_size: int = 4,
+    speed: float = 1.0,
+    time_start: float | None = None,
+) -> dict[str, Any]:
+    """
+    Replay the token trace through the voice pipeline of aichat(), and measure the voice on the sink.
+    The stages are the same as the bot: llm -> segment -> tts -> decode -> playback.
+
+    Args:
+        chunks(list[tuple[float, str]]): The token trace.
+        chunking_policy(Any): The chunking policy. (see chunking_utilities)
+        synthesize(Callable[[str], Any]): Generate the voice data of the segment. A sync function runs in the executor.
+        decode(Callable[[bytes], bytes]): Convert the voice data to pcm. (ex. decode_wav, decode_pcm)
+        sink(FakeVoiceSink): The started sink. The frames are cleared before the replay.
+        tts_concurrency(int, optional): The max number of TTS requests at the same time. Defaults to 2.
+        buffer_size(int, optional): The max number of items waiting between stages. Defaults to 4.
+        speed(float, optional): The replay speed of the token trace. Defaults to 1.0.
+        time_start(float | None, optional): The time the message was received. (time.perf_counter())
+            TTFA and duration are measured from it. Defaults to None (now).
+
+    Returns:
+        dict[str, Any]: See summarize_frames(), with 'segments', 'cpu_time', 'wall_time' and 'stages'.
+            'cpu_time' is of the whole process, so it includes the stand-in server and the sink threads.
+    """
+    sink.frame_times.clear()
+    segments = []
+
+    def submit(pcm: bytes) -> None:
+        """
+        The playback stage.
+
+        Args:
+            pcm(bytes): The clip.
+        """
+        segments.append(len(pcm))
+        sink.scheduler.submit(pcm)
+
+    pipeline = Pipeline(
+        [
+            Source('llm', replay_token_trace(chunks, speed)),
+            Transform('segment', chunking_policy.feed, chunking_policy.flush),
+            Map('tts', synthesize, tts_concurrency),
+            Map('decode', decode),
+            Sink('playback', submit),
+        ],
+        buffer_size,
+    )
+    cpu_start = time.process_time()
+    time_start = time.perf_counter() if time_start is None else time_start
+    await pipeline.run()
+    await asyncio.wrap_future(sink.scheduler.all_done())
+    wall_time = time.perf_counter() - time_start
+    report = summarize_frames(list(sink.frame_times), time_start)
+    report['segments'] = len(segments)
+    report['cpu_time'] = time.process_time() - cpu_start
+    report['wall_time'] = wall_time
+    report['stages'] = pipeline.report()
+    return report
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+The classes for deciding how streamed text is chunked into TTS requests.
+"""
+
+from __future__ import annotations
+
+import inspect
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from typing import TYPE_CHECKING, Any, Callable
+
+from .text_utilities import StreamingSegmenter, WordMarks
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from concurrent.futures import Future
+
+
+class ChunkingPolicy(metaclass=ABCMeta):
+    """
+    Abstract base class for chunking policies.
+
+    A policy receives streamed text chunks and yields the texts to synthesize.
+    The split marks are defined by WordMarks.
+    """
+
+    name = ''
+
+    def __init__(self, word_marks: WordMarks | None = None) -> None:
+        """
+        Initialize the policy.
+
+        Args:
+            word_marks (WordMarks | None, optional): The split marks. Defaults to None (use WordMarks()).
+        """
+        self.segmenter = StreamingSegmenter(word_marks, drop_new_line=True)
+
+    @abstractmethod
+    def feed(self, chunk: str) -> Iterator[str]:
+        """
+        Feed a text chunk, and yield the texts to synthesize.
+
+        Args:
+            chunk (str): The text chunk.
+
+        Yields:
+            str: The text to synthesize.
+
+        Raises:
+            NotImplementedError: If not implemented in subclass.
+        """
+        raise_message = 'Subclasses must implement feed'
+        raise NotImplementedError(raise_message)
+
+    @abstractmethod
+    def flush(self) -> Iterator[str]:
+        """
+        Yield the rest.
+
+        Yields:
+            str: The text to synthesize.
+
+        Raises:
+            NotImplementedError: If not implemented in subclass.
+        """
+        raise_message = 'Subclasses must implement flush'
+        raise NotImplementedError(raise_message)
+
+    def poll(self) -> Iterator[str]:
+        """
+        Yield the held texts to release while waiting for the next chunk. Called periodically by the consumer.
+
+        Yields:
+            str: The text to synthesize.
+        """
+        yield from ()
+
+    def iter_chunks(self, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Feed all chunks and flush.
+
+        Args:
+            chunks (Iterable[str]): The text chunks. (ex. generator of LLM stream)
+
+        Yields:
+            str: The text to synthesize.
+        """
+        for chunk in chunks:
+            yield from self.feed(chunk)
+
+        yield from self.flush()
+
+
+class SentenceChunkingPolicy(ChunkingPolicy):
+    """
+    Synthesize at every split mark.
+    """
+
+    name = 'sentence'
+
+    def feed(self, chunk: str) -> Iterator[str]:
+        """
+        Feed a text chunk, and yield the completed segments.
+
+        Args:
+            chunk (str): The text chunk.
+
+        Yields:
+            str: The text to synthesize.
+        """
+        yield from self.segmenter.feed(chunk)
+
+    def flush(self) -> Iterator[str]:
+        """
+        Yield the rest.
+
+        Yields:
+            str: The text to synthesize.
+        """
+        yield from self.segmenter.flush()
+
+
+class AdaptiveChunkingPolicy(ChunkingPolicy):
+    """
+    Emit a short first chunk to start speaking early, and merge later segments while playback has backlog.
+
+    The first chunk is emitted at the first split mark, or cut after first_len letters.
+    Later segments are held and merged while the playback backlog is longer than the estimated synthesis time
+    of the merged text, so the number of synthesis round trips decreases without making gaps.
+    The held text is also released by poll() when the backlog drains while the LLM stalls.
+    """
+
+    name = 'adaptive'
+
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        word_marks: WordMarks | None = None,
+        first_len: int = 15,
+        max_len: int = 120,
+        estimate_synthesis: Callable[[int], float | None] | None = None,
+        get_backlog: Callable[[], float] | None = None,
+        margin: float = 0.3,
+    ) -> None:
+        """
+        Initialize the policy.
+
+        Args:
+            word_marks (WordMarks | None, optional): The split marks. Defaults to None (use WordMarks()).
+            first_len (int, optional): The first chunk is cut after this length. Defaults to 15.
+            max_len (int, optional): The max length of merged chunks. Defaults to 120.
+            estimate_synthesis (Callable[[int], float | None] | None, optional):
+                Estimate synthesis time in seconds from the text length. None if unknown. Defaults to None.
+            get_backlog (Callable[[], float] | None, optional): Get the playback backlog in seconds.
+                Defaults to None (always 0, so segments are not merged).
+            margin (float, optional): Safety margin in seconds. Defaults to 0.3.
+        """
+        super().__init__(word_marks)
+        self.first_len = first_len
+        self.max_len = max_len
+        self.estimate_synthesis = estimate_synthesis or (lambda _: None)
+        self.get_backlog = get_backlog or (lambda: 0.0)
+        self.margin = margin
+        self._is_first = True
+        self._merged = []
+        self._merged_len = 0
+
+    def feed(self, chunk: str) -> Iterator[str]:
+        """
+        Feed a text chunk, and yield the texts to synthesize.
+
+        Args:
+            chunk (str): The text chunk.
+
+        Yields:
+            str: The text to synthesize.
+        """
+        for segment in self.segmenter.feed(chunk):
+            yield from self._on_segment(segment)
+
+        if self._is_first and self.segmenter.pending_length() >= self.first_len:
+            self._is_first = False
+            segment = self.segmenter.cut()
+            if segment:
+                yield segment
+
+    def flush(self) -> Iterator[str]:
+        """
+        Yield the merged segments and the rest.
+
+        Yields:
+            str: The text to synthesize.
+        """
+        self._merged.extend(self.segmenter.flush())
+        text = self._release()
+        if text:
+            yield text
+
+    def poll(self) -> Iterator[str]:
+        """
+        Yield the merged segments if the backlog is no longer enough to hold them.
+
+        Yields:
+            str: The text to synthesize.
+        """
+        if self._merged and self._is_gap_risk():
+            yield self._release()
+
+    def _on_segment(self, segment: str) -> Iterator[str]:
+        """
+        Decide to emit or hold the completed segment.
+
+        Args:
+            segment (str): The completed segment.
+
+        Yields:
+            str: The text to synthesize.
+        """
+        if self._is_first:
+            self._is_first = False
+            yield segment
+            return
+
+        self._merged.append(segment)
+        self._merged_len += len(segment)
+        if self._merged_len >= self.max_len or self._is_gap_risk():
+            yield self._release()
+
+    def _is_gap_risk(self) -> bool:
+        """
+        Check whether the playback can run out before the merged text is synthesized.
+
+        Returns:
+            bool: True if the merged text should be synthesized now.
+        """
+        estimated = self.estimate_synthesis(self._merged_len)
+        return estimated is None or self.get_backlog() <= estimated + self.margin
+
+    def _release(self) -> str:
+        """
+        Take the merged text.
+
+        Returns:
+            str: The merged text.
+        """
+        text = ''.join(self._merged)
+        self._merged = []
+        self._merged_len = 0
+        return text
+
+
+CHUNKING_POLICIES = {
+    SentenceChunkingPolicy.name: SentenceChunkingPolicy,
+    AdaptiveChunkingPolicy.name: AdaptiveChunkingPolicy,
+}
+
+
+def make_chunking_policy(name: str, **kwargs: Any) -> ChunkingPolicy:  # noqa: ANN401
+    """
+    Make the chunking policy by name.
+
+    Args:
+        name (str): The policy name. (ex. 'sentence', 'adaptive')
+        **kwargs (Any): Arguments of the policy. Arguments the policy does not have are ignored.
+
+    Returns:
+        ChunkingPolicy: The policy.
+
+    Raises:
+        ValueError: If the name is unknown.
+    """
+    if name not in CHUNKING_POLICIES:
+        raise_message = f'Invalid chunking policy. Supported policies are: {", ".join(CHUNKING_POLICIES)}'
+        raise ValueError(raise_message)
+
+    policy_class = CHUNKING_POLICIES[name]
+    arg_names = inspect.signature(policy_class).parameters
+    return policy_class(**{key: value for key, value in kwargs.items() if key in arg_names})
+
+
+class ChunkingMetrics:
+    """
+    Measure time to first audio and gaps between clips achieved by the chunking policy.
+
+    NOTE: The clips finish in the player thread, so the state of unfinished clips is guarded by the lock.
+    """
+
+    def __init__(self, time_start: float) -> None:
+        """
+        Initialize the metrics.
+
+        Args:
+            time_start (float): The start time of the turn. (time.perf_counter())
+        """
+        self.time_start = time_start
+        self.first_audio_time = None
+        self.gaps = []
+        self.chunk_lens = []
+        self._unfinished = 0
+        self._last_end = None
+        self._lock = threading.Lock()
+
+    def on_submit(self, text: str, future: Future) -> None:
+        """
+        Record the submitted clip. If nothing was playing, the time from the last clip end is a gap.
+
+        Args:
+            text (str): The synthesized text.
+            future (Future): The future of the clip. (see PlaybackScheduler.submit())
+        """
+        now = time.perf_counter()
+        with self._lock:
+            if self.first_audio_time is None:
+                self.first_audio_time = now - self.time_start
+            elif self._unfinished == 0 and self._last_end is not None:
+                self.gaps.append(now - self._last_end)
+
+            self._unfinished += 1
+
+        self.chunk_lens.append(len(text))
+        future.add_done_callback(self._on_done)
+        # NOTE: Outside the lock, because the callback is called at once if the clip is already finished.
+        return
+
+    def report(self) -> dict[str, Any]:
+        """
+        Get the summary.
+
+        Returns:
+            dict[str, Any]: The metrics.
+        """
+        return {
+            'first_audio_time': self.first_audio_time,
+            'chunks': len(self.chunk_lens),
+            'mean_chunk_len': sum(self.chunk_lens) / len(self.chunk_lens) if self.chunk_lens else 0,
+            'gaps': len(self.gaps),
+            'total_gap_time': sum(self.gaps),
+            'max_gap_time': max(self.gaps, default=0.0),
+        }
+
+    def _on_done(self, _: Future) -> None:
+        """
+        Completion callback of the clip.
+        """
+        with self._lock:
+            self._unfinished -= 1
+            self._last_end = time.perf_counter()
+
+        return
@@ -3,9 +3,14 @@
 The functions for get and set configs.
 """
 
+from __future__ import annotations
+
 import logging
+import os
+import threading
+from dataclasses import dataclass, field, fields
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, get_type_hints
 
 import yaml  # pip install pyyaml
 
@@ -39,19 +44,424 @@ def load_config(config_file_name: str = './configs/sample_config.yaml') -> dict[
     return configs
 
 
-def get_config_value(key: str, default: Any = None) -> Any:  # noqa: ANN401
+def get_config_value(
+    key: str,
+    default: Any = None,  # noqa: ANN401
+    config_file_name: str = './configs/sample_config.yaml',
+) -> Any:  # noqa: ANN401
     """
     Get a configuration value by key, with an optional default value.
+    The file is parsed once and cached, and the cache is reloaded by the watcher when the file is changed.
 
     NOTE: The configuration value is unknown, so "Any" is allowed.
+    NOTE: The change is seen after the poll interval of the watcher. (see ConfigService.start_watching())
 
     Args:
         key (str): The configuration key to retrieve.
         default (Any, optional):
             The default value to return if the key is not found. Defaults to None.
+        config_file_name (str, optional): The config file. Defaults to './configs/sample_config.yaml'.
 
     Returns:
         Any: The configuration value associated with the key, or the default value if not found.
     """
-    configs = load_config()
+    service = get_config_service(config_file_name)
+    service.start_watching()
+    configs = service.raw or {}
     return configs.get(key, default)
+
+
+ENV_KEYS = {
+    ('DISCORD', 'API_KEY'): 'DISCORD_API_KEY',
+    ('LLM', 'OPENAI_API_KEY'): 'OPENAI_API_KEY',
+    ('LLM', 'GEMINI_API_KEY'): 'GOOGLE_GEMINI_API_KEY',
+}
+# NOTE: API keys in environment variables take precedence over the file.
+
+
+@dataclass(frozen=True)
+class DebugConfig:
+    """
+    DEBUG section.
+    """
+
+    sound: bool = False
+
+
+@dataclass(frozen=True)
+class CommonConfig:
+    """
+    COMMON section.
+    """
+
+    sound_debug: bool = False
+    system_log: bool = True
+
+
+@dataclass(frozen=True)
+class DiscordConfig:
+    """
+    DISCORD section.
+    """
+
+    api_key: str = ''
+    command_prefix: str = '*'
+    target_txtchannel: str = ''
+    target_voice_channel: str = ''
+    control_txtchannel_id: int = 0
+
+
+@dataclass(frozen=True)
+class LLMConfig:
+    """
+    LLM section.
+    """
+
+    openai_api_key: str = ''
+    gemini_api_key: str = ''
+    use_llm: str = 'openai'
+    use_model: str = 'gpt-4o'
+
+
+@dataclass(frozen=True)
+class TTSConfig:
+    """
+    TTS section.
+    """
+
+    host_ip: str = '127.0.0.1'
+    port: int = 50021
+    use_tts: str = 'voicevox'
+    speaker_id: int = 46
+    speed_scale: float = 1.0
+    volume_scale: float = 1.0
+
+    @property
+    def address(self) -> str:
+        """
+        The TTS server address with port.
+        """
+        return f'{self.host_ip}:{self.port}'
+
+
+@dataclass(frozen=True)
+class FFmpegConfig:
+    """
+    FFMPEG section.
+    """
+
+    fade_len: float = 0.01
+    crossfade_len: float = 0.03
+
+
+@dataclass(frozen=True)
+class CharacterConfig:
+    """
+    CHARACTER section.
+    """
+
+    use_prompt_log: bool = True
+    use_filler: bool = False
+    prompt_log_dir: str = './log_files/prompt/'
+    system_prompt_dir: str = './prompt_files/system/'
+    character_prompt_dir: str = './prompt_files/character/'
+    prompt_log_name: str = 'prompt_log.csv'
+    system_prompt_name: str = 'voicechat.csv'
+    character_prompt_name: str = 'nojyaloli.csv'
+    filler_dir: str = './sound_files/filler/nojyaloli/'
+
+    @property
+    def prompt_log_path(self) -> str:
+        """
+        The prompt log file name with path.
+        """
+        return str(Path(self.prompt_log_dir) / self.prompt_log_name)
+
+    def guild_prompt_log_path(self, guild_id: int) -> str:
+        """
+        Get the prompt log file name with path of the guild. The guild ID is added before the suffix.
+
+        Args:
+            guild_id(int): The guild ID.
+
+        Returns:
+            str: The prompt log file name with path. (ex. ./log_files/prompt/prompt_log.1234.csv)
+        """
+        path = Path(self.prompt_log_dir) / self.prompt_log_name
+        return str(path.with_name(f'{path.stem}.{guild_id}{path.suffix}'))
+
+    @property
+    def system_prompt_path(self) -> str:
+        """
+        The system prompt file name with path.
+        """
+        return str(Path(self.system_prompt_dir) / self.system_prompt_name)
+
+    @property
+    def character_prompt_path(self) -> str:
+        """
+        The character prompt file name with path.
+        """
+        return str(Path(self.character_prompt_dir) / self.character_prompt_name)
+
+
+@dataclass(frozen=True)
+class AppConfig:
+    """
+    The validated snapshot of the config file. Sections are the upper case names in the file.
+    """
+
+    debug: DebugConfig = field(default_factory=DebugConfig)
+    common: CommonConfig = field(default_factory=CommonConfig)
+    discord: DiscordConfig = field(default_factory=DiscordConfig)
+    llm: LLMConfig = field(default_factory=LLMConfig)
+    tts: TTSConfig = field(default_factory=TTSConfig)
+    ffmpeg: FFmpegConfig = field(default_factory=FFmpegConfig)
+    character: CharacterConfig = field(default_factory=CharacterConfig)
+
+    def voice_config(self) -> dict[str, Any]:
+        """
+        Make the config of the TTS wrapper.
+
+        Returns:
+            dict[str, Any]: Configuration for the voice generation.
+        """
+        return {
+            'use_tts': self.tts.use_tts,
+            'speaker_ID': self.tts.speaker_id,
+            'speaker': self.tts.speaker_id,
+            'speed': self.tts.speed_scale,
+            'volume': self.tts.volume_scale,
+        }
+
+    def llm_config(self) -> dict[str, Any]:
+        """
+        Make the config of the LLM wrapper.
+
+        Returns:
+            dict[str, Any]: Configuration for the LLM.
+        """
+        return {'use_llm': self.llm.use_llm, 'use_model': self.llm.use_model}
+
+
+def parse_config(configs: dict[str, Any] | None) -> AppConfig:
+    """
+    Validate the loaded YAML, and make the frozen snapshot. Missing keys use the defaults.
+
+    Args:
+        configs(dict[str, Any] | None): The loaded YAML.
+
+    Returns:
+        AppConfig: The snapshot.
+
+    Raises:
+        TypeError: If the file or a section is not a mapping.
+        ValueError: If a value is invalid.
+    """
+    configs = configs or {}
+    if not isinstance(configs, dict):
+        raise_message = 'The config file must be a mapping of sections.'
+        raise TypeError(raise_message)
+
+    sections = {}
+    hints = get_type_hints(AppConfig)
+    for section_field in fields(AppConfig):
+        section_name = section_field.name.upper()
+        section = configs.get(section_name) or {}
+        if not isinstance(section, dict):
+            raise_message = f'Section {section_name} must be a mapping.'
+            raise TypeError(raise_message)
+
+        sections[section_field.name] = _parse_section(hints[section_field.name], section_name, section)
+
+    return AppConfig(**sections)
+
+
+def _parse_section(section_class: type, section_name: str, section: dict[str, Any]) -> Any:  # noqa: ANN401
+    """
+    Validate the section, and make the dataclass.
+
+    Args:
+        section_class(type): The dataclass of the section.
+        section_name(str): The section name.
+        section(dict[str, Any]): The values of the section.
+
+    Returns:
+        Any: The dataclass of the section.
+
+    Raises:
+        ValueError: If a key is unknown or a value has the wrong type.
+    """
+    hints = get_type_hints(section_class)
+    names = {f.name.upper(): f.name for f in fields(section_class)}
+    unknown = set(section) - set(names)
+    if unknown:
+        raise_message = f'Unknown keys in {section_name}: {", ".join(sorted(unknown))}'
+        raise ValueError(raise_message)
+
+    values = {}
+    for key, name in names.items():
+        env_value = os.getenv(ENV_KEYS.get((section_name, key), ''))
+        if env_value:
+            values[name] = env_value
+            continue
+
+        if key not in section:
+            continue
+
+        value = section[key]
+        expected = hints[name]
+        if expected is float and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+
+        if expected is str and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+
+        if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+            raise_message = f'{section_name}.{key} must be {expected.__name__}, not {type(value).__name__}'
+            raise ValueError(raise_message)
+
+        values[name] = value
+
+    return section_class(**values)
+
+
+class ConfigService:
+    """
+    Serve the config snapshot parsed once. The file is watched, and the new snapshot is swapped in atomically.
+
+    NOTE: Read config.snapshot once per turn, so settings do not change in the middle of the turn.
+    """
+
+    def __init__(self, config_file_name: str = './configs/sample_config.yaml', poll_interval: float = 2.0) -> None:
+        """
+        Initialize the service, and load the file.
+
+        Args:
+            config_file_name(str, optional): The config file. Defaults to './configs/sample_config.yaml'.
+            poll_interval(float, optional): Interval in seconds to check the file. Defaults to 2.0.
+
+        Raises:
+            FileNotFoundError: If the configuration file is not found.
+            yaml.YAMLError: If there's an error parsing the YAML file.
+            TypeError: If the file or a section is not a mapping.
+            ValueError: If the config is invalid.
+        """
+        self.config_file_name = config_file_name
+        self.poll_interval = poll_interval
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._stamp = self._file_stamp()
+        self.raw = load_config(config_file_name)
+        self.snapshot = parse_config(self.raw)
+
+    def add_listener(self, listener: Callable[[AppConfig], Any]) -> None:
+        """
+        Add the listener called with the new snapshot after reload. It is called in the watcher thread.
+
+        Args:
+            listener(Callable[[AppConfig], Any]): The listener.
+        """
+        self._listeners.append(listener)
+        return
+
+    def reload(self) -> bool:
+        """
+        Reload the file. If the new config is invalid, the current snapshot is kept.
+
+        Returns:
+            bool: True if the snapshot is swapped.
+        """
+        self._stamp = self._file_stamp()
+        try:
+            raw = load_config(self.config_file_name)
+            snapshot = parse_config(raw)
+        except (OSError, yaml.YAMLError, ValueError, TypeError):
+            logging.exception('Failed to reload config "%s". The current config is kept.', self.config_file_name)
+            return False
+
+        if raw == self.raw:
+            return False
+
+        is_snapshot_changed = snapshot != self.snapshot
+        self.raw, self.snapshot = raw, snapshot
+        # NOTE: Readers get the old or the new snapshot, because attribute assignment is atomic.
+        logging.info('Config "%s" is reloaded.', self.config_file_name)
+        if not is_snapshot_changed:
+            # NOTE: Only the keys read by get_config_value() are changed, so listeners are not notified.
+            return True
+
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception:  # noqa: PERF203
+                logging.exception('Failed to notify the config change.')
+            # NOTE: A failed listener does not stop notifying the others.
+
+        return True
+
+    def start_watching(self) -> None:
+        """
+        Start the watcher thread, which reloads the file when its modified time or size is changed.
+        """
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._watch, name='config-watcher', daemon=True)
+        self._thread.start()
+        return
+
+    def stop_watching(self) -> None:
+        """
+        Stop the watcher thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        return
+
+    def _watch(self) -> None:
+        """
+        The watcher thread.
+        """
+        while not self._stop.wait(self.poll_interval):
+            if self._file_stamp() != self._stamp:
+                self.reload()
+
+    def _file_stamp(self) -> tuple[int, int] | None:
+        """
+        Get the modified time and the size of the file.
+
+        Returns:
+            tuple[int, int] | None: The stamp, or None if the file is not found.
+        """
+        try:
+            stat = Path(self.config_file_name).stat()
+        except OSError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_config_service(config_file_name: str = './configs/sample_config.yaml') -> ConfigService:
+    """
+    Get the shared config service of the file.
+
+    Args:
+        config_file_name(str, optional): The config file. Defaults to './configs/sample_config.yaml'.
+
+    Returns:
+        ConfigService: The service.
+    """
+    with _services_lock:
+        if config_file_name not in _services:
+            _services[config_file_name] = ConfigService(config_file_name)
+
+        return _services[config_file_name]
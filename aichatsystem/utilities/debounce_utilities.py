@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+The class for merging bursts of messages from the same user into one turn.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class MessageDebouncer:
+    """
+    Wait for the quiet period after the last message of the user, and flush the merged messages.
+
+    With typing_quiet_period, the flush starts early when the user does not start typing again soon.
+    A typing event extends the wait for the next message. The wait never exceeds max_wait from the first message.
+    """
+
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        on_flush: Callable[[Any, Any], Any],
+        merge: Callable[[list[Any]], Any],
+        quiet_period: float = 1.5,
+        max_wait: float = 6.0,
+        typing_quiet_period: float | None = None,
+        typing_wait: float = 5.0,
+    ) -> None:
+        """
+        Initialize the debouncer.
+
+        Args:
+            on_flush(Callable[[Any, Any], Any]): Called with the key and the merged item.
+                If it returns a coroutine, it is run as a task.
+            merge(Callable[[list[Any]], Any]): Merge the items in order into one item.
+            quiet_period(float, optional): The wait after the last message in seconds. Defaults to 1.5.
+            max_wait(float, optional): The max wait from the first message in seconds. Defaults to 6.
+            typing_quiet_period(float | None, optional): If set, the wait after the last message
+                is shortened to this time, and extended by typing events. Defaults to None.
+            typing_wait(float, optional): The wait after the typing event in seconds. Defaults to 5.
+        """
+        self.on_flush = on_flush
+        self.merge = merge
+        self.quiet_period = quiet_period
+        self.max_wait = max_wait
+        self.typing_quiet_period = typing_quiet_period
+        self.typing_wait = typing_wait
+        self.pending = {}
+        self._tasks = set()
+
+    def add(self, key: Any, item: Any) -> None:  # noqa: ANN401
+        """
+        Add the message of the user.
+
+        Args:
+            key(Any): The user key. (ex. guild ID and author ID)
+            item(Any): The item. (ex. message)
+        """
+        if key not in self.pending:
+            self.pending[key] = {'items': [], 'first_time': time.monotonic(), 'timer': None}
+
+        self.pending[key]['items'].append(item)
+        quiet_period = self.quiet_period if self.typing_quiet_period is None else self.typing_quiet_period
+        self._schedule(key, quiet_period)
+        return
+
+    def typing(self, key: Any) -> None:  # noqa: ANN401
+        """
+        Extend the wait, because the user is typing the next message.
+
+        Args:
+            key(Any): The user key.
+        """
+        if key in self.pending and self.typing_quiet_period is not None:
+            self._schedule(key, self.typing_wait)
+
+        return
+
+    def flush(self, key: Any) -> None:  # noqa: ANN401
+        """
+        Flush the messages of the user now.
+
+        Args:
+            key(Any): The user key.
+        """
+        state = self.pending.pop(key, None)
+        if state is None:
+            return
+
+        if state['timer'] is not None:
+            state['timer'].cancel()
+
+        result = self.on_flush(key, self.merge(state['items']))
+        if asyncio.iscoroutine(result):
+            task = asyncio.create_task(result)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        return
+
+    def _schedule(self, key: Any, delay: float) -> None:  # noqa: ANN401
+        """
+        Reschedule the flush after the delay, within the max wait.
+
+        Args:
+            key(Any): The user key.
+            delay(float): The delay in seconds.
+        """
+        state = self.pending[key]
+        if state['timer'] is not None:
+            state['timer'].cancel()
+
+        remaining = state['first_time'] + self.max_wait - time.monotonic()
+        state['timer'] = asyncio.get_running_loop().call_later(max(0.0, min(delay, remaining)), self.flush, key)
+        return
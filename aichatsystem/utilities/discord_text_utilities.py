@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+The class and functions for streaming text replies on discord.
+
+The reply is posted early and edited as the text grows. Edits are coalesced to keep under the rate limit,
+and the text over the message length limit is continued in the next messages.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+MESSAGE_LIMIT = 2000
+SPLIT_MARKS = (('\n',), ('。', '！', '？', '!', '?', '. '), ('、', ',', ' '))  # noqa: RUF001
+# NOTE: The text is split at the last mark of the first group found in the latter half of the limit.
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """
+    Split the text into parts within the message length limit.
+    Each part is cut at a new line, the end of a sentence or a space if possible.
+
+    Args:
+        text(str): The text.
+        limit(int, optional): The message length limit. Defaults to 2000.
+
+    Returns:
+        list[str]: The parts.
+    """
+    parts = []
+    while len(text) > limit:
+        window = text[:limit]
+        cut = limit
+        for marks in SPLIT_MARKS:
+            mark_cut = max(window.rfind(mark) + len(mark) if mark in window else 0 for mark in marks)
+            if mark_cut > limit // 2:
+                cut = mark_cut
+                break
+
+        parts.append(text[:cut])
+        text = text[cut:]
+
+    if text or not parts:
+        parts.append(text)
+
+    return parts
+
+
+class StreamingReply:
+    """
+    Post the reply early, and edit it as the text grows.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[Any]],
+        edit: Callable[[Any, str], Awaitable[Any]],
+        prefix: str = '',
+        min_interval: float = 1.0,
+        limit: int = MESSAGE_LIMIT,
+    ) -> None:
+        """
+        Initialize the reply.
+
+        Args:
+            send(Callable[[str], Awaitable[Any]]): Send new message, and return the message.
+                (ex. lambda content: channel.send(content))
+            edit(Callable[[Any, str], Awaitable[Any]]): Edit the sent message.
+                (ex. lambda sent, content: sent.edit(content=content))
+            prefix(str, optional): The prefix of the first message. (ex. mention) Defaults to ''.
+            min_interval(float, optional): The minimum interval of updates in seconds. Defaults to 1.
+            limit(int, optional): The message length limit. Defaults to 2000.
+        """
+        self.send = send
+        self.edit = edit
+        self.prefix = prefix
+        self.min_interval = min_interval
+        self.limit = limit
+        self.text = ''
+        self.messages = []
+        self.edits = 0
+        self._last_update = None
+        self._task = None
+
+    def feed(self, text: str) -> None:
+        """
+        Add the text. The messages are updated in the background at most once per the interval.
+
+        Args:
+            text(str): The text chunk.
+        """
+        self.text += text
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._update_later())
+
+        return
+
+    async def finish(self, text: str | None = None) -> list[Any]:
+        """
+        Wait for the background update, and update the messages to the final text.
+
+        Args:
+            text(str | None, optional): The final text. Defaults to None (the fed text).
+
+        Returns:
+            list[Any]: The sent messages.
+        """
+        if self._task is not None:
+            await self._task
+
+        if text is not None:
+            self.text = text
+
+        await self._update(self.text)
+        return [sent for sent, _ in self.messages]
+
+    async def _update_later(self) -> None:
+        """
+        Update the messages after the interval, until no text is added during the update.
+        """
+        while True:
+            if self._last_update is not None:
+                delay = self._last_update + self.min_interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            text = self.text
+            try:
+                await self._update(text)
+            except Exception:
+                logging.exception('Failed to update the streaming reply')
+                return
+
+            if self.text == text:
+                return
+
+    async def _update(self, text: str) -> None:
+        """
+        Edit the changed messages, and send the new parts.
+
+        Args:
+            text(str): The text.
+        """
+        self._last_update = time.monotonic()
+        for idx, part in enumerate(split_message(self.prefix + text, self.limit)):
+            if idx >= len(self.messages):
+                self.messages.append((await self.send(part), part))
+                continue
+
+            sent, content = self.messages[idx]
+            if content != part:
+                await self.edit(sent, part)
+                self.messages[idx] = (sent, part)
+                self.edits += 1
+
+        return
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+The class and functions for continuous voice stream on discord voice client.
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+from pathlib import Path
+from typing import Any, Callable
+
+import discord  # pip install discord.py[voice]
+
+from .audio_stream_utilities import CHANNELS, SAMPLING_RATE, JitterBuffer, OpusClip, bytes_to_sec
+from .provider_utilities import lazy_import
+from .sound_utilities import PlaybackScheduler
+
+ffmpeg = lazy_import('ffmpeg')  # pip install ffmpeg-python
+# NOTE: ffmpeg is imported at the first decode, so the startup does not wait for it.
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def decode_pcm(data: bytes) -> bytes:
+    """
+    Decode audio data (ex. wav) to pcm for discord voice.
+
+    Args:
+        data(bytes): Audio file data.
+
+    Returns:
+        bytes: 48kHz 16bit stereo pcm.
+    """
+    pcm, _ = (
+        ffmpeg.input('pipe:')
+        .output('pipe:', format='s16le', acodec='pcm_s16le', ac=CHANNELS, ar=SAMPLING_RATE)
+        .run(input=data, capture_stdout=True, capture_stderr=True)
+    )
+    return pcm
+
+
+class ContinuousAudioSource(discord.AudioSource):
+    """
+    The audio source which never finishes, and plays clips appended to the jitter buffer.
+
+    NOTE: The audio player asks is_opus() for every frame,
+          so pre-encoded opus packets are sent without encoding, and pcm frames are encoded.
+    """
+
+    def __init__(self, jitter_buffer: JitterBuffer) -> None:
+        """
+        Initialize the audio source.
+
+        Args:
+            jitter_buffer(JitterBuffer): The buffer to read frames from.
+        """
+        self.jitter_buffer = jitter_buffer
+        self._is_opus = False
+
+    def append(self, clip: bytes | OpusClip, on_played: Callable[[bool], None] | None = None) -> None:
+        """
+        Append pcm or pre-encoded opus clip to the jitter buffer.
+
+        Args:
+            clip(bytes | OpusClip): 48kHz 16bit stereo pcm, or opus clip.
+            on_played(Callable[[bool], None] | None, optional): Called when the clip was played or dropped.
+                Defaults to None.
+        """
+        if isinstance(clip, OpusClip):
+            self.jitter_buffer.append_opus(clip, on_played)
+        else:
+            self.jitter_buffer.append(clip, on_played)
+
+        return
+
+    def read(self) -> bytes:
+        """
+        Read 20ms frame. It is called from the audio player thread.
+
+        Returns:
+            bytes: pcm frame or opus packet, or silence when starved.
+        """
+        data, self._is_opus = self.jitter_buffer.read_packet()
+        return data
+
+    def is_opus(self) -> bool:
+        """
+        Whether the last read frame is opus packet.
+
+        Returns:
+            bool: True if opus packet.
+        """
+        return self._is_opus
+
+    def cleanup(self) -> None:
+        """
+        Drop buffered pcm when the player stopped.
+        """
+        self.jitter_buffer.clear()
+
+
+class VoiceStreamManager:
+    """
+    Manage one long-lived audio stream and its playback scheduler per guild.
+    """
+
+    def __init__(self, crossfade_len: float = 0.03, fade_len: float = 0.01) -> None:
+        """
+        Initialize the manager.
+
+        Args:
+            crossfade_len(float, optional): Crossfade length in seconds at clip boundaries. Defaults to 0.03.
+            fade_len(float, optional): Fade length in seconds from or to silence. Defaults to 0.01.
+        """
+        self.crossfade_len = crossfade_len
+        self.fade_len = fade_len
+        self.streams = {}
+
+    def get_stream(self, voice_client: discord.VoiceClient) -> PlaybackScheduler:
+        """
+        Get the playback scheduler of the guild. If the stream is not playing, start new one.
+
+        NOTE: Two clips are passed to the jitter buffer at once,
+              so the next clip is already buffered and crossfaded when the previous clip ends.
+
+        Args:
+            voice_client(discord.VoiceClient): The connected voice client.
+
+        Returns:
+            PlaybackScheduler: The scheduler to submit pcm or opus clips.
+        """
+        guild_id = voice_client.guild.id
+        if guild_id in self.streams and voice_client.is_playing():
+            return self.streams[guild_id][1]
+
+        self.stop_stream(guild_id)
+        if voice_client.is_playing():
+            voice_client.stop()
+
+        jitter_buffer = JitterBuffer(self.crossfade_len, self.fade_len)
+        source = ContinuousAudioSource(jitter_buffer)
+        scheduler = PlaybackScheduler(source.append, jitter_buffer.clear, max_in_flight=2)
+        voice_client.play(source)
+        self.streams[guild_id] = (jitter_buffer, scheduler)
+        return scheduler
+
+    def buffered_time(self, guild_id: int) -> float:
+        """
+        Get the playback backlog of the guild.
+
+        Args:
+            guild_id(int): The guild ID.
+
+        Returns:
+            float: Buffered time in seconds. 0 if the stream is not started.
+        """
+        stream = self.streams.get(guild_id)
+        if stream is None:
+            return 0.0
+
+        jitter_buffer, _ = stream
+        return jitter_buffer.buffered_time()
+
+    def stop_stream(self, guild_id: int) -> None:
+        """
+        Drop the stream of the guild.
+
+        Args:
+            guild_id(int): The guild ID.
+        """
+        stream = self.streams.pop(guild_id, None)
+        if stream is not None:
+            _, scheduler = stream
+            scheduler.close()
+
+        return
+
+
+class FillerBank:
+    """
+    Filler clips decoded into memory at startup.
+    """
+
+    def __init__(self, filler_words: list[str], filler_dir: str, opus_cache: Any = None) -> None:  # noqa: ANN401
+        """
+        Initialize the filler bank.
+
+        Args:
+            filler_words(list[str]): Filler words. The wav file is '{filler_dir}{word}.wav'.
+            filler_dir(str): The directory of filler wav files.
+            opus_cache(Any, optional): The OpusCache. Pre-encoded clips are used if cached. Defaults to None.
+        """
+        self.filler_words = filler_words
+        self.filler_dir = filler_dir
+        self.opus_cache = opus_cache
+        self.fillers = {}
+
+    def load(self) -> int:
+        """
+        Load all filler clips.
+
+        Returns:
+            int: Number of loaded fillers.
+        """
+        for word in self.filler_words:
+            file_name = f'{self.filler_dir}{word}.wav'
+            clip = self.opus_cache.get(word) if self.opus_cache is not None else None
+            try:
+                if clip is None:
+                    clip = decode_pcm(Path(file_name).read_bytes())
+            except (OSError, ffmpeg.Error):
+                logging.exception('Failed to load filler %s', file_name)
+                continue
+
+            duration = clip.duration() if isinstance(clip, OpusClip) else bytes_to_sec(len(clip))
+            self.fillers[word] = (file_name, clip, duration)
+
+        return len(self.fillers)
+
+    def choose(self) -> tuple[str, str, bytes | OpusClip, float] | None:
+        """
+        Choose a filler at random.
+
+        NOTE: Use random module because do not need secure here.
+
+        Returns:
+            tuple[str, str, bytes | OpusClip, float] | None: The filler word, wav file name, clip and duration,
+                or None if no filler was loaded.
+        """
+        if len(self.fillers) == 0:
+            return None
+
+        word = random.choice(list(self.fillers))  # noqa: S311
+        return (word, *self.fillers[word])
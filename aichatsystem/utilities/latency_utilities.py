@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+The class and functions for predicting latency from recent measurements.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+
+
+def prompt_length(prompt: list[dict[str, str]]) -> int:
+    """
+    Get the length of the prompt. The content key differs by LLM, so count all values.
+
+    Args:
+        prompt(list[dict[str, str]]): Prompt.
+
+    Returns:
+        int: Number of letters.
+    """
+    return sum(len(str(value)) for p in prompt for value in p.values())
+
+
+class LatencyPredictor:
+    """
+    Predict the latency (ex. time to first audio) of the next request.
+
+    Recent measurements are kept per provider and model,
+    and the latency is fitted linearly by the prompt length.
+    """
+
+    def __init__(self, window: int = 50, min_samples: int = 3) -> None:
+        """
+        Initialize the predictor.
+
+        Args:
+            window(int, optional): Number of recent measurements to keep per model. Defaults to 50.
+            min_samples(int, optional): Number of measurements required to predict. Defaults to 3.
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, model: str, length: int, latency: float) -> None:
+        """
+        Record a measurement.
+
+        Args:
+            provider(str): The LLM provider name. (ex. 'openai')
+            model(str): The model name. (ex. 'gpt-4o')
+            length(int): The prompt length.
+            latency(float): The measured latency in seconds.
+        """
+        with self._lock:
+            samples = self.samples.setdefault((provider, model), deque(maxlen=self.window))
+            samples.append((length, latency))
+
+        return
+
+    def predict(self, provider: str, model: str, length: int) -> float | None:
+        """
+        Predict the latency.
+
+        Args:
+            provider(str): The LLM provider name. (ex. 'openai')
+            model(str): The model name. (ex. 'gpt-4o')
+            length(int): The prompt length.
+
+        Returns:
+            float | None: The predicted latency in seconds, or None if not enough measurements.
+        """
+        with self._lock:
+            samples = list(self.samples.get((provider, model), ()))
+
+        if len(samples) < self.min_samples:
+            return None
+
+        mean_length = sum(x for x, _ in samples) / len(samples)
+        mean_latency = sum(y for _, y in samples) / len(samples)
+        variance = sum((x - mean_length) ** 2 for x, _ in samples)
+        if variance == 0:
+            return mean_latency
+
+        slope = sum((x - mean_length) * (y - mean_latency) for x, y in samples) / variance
+        return max(0.0, mean_latency + slope * (length - mean_length))
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+The functions for analyzing latency of replies from the system log files.
+
+The log files are parsed line by line, so large archives are not loaded into memory.
+Only the values of each reply are kept to compute percentiles.
+"""
+
+from __future__ import annotations
+
+import csv
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+from contextlib import suppress
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .log_utilities import TimeForm, open_log_text
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+LINE_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) \[([^\]#]+)(?:#([^\]]+))?\] (.*)$', re.DOTALL)
+REPLY_START = '==== GenerateSpeach ===='
+REPLY_CANCELLED = '==== Cancelled ===='
+REPLY_END_FIELD = 'text_length'
+TEXT_FIELDS = {'llm_name': 'llm', 'model_name': 'model', 'speaker_name': 'speaker', 'speaker_ID': 'speaker_id'}
+NUMBER_FIELDS = ('speach_start_time', 'speach_finish_time', 'generation_time', 'first_audio_time', 'text_length')
+PERCENTILES = (50, 90, 99)
+NUMBER_PATTERN = re.compile(r'(\d+)')
+
+
+def log_file_key(file_name: str | Path) -> tuple[Any, ...]:
+    """
+    Get the sort key of the log file. (ex. 2024_0601.999.log.gz < 2024_0601.1000.log.gz < 2024_0601.log)
+    The numbers in the file name are compared as numbers, so the segments are in the written order,
+    and the active file is after them.
+
+    Args:
+        file_name(str | Path): The log file name.
+
+    Returns:
+        tuple[Any, ...]: The sort key.
+    """
+    parts = NUMBER_PATTERN.split(Path(file_name).name)
+    return tuple(int(part) if idx % 2 else part for idx, part in enumerate(parts))
+
+
+def iter_log_lines(file_names: Iterable[str | Path]) -> Iterator[str]:
+    """
+    Read log lines of the files in order. A log line can have new lines in CSV quotes.
+    Compressed segments are decompressed transparently.
+
+    Args:
+        file_names(Iterable[str | Path]): The log file names.
+
+    Yields:
+        str: The log line. (ex. '2024-01-01 12:00:00 [system] model_name:gpt-4o')
+    """
+    for file_name in file_names:
+        yield from _iter_file_lines(file_name)
+
+
+def _iter_file_lines(file_name: str | Path) -> Iterator[str]:
+    """
+    Read log lines of the file. The error is logged, and the lines read before it are kept.
+
+    Args:
+        file_name(str | Path): The log file name.
+
+    Yields:
+        str: The log line.
+    """
+    try:
+        with open_log_text(file_name) as f:
+            for row in csv.reader(f):
+                if row:
+                    yield row[0]
+    except (OSError, EOFError, UnicodeDecodeError, ValueError, csv.Error):
+        logging.exception('Failed to read log file %s', file_name)
+
+
+def parse_record(line: str) -> tuple[datetime, str, str | None, str] | None:
+    """
+    Parse the log line with the turn ID, which is added by log_utilities.current_turn.
+
+    Args:
+        line(str): The log line. (ex. '2024-01-01 12:00:00 [system#1a2b-3c4d-5] model_name:gpt-4o')
+
+    Returns:
+        tuple[datetime, str, str | None, str] | None: The time, the status, the turn ID and the text.
+            The turn ID is None if the line has no turn ID. None if not the log line.
+    """
+    match = LINE_PATTERN.match(line)
+    if match is None:
+        return None
+
+    time_str, status, turn, text = match.groups()
+    return datetime.strptime(time_str, TimeForm.SYSTEM_LOG.value), status, turn, text  # noqa: DTZ007
+
+
+def parse_line(line: str) -> tuple[datetime, str, str] | None:
+    """
+    Parse the log line.
+
+    Args:
+        line(str): The log line.
+
+    Returns:
+        tuple[datetime, str, str] | None: The time, the status and the text. None if not the log line.
+    """
+    record = parse_record(line)
+    if record is None:
+        return None
+
+    log_time, status, _, text = record
+    return log_time, status, text
+
+
+def update_reply(reply: dict[str, Any], text: str) -> bool:
+    """
+    Update the reply by the text of the system log line.
+
+    Args:
+        reply(dict[str, Any]): The reply. (see iter_replies())
+        text(str): The text. (ex. 'model_name:gpt-4o')
+
+    Returns:
+        bool: True if the reply is finished. (REPLY_END_FIELD)
+    """
+    if text == REPLY_CANCELLED:
+        reply['cancelled'] = True
+        return False
+
+    key, sep, value = text.partition(':')
+    if not sep:
+        return False
+
+    if key in TEXT_FIELDS:
+        reply[TEXT_FIELDS[key]] = value
+    elif key in NUMBER_FIELDS:
+        with suppress(ValueError):
+            reply[key] = float(value)
+
+    return key == REPLY_END_FIELD
+
+
+def iter_replies(lines: Iterable[str]) -> Iterator[dict[str, Any]]:
+    """
+    Collect the metrics of each reply. A reply starts at '==== GenerateSpeach ====', and ends at REPLY_END_FIELD.
+    The lines of the turns at the same time are told apart by the turn ID.
+    The lines without the turn ID (the old format) are collected in order.
+
+    Args:
+        lines(Iterable[str]): The log lines.
+
+    Yields:
+        dict[str, Any]: The reply. It has 'time', 'llm', 'model', 'speaker', 'speaker_id', 'cancelled'
+            and the values of NUMBER_FIELDS found in the log.
+    """
+    replies = {}
+    for line in lines:
+        record = parse_record(line)
+        if record is None or record[1] != 'system':
+            continue
+
+        log_time, _, turn, text = record
+        if text == REPLY_START:
+            if turn in replies:
+                yield replies.pop(turn)
+
+            replies[turn] = {'time': log_time, 'cancelled': False}
+        elif turn in replies and update_reply(replies[turn], text):
+            yield replies.pop(turn)
+
+    yield from replies.values()
+
+
+def filter_replies(
+    replies: Iterable[dict[str, Any]],
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> Iterator[dict[str, Any]]:
+    """
+    Filter the replies by time.
+
+    Args:
+        replies(Iterable[dict[str, Any]]): The replies.
+        since(datetime | None, optional): Include replies at or after this time. Defaults to None.
+        until(datetime | None, optional): Include replies before this time. Defaults to None.
+
+    Yields:
+        dict[str, Any]: The reply.
+    """
+    for reply in replies:
+        if since is not None and reply['time'] < since:
+            continue
+
+        if until is not None and reply['time'] >= until:
+            continue
+
+        yield reply
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """
+    Get the percentile by linear interpolation.
+
+    Args:
+        sorted_values(list[float]): The sorted values.
+        q(float): The percentile. (0 - 100)
+
+    Returns:
+        float: The percentile value. NaN if no values.
+    """
+    if not sorted_values:
+        return math.nan
+
+    pos = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+
+
+def summarize(
+    replies: Iterable[dict[str, Any]],
+    group_by: str | None = None,
+    metrics: tuple[str, ...] = NUMBER_FIELDS,
+) -> list[dict[str, Any]]:
+    """
+    Compute percentiles of the metrics per group.
+
+    Args:
+        replies(Iterable[dict[str, Any]]): The replies.
+        group_by(str | None, optional): The key to group by. (ex. 'model', 'speaker') Defaults to None (all).
+        metrics(tuple[str, ...], optional): The metrics. Defaults to NUMBER_FIELDS.
+
+    Returns:
+        list[dict[str, Any]]: The rows. Each row has 'group', 'metric', 'count', 'mean' and 'p50', 'p90', 'p99'.
+    """
+    values = defaultdict(lambda: defaultdict(list))
+    for reply in replies:
+        group = reply.get(group_by, '-') if group_by else 'all'
+        for metric in metrics:
+            if metric in reply:
+                values[group][metric].append(reply[metric])
+
+    rows = []
+    for group in sorted(values):
+        for metric in metrics:
+            metric_values = sorted(values[group][metric])
+            if not metric_values:
+                continue
+
+            row = {'group': group, 'metric': metric, 'count': len(metric_values)}
+            row['mean'] = sum(metric_values) / len(metric_values)
+            for q in PERCENTILES:
+                row[f'p{q}'] = percentile(metric_values, q)
+
+            rows.append(row)
+
+    return rows
+
+
+def throughput_per_hour(replies: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Count replies per hour.
+
+    Args:
+        replies(Iterable[dict[str, Any]]): The replies.
+
+    Returns:
+        list[dict[str, Any]]: The rows. Each row has 'hour', 'replies' and 'cancelled'.
+    """
+    counts = Counter()
+    cancelled = Counter()
+    for reply in replies:
+        hour = reply['time'].strftime('%Y-%m-%d %H:00')
+        counts[hour] += 1
+        cancelled[hour] += reply['cancelled']
+
+    return [{'hour': hour, 'replies': counts[hour], 'cancelled': cancelled[hour]} for hour in sorted(counts)]
+
+
+def compare(
+    before: list[dict[str, Any]],
+    after: list[dict[str, Any]],
+    threshold: float = 0.1,
+) -> list[dict[str, Any]]:
+    """
+    Compare the summaries of two date ranges, and mark regressions.
+
+    Args:
+        before(list[dict[str, Any]]): The summary of the base range. (see summarize())
+        after(list[dict[str, Any]]): The summary of the target range.
+        threshold(float, optional): The relative increase of p50 or p90 marked as regression. Defaults to 0.1.
+
+    Returns:
+        list[dict[str, Any]]: The rows. Each row has 'group', 'metric', the percentiles of both ranges,
+            their relative changes and 'regression'.
+    """
+    base = {(row['group'], row['metric']): row for row in before}
+    rows = []
+    for row in after:
+        key = (row['group'], row['metric'])
+        if key not in base:
+            continue
+
+        result = {'group': row['group'], 'metric': row['metric']}
+        is_regression = False
+        for q in PERCENTILES:
+            name = f'p{q}'
+            old, new = base[key][name], row[name]
+            change = (new - old) / old if old else math.nan
+            result[f'before_{name}'] = old
+            result[f'after_{name}'] = new
+            result[f'change_{name}'] = change
+            if q in (50, 90) and change > threshold and row['metric'] != 'text_length':
+                is_regression = True
+
+        result['regression'] = is_regression
+        rows.append(result)
+
+    return rows
+
+
+def format_table(rows: list[dict[str, Any]]) -> str:
+    """
+    Format the rows as a text table.
+
+    Args:
+        rows(list[dict[str, Any]]): The rows.
+
+    Returns:
+        str: The table.
+    """
+    if not rows:
+        return '(no data)'
+
+    columns = list(rows[0])
+    cells = [[_format_cell(row.get(column)) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(cell[idx]) for cell in cells)) for idx, column in enumerate(columns)]
+    lines = ['  '.join(column.ljust(width) for column, width in zip(columns, widths))]
+    lines.append('  '.join('-' * width for width in widths))
+    for row, cell_row in zip(rows, cells):
+        aligned = (
+            cell.rjust(width) if isinstance(row.get(column), (int, float)) else cell.ljust(width)
+            for column, cell, width in zip(columns, cell_row, widths)
+        )
+        lines.append('  '.join(aligned))
+
+    return '\n'.join(lines)
+
+
+def write_csv(rows: list[dict[str, Any]], f: Any) -> None:  # noqa: ANN401
+    """
+    Write the rows as CSV.
+
+    Args:
+        rows(list[dict[str, Any]]): The rows.
+        f(Any): The text file. (ex. sys.stdout)
+    """
+    if not rows:
+        return
+
+    writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return
+
+
+def _format_cell(value: Any) -> str:  # noqa: ANN401
+    """
+    Format the value of the table cell.
+
+    Args:
+        value(Any): The value.
+
+    Returns:
+        str: The formatted value.
+    """
+    if isinstance(value, float):
+        return f'{value:.3f}'
+
+    return str(value)
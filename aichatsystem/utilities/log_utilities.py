@@ -8,12 +8,30 @@ The functions required to obtain log data, and the format of the contents to be
 
 from __future__ import annotations
 
+import atexit
 import csv
+import gzip
+import io
 import logging
+import queue
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Literal
+from typing import IO, TYPE_CHECKING, Literal
+
+try:
+    import zstandard  # pip install zstandard
+except ImportError:
+    zstandard = None
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -112,6 +130,539 @@ def export_log(log_text: str, log_file_name: str) -> None:
         logging.exception('Failed to write to log file %s', log_file_name)
 
 
+COMPRESSED_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+DATE_PREFIX = re.compile(r'^\d{4}_\d{4}')
+# NOTE: The file name by TimeForm.LOG_FILE_NAME.
+RETENTION_INTERVAL = 3600  # sec
+
+
+def log_name_pattern(log_file_name: str | Path) -> re.Pattern[str]:
+    """
+    Get the pattern of the file names of the same log. (ex. 2024_0601.p1.log -> 2024_0530.p1.003.log.gz)
+    The date of the file name can be different, and the numbered segments and the compressed ones are included.
+
+    Args:
+        log_file_name(str | Path): Log file name with path.
+
+    Returns:
+        re.Pattern[str]: The pattern of the file names.
+    """
+    path = Path(log_file_name)
+    date = DATE_PREFIX.match(path.stem)
+    stem = re.escape(path.stem) if date is None else DATE_PREFIX.pattern[1:] + re.escape(path.stem[date.end() :])
+    compressed = '|'.join(re.escape(suffix) for suffix in COMPRESSED_SUFFIXES.values())
+    return re.compile(rf'^{stem}(\.\d+)?{re.escape(path.suffix)}({compressed})?$')
+
+
+def open_log_text(log_file_name: str | Path) -> IO[str]:
+    """
+    Open the log file to read. Compressed segments (.gz, .zst) are decompressed transparently.
+
+    Args:
+        log_file_name(str | Path): Log file name with path.
+
+    Returns:
+        IO[str]: The text file. Close it after use.
+
+    Raises:
+        ValueError: If the file is zstd compressed and zstandard is not installed.
+    """
+    path = Path(log_file_name)
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+
+    if path.suffix == '.zst':
+        if zstandard is None:
+            raise_message = f'zstandard is required to read {path}'
+            raise ValueError(raise_message)
+
+        reader = zstandard.ZstdDecompressor().stream_reader(path.open('rb'), closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8', newline='')
+
+    return path.open(encoding='utf-8', newline='')
+
+
+class LogRotation:
+    """
+    Rotation policy of log files.
+
+    The active file is renamed to the numbered segment (ex. 2024_0601.log -> 2024_0601.001.log)
+    when it exceeds the size or the age. Segments are compressed, and old files are removed, in the background.
+    Old files are also removed when the file is opened, and every RETENTION_INTERVAL.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 10 * 1024 * 1024,
+        max_age: float | None = None,
+        compression: Literal['gzip', 'zstd'] | None = 'gzip',
+        retention_days: float | None = 30,
+    ) -> None:
+        """
+        Initialize the policy.
+
+        Args:
+            max_bytes(int, optional): Rotate when the file exceeds this size. Defaults to 10MiB.
+            max_age(float | None, optional): Rotate when the file is opened longer than this time in seconds.
+                Defaults to None. (The system log is already split per day by the file name.)
+            compression(Literal['gzip', 'zstd'] | None, optional): Compression of segments. Defaults to 'gzip'.
+            retention_days(float | None, optional): Remove log files older than this. Defaults to 30.
+
+        Raises:
+            ValueError: If the compression is not supported.
+        """
+        if compression is not None and compression not in COMPRESSED_SUFFIXES:
+            raise_message = f'Invalid compression. Supported compressions are: {", ".join(COMPRESSED_SUFFIXES)}'
+            raise ValueError(raise_message)
+
+        if compression == 'zstd' and zstandard is None:
+            raise_message = 'zstandard is required for zstd compression'
+            raise ValueError(raise_message)
+
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compression = compression
+        self.retention_days = retention_days
+        self.expired_at = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='log-compress')
+
+    def should_rotate(self, size: int, opened_at: float) -> bool:
+        """
+        Check the active file.
+
+        Args:
+            size(int): The file size.
+            opened_at(float): The time the file was opened. (time.monotonic())
+
+        Returns:
+            bool: True if the file should be rotated.
+        """
+        if size >= self.max_bytes:
+            return True
+
+        return self.max_age is not None and time.monotonic() - opened_at >= self.max_age
+
+    def rotate(self, log_file_name: str | Path) -> Path | None:
+        """
+        Rename the closed active file to the next segment, and compress it in the background.
+
+        Args:
+            log_file_name(str | Path): The closed active file.
+
+        Returns:
+            Path | None: The segment before compression, or None if failed.
+        """
+        path = Path(log_file_name)
+        pattern = re.compile(rf'^{re.escape(path.stem)}\.(\d+){re.escape(path.suffix)}')
+        numbers = [int(match.group(1)) for f in path.parent.iterdir() if (match := pattern.match(f.name))]
+        segment = path.with_name(f'{path.stem}.{max(numbers, default=0) + 1:03d}{path.suffix}')
+        try:
+            path.replace(segment)
+        except OSError:
+            logging.exception('Failed to rotate log file %s', path)
+            return None
+
+        self._executor.submit(self._finish_segment, segment, path)
+        return segment
+
+    def compress(self, segment: Path) -> Path:
+        """
+        Compress the segment, and remove the original.
+
+        Args:
+            segment(Path): The segment.
+
+        Returns:
+            Path: The compressed segment. The original if compression is disabled.
+        """
+        if self.compression is None:
+            return segment
+
+        compressed = segment.with_name(segment.name + COMPRESSED_SUFFIXES[self.compression])
+        temp_file_name = compressed.with_name(compressed.name + '.tmp')
+        with segment.open('rb') as src, temp_file_name.open('wb') as dst:
+            if self.compression == 'gzip':
+                with gzip.GzipFile(fileobj=dst, mode='wb') as writer:
+                    shutil.copyfileobj(src, writer)
+            else:
+                zstandard.ZstdCompressor().copy_stream(src, dst)
+
+        temp_file_name.replace(compressed)
+        segment.unlink()
+        return compressed
+
+    def is_expire_due(self) -> bool:
+        """
+        Check whether RETENTION_INTERVAL has passed since the last expire().
+
+        Returns:
+            bool: True if the retention should be applied.
+        """
+        return self.retention_days is not None and (
+            self.expired_at is None or time.monotonic() - self.expired_at >= RETENTION_INTERVAL
+        )
+
+    def expire(self, active_path: str | Path) -> None:
+        """
+        Remove the expired files of the same log as the active file in the background.
+
+        Args:
+            active_path(str | Path): The active file.
+        """
+        if self.retention_days is None:
+            return
+
+        self.expired_at = time.monotonic()
+        self._executor.submit(self._remove_expired_safely, Path(active_path))
+        return
+
+    def remove_expired(self, log_dir: Path, active_path: Path) -> list[Path]:
+        """
+        Remove log files and segments older than the retention.
+        Only the files of the same log as the active file are removed, see log_name_pattern().
+
+        Args:
+            log_dir(Path): The log directory.
+            active_path(Path): The active file, which is never removed.
+
+        Returns:
+            list[Path]: The removed files.
+        """
+        if self.retention_days is None:
+            return []
+
+        expire_time = time.time() - self.retention_days * 86400
+        pattern = log_name_pattern(active_path)
+        removed = []
+        for file_name in log_dir.iterdir():
+            if file_name == active_path or not pattern.match(file_name.name) or not file_name.is_file():
+                continue
+
+            if file_name.stat().st_mtime < expire_time:
+                file_name.unlink()
+                removed.append(file_name)
+
+        return removed
+
+    def wait(self) -> None:
+        """
+        Wait until all background compression is finished.
+        """
+        self._executor.submit(lambda: None).result()
+        return
+
+    def _finish_segment(self, segment: Path, active_path: Path) -> None:
+        """
+        Compress the segment and apply the retention. It runs in the background thread.
+
+        Args:
+            segment(Path): The segment.
+            active_path(Path): The active file.
+        """
+        try:
+            self.compress(segment)
+            self.remove_expired(segment.parent, active_path)
+        except Exception:
+            logging.exception('Failed to compress log segment %s', segment)
+
+        return
+
+    def _remove_expired_safely(self, active_path: Path) -> None:
+        """
+        Apply the retention. It runs in the background thread.
+
+        Args:
+            active_path(Path): The active file.
+        """
+        try:
+            self.remove_expired(active_path.parent, active_path)
+        except OSError:
+            logging.exception('Failed to remove expired log files of %s', active_path)
+
+        return
+
+
+_FLUSH = object()
+# NOTE: Queue item to flush the log file.
+
+
+class LogWriter:
+    """
+    Write log lines in the background thread.
+
+    The log file is kept open, and lines are queued and written in batches.
+    So logging does not do disk I/O on the caller thread (ex. the event loop).
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 10000,
+        flush_size: int = 64,
+        flush_interval: float = 1.0,
+        use_csv: bool = True,  # noqa: FBT001, FBT002
+        rotation: LogRotation | None = None,
+    ) -> None:
+        """
+        Initialize the writer. The writer thread is started at the first write.
+
+        Args:
+            max_queue(int, optional): Max number of queued lines. Lines are dropped when full. Defaults to 10000.
+            flush_size(int, optional): Flush after this number of lines. Defaults to 64.
+            flush_interval(float, optional): Flush after this time in seconds. Defaults to 1.0.
+            use_csv(bool, optional): Write lines as CSV rows. If False, lines are written as they are.
+                Defaults to True.
+            rotation(LogRotation | None, optional): The rotation policy. Defaults to None (no rotation).
+        """
+        self.use_csv = use_csv
+        self.rotation = rotation
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.current_path = None
+        self.daily_suffix = None
+        self.current_day = None
+        self.dropped = 0
+        self.opened_files = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._file = None
+        self._file_path = None
+        self._opened_at = 0.0
+        self._size = 0
+
+    def write(self, log_text: str | Callable[[int], list[str]], log_file_name: str | None = None) -> bool:
+        """
+        Queue the log line. It does not block.
+
+        Args:
+            log_text(str | Callable[[int], list[str]]): Log text, or the function. (see write_deferred())
+            log_file_name(str | None, optional): Log file name with path. Defaults to None (current log file).
+
+        Returns:
+            bool: False if dropped because the queue is full.
+        """
+        if log_file_name is None:
+            log_file_name = self.resolve_path()
+
+        self._start()
+        try:
+            self._queue.put_nowait((str(log_file_name), log_text))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+            return False
+
+        return True
+
+    def write_deferred(self, make_lines: Callable[[int], list[str]], log_file_name: str | None = None) -> bool:
+        """
+        Queue the function which makes the log lines in the writer thread. It does not block.
+        (ex. the delta prompt log, which is reset per log file)
+        The lines are made just before they are written, so the function knows the file they are written to.
+
+        Args:
+            make_lines(Callable[[int], list[str]]): The function. It receives opened_files as the ID of the file,
+                and returns the log lines. It runs in the writer thread.
+            log_file_name(str | None, optional): Log file name with path. Defaults to None (current log file).
+
+        Returns:
+            bool: False if dropped because the queue is full.
+        """
+        return self.write(make_lines, log_file_name)
+
+    def resolve_path(self) -> str:
+        """
+        Get the current log file. It is resolved from the log directory only once.
+        The file of the date opened by open_log_file() is switched to the file of the new date after midnight.
+
+        Returns:
+            str: The current log file name with path.
+        """
+        if self.daily_suffix is not None and Time().get_time_str(TimeForm.LOG_FILE_NAME) != self.current_day:
+            open_log_file(suffix=self.daily_suffix)
+
+        if self.current_path is None:
+            try:
+                self.current_path = str(get_latest_modified_file_path('./log_files/system'))
+            except FileNotFoundError:
+                logging.exception('No log file found. Creating a new one.')
+                self.current_path = open_log_file()
+
+        return self.current_path
+
+    def flush(self) -> None:
+        """
+        Wait until all queued lines are written and flushed.
+
+        NOTE: It blocks, so do not call it on the event loop.
+        """
+        if self._thread is not None:
+            self._queue.put(_FLUSH)
+            self._queue.join()
+
+        return
+
+    def close(self) -> None:
+        """
+        Write all queued lines, and stop the writer thread.
+        """
+        if self._thread is None:
+            return
+
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        return
+
+    def _start(self) -> None:
+        """
+        Start the writer thread if not started.
+        """
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+
+        return
+
+    def _run(self) -> None:
+        """
+        The writer thread. Lines are written to the buffered file, and flushed by size or time.
+        """
+        pending = 0
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush)) if pending else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = _FLUSH
+                is_timeout = True
+            else:
+                is_timeout = False
+
+            if item is None:
+                self._close_file()
+                self._queue.task_done()
+                return
+
+            if item is not _FLUSH:
+                self._write_row(*item)
+                pending += 1
+
+            if pending and (item is _FLUSH or pending >= self.flush_size):
+                self._flush_file()
+                pending = 0
+                last_flush = time.monotonic()
+
+            if not is_timeout:
+                self._queue.task_done()
+
+    def _write_row(self, log_file_name: str, log_text: str | Callable[[int], list[str]]) -> None:
+        """
+        Write one line to the log file. The file is switched if the log file name is changed.
+        The lines of the function are written together, and the file is rotated only after them.
+
+        Args:
+            log_file_name(str): Log file name with path.
+            log_text(str | Callable[[int], list[str]]): Log text, or the function. (see write_deferred())
+        """
+        with self._lock:
+            dropped = self.dropped
+            self.dropped = 0
+
+        try:
+            if self._file_path != log_file_name:
+                self._close_file()
+                self._file = Path(log_file_name).open('a', encoding='utf-8', newline='')  # noqa: SIM115
+                self._file_path = log_file_name
+                self._opened_at = time.monotonic()
+                self._size = Path(log_file_name).stat().st_size
+                self.opened_files += 1
+                if self.rotation is not None:
+                    self.rotation.expire(log_file_name)
+            elif self.rotation is not None and self.rotation.is_expire_due():
+                self.rotation.expire(log_file_name)
+
+            lines = [f'[system] {dropped} log lines were dropped.'] if dropped and self.use_csv else []
+            if callable(log_text):
+                try:
+                    lines.extend(log_text(self.opened_files))
+                except Exception:
+                    logging.exception('Failed to make log lines for %s', log_file_name)
+            else:
+                lines.append(log_text)
+
+            text = self._format_lines(lines)
+            self._file.write(text)
+            self._size += len(text.encode())
+            # NOTE: The size is counted from the written text, because tell() of the text file flushes the buffer.
+            if self.rotation is not None and self.rotation.should_rotate(self._size, self._opened_at):
+                self._close_file()
+                self.rotation.rotate(log_file_name)
+                self._size = 0
+        except OSError:
+            logging.exception('Failed to write to log file %s', log_file_name)
+            self._close_file()
+
+        return
+
+    def _format_lines(self, lines: list[str]) -> str:
+        """
+        Format the lines as they are written to the file.
+
+        Args:
+            lines(list[str]): The lines.
+
+        Returns:
+            str: The text. CSV rows if use_csv, or the lines with the line end.
+        """
+        if not self.use_csv:
+            return ''.join(f'{line}\n' for line in lines)
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([line] for line in lines)
+        return buffer.getvalue()
+
+    def _flush_file(self) -> None:
+        """
+        Flush the log file.
+        """
+        if self._file is None:
+            return
+
+        try:
+            self._file.flush()
+        except OSError:
+            logging.exception('Failed to flush log file %s', self._file_path)
+
+        return
+
+    def _close_file(self) -> None:
+        """
+        Close the log file.
+        """
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                logging.exception('Failed to close log file %s', self._file_path)
+
+        self._file = None
+        self._file_path = None
+        return
+
+
+log_writer = LogWriter()
+atexit.register(log_writer.close)
+current_turn: ContextVar[str | None] = ContextVar('current_turn', default=None)
+# NOTE: The turn ID (ex. trace ID) of the task. It is added to the status of the log lines. (ex. [system#<turn ID>])
+
+
 def logger(
     status: str,
     log_text: str,
@@ -121,6 +672,7 @@ def logger(
 ) -> None:
     """
     Export system information for file and console.
+    In the turn (see current_turn), the turn ID is added to the status.
 
     Args:
         status (str): About log purpose. (ex. system, user, assistant, input/output:text/voice)
@@ -132,6 +684,10 @@ def logger(
     if datetime_now is None:
         datetime_now = Time()
 
+    turn = current_turn.get()
+    if turn is not None:
+        status = f'{status}#{turn}'
+
     now_str = datetime_now.get_time_str(TimeForm.SYSTEM_LOG)
     log_text = f'{now_str} [{status}] {log_text}'
 
@@ -139,24 +695,21 @@ def logger(
         print(log_text)
 
     if 'f' in target:
-        if log_file_name is None:
-            try:
-                log_file_name = get_latest_modified_file_path('./log_files/system')
-            except FileNotFoundError:
-                logging.exception('No log file found. Creating a new one.')
-                log_file_name = open_log_file()
-
-        export_log(log_text, log_file_name)
+        log_writer.write(log_text, log_file_name)
 
     return
 
 
-def open_log_file(log_file_name: str | None = None) -> str:
+def open_log_file(log_file_name: str | None = None, suffix: str = '') -> str:
     """
     Open log file. And if not exist the file, make new file.
+    The file becomes the current log file of the writer.
+    The default file of the date is switched to the file of the new date after midnight.
 
     Args:
         log_file_name (str | None, optional): Log file name with path. Defaults to None.
+        suffix (str, optional): The suffix of the default file name. (ex. '.p1' for the bot process of shards)
+            Defaults to ''.
 
     Returns:
         str: The path of the opened or created log file.
@@ -165,12 +718,18 @@ def open_log_file(log_file_name: str | None = None) -> str:
 
     if log_file_name is None:
         now_str = datetime_now.get_time_str(TimeForm.LOG_FILE_NAME)
-        log_file_name = f'./log_files/system/{now_str}.log'
+        log_file_name = f'./log_files/system/{now_str}{suffix}.log'
+        log_writer.daily_suffix = suffix
+        log_writer.current_day = now_str
+        # NOTE: Set before the logger() below, which resolves the current log file.
+    else:
+        log_writer.daily_suffix = None
 
     try:
         with Path(log_file_name).open('a', encoding='utf-8', newline=''):
             pass
 
+        log_writer.current_path = log_file_name
         if Path(log_file_name).stat().st_size == 0:
             logger('system', '==== MakeFile ====', datetime_now)
         else:
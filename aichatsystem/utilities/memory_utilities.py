@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+The memory profiler with tracemalloc snapshots, to find what grows over the uptime.
+
+Each snapshot is compared with the previous one, and the summary shows the growth of
+the allocation sites, the traced memory by subsystem and the objects by subsystem.
+The subsystem is the module of this project (ex. utilities.opus_cache_utilities),
+the top package of the third party (ex. discord), or stdlib.
+The objects are counted by class first, so the work per object is small.
+The traces are summed in the child process from the dumped snapshot, because the allocations
+of the summing are traced too while tracing, which makes it slow and holds the GIL of the bot.
+"""
+
+from __future__ import annotations
+
+import gc
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from .metrics_utilities import process_rss
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PROJECT_PREFIX = f'{PROJECT_ROOT}{os.sep}'
+EXCLUDED_FILES = (tracemalloc.__file__, '<unknown>')
+EXCLUDED_FILE_PREFIXES = ('<frozen importlib._bootstrap',)
+
+
+@lru_cache(maxsize=4096)
+def file_subsystem(file_name: str) -> str:
+    """
+    Get the subsystem of the source file.
+
+    Args:
+        file_name(str): The source file name.
+
+    Returns:
+        str: The module of this project, the top package of the third party, or 'stdlib'.
+    """
+    if file_name.startswith(PROJECT_PREFIX):
+        return '.'.join(Path(file_name[len(PROJECT_PREFIX) :]).with_suffix('').parts)
+
+    parts = Path(file_name).parts
+    for packages_dir in ('site-packages', 'dist-packages'):
+        if packages_dir in parts[:-1]:
+            return Path(parts[parts.index(packages_dir) + 1]).stem
+
+    return 'stdlib'
+
+
+def type_subsystem(cls: type) -> str:
+    """
+    Get the subsystem of the class.
+
+    Args:
+        cls(type): The class.
+
+    Returns:
+        str: The subsystem of the module defining the class, 'builtins' or 'stdlib'.
+    """
+    module = sys.modules.get(cls.__module__)
+    file_name = getattr(module, '__file__', None)
+    if file_name is None:
+        # NOTE: Built-in modules (ex. _collections) have no file.
+        return 'builtins' if cls.__module__ == 'builtins' else 'stdlib'
+
+    return file_subsystem(file_name)
+
+
+def count_objects() -> Counter:
+    """
+    Count the objects tracked by gc by class.
+
+    NOTE: Atomic objects (ex. str, int and bytes) are not tracked by gc, so they are left out.
+          The objects are counted by type first, so the subsystem is looked up once per class.
+
+    Returns:
+        Counter: The count by the class. (key: (subsystem, class name) ex. ('stdlib', 'collections.deque'))
+    """
+    type_counts = Counter(map(type, gc.get_objects()))
+    counts = Counter()
+    for cls, count in type_counts.items():
+        counts[(type_subsystem(cls), f'{cls.__module__}.{cls.__qualname__}')] += count
+
+    return counts
+
+
+def site_statistics(snapshot: tracemalloc.Snapshot) -> dict[tuple[str, int], tuple[int, int]]:
+    """
+    Sum the traced memory by the allocation site. Allocations in tracemalloc and importlib are left out.
+
+    Args:
+        snapshot(tracemalloc.Snapshot): The snapshot.
+
+    Returns:
+        dict[tuple[str, int], tuple[int, int]]: The size in bytes and the blocks by (file name, line number).
+    """
+    sites = {}
+    for stat in snapshot.statistics('lineno'):
+        frame = stat.traceback[0]
+        if frame.filename in EXCLUDED_FILES or frame.filename.startswith(EXCLUDED_FILE_PREFIXES):
+            continue
+
+        sites[(frame.filename, frame.lineno)] = (stat.size, stat.count)
+
+    return sites
+
+
+def load_site_statistics(file_name: str) -> dict[tuple[str, int], tuple[int, int]]:
+    """
+    Load the dumped snapshot, and sum the traced memory by the allocation site. Called in the child process.
+
+    Args:
+        file_name(str): The snapshot file.
+
+    Returns:
+        dict[tuple[str, int], tuple[int, int]]: The size in bytes and the blocks by (file name, line number).
+    """
+    tracemalloc.stop()
+    # NOTE: The child process traces too with PYTHONTRACEMALLOC.
+    return site_statistics(tracemalloc.Snapshot.load(file_name))
+
+
+def subsystem_sizes(sites: dict[tuple[str, int], tuple[int, int]]) -> Counter:
+    """
+    Sum the traced memory by subsystem. The subsystem is of the file of the allocation.
+
+    Args:
+        sites(dict[tuple[str, int], tuple[int, int]]): The size and the blocks by site. (see site_statistics())
+
+    Returns:
+        Counter: The size in bytes by subsystem.
+    """
+    file_sizes = Counter()
+    for (file_name, _), (size, _) in sites.items():
+        file_sizes[file_name] += size
+
+    sizes = Counter()
+    for file_name, size in file_sizes.items():
+        sizes[file_subsystem(file_name)] += size
+
+    return sizes
+
+
+def format_size(size: float) -> str:
+    """
+    Format the size in bytes.
+
+    Args:
+        size(float): The size in bytes.
+
+    Returns:
+        str: The size in KiB or MiB. (ex. '1.5 MiB')
+    """
+    if abs(size) >= 1024 * 1024:
+        return f'{size / 1024 / 1024:.1f} MiB'
+
+    return f'{size / 1024:.1f} KiB'
+
+
+def format_growth(size: float) -> str:
+    """
+    Format the growth in bytes with the sign.
+
+    Args:
+        size(float): The growth in bytes.
+
+    Returns:
+        str: The growth in KiB or MiB. (ex. '+1.5 MiB', '-12.0 KiB')
+    """
+    return format_size(size) if size < 0 else f'+{format_size(size)}'
+
+
+class MemoryProfiler:
+    """
+    Take tracemalloc snapshots and compare them with the previous one.
+    """
+
+    def __init__(self, frames: int = 10, top: int = 10) -> None:
+        """
+        Initialize the profiler. Tracing starts at start() or the first snapshot.
+
+        Args:
+            frames(int, optional): The frames stored per allocation. Defaults to 10.
+            top(int, optional): The lines in each section of the summary. Defaults to 10.
+        """
+        self.frames = frames
+        self.top = top
+        self.snapshot_time = None
+        self.snapshots = 0
+        self.sites = {}
+        self.subsystem_sizes = Counter()
+        self.object_counts = Counter()
+        self._lock = threading.Lock()
+        # NOTE: Only the sums of the previous snapshot are kept, not the traces.
+
+    @property
+    def is_tracing(self) -> bool:
+        """
+        Whether tracemalloc is tracing.
+
+        Returns:
+            bool: True if tracing.
+        """
+        return tracemalloc.is_tracing()
+
+    def traced_memory(self) -> int:
+        """
+        Get the memory traced by tracemalloc.
+
+        Returns:
+            int: The traced memory in bytes. 0 if not tracing.
+        """
+        return tracemalloc.get_traced_memory()[0]
+
+    def start(self) -> None:
+        """
+        Start tracing. Allocations before this are not traced.
+
+        NOTE: Tracing slows down allocations, and takes memory for the tracebacks.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+        return
+
+    def stop(self) -> None:
+        """
+        Stop tracing, and clear the snapshots.
+        """
+        with self._lock:
+            tracemalloc.stop()
+            self.snapshot_time = None
+            self.snapshots = 0
+            self.sites = {}
+            self.subsystem_sizes = Counter()
+            self.object_counts = Counter()
+
+        return
+
+    def take_snapshot(self, file_name: str | Path | None = None) -> str:
+        """
+        Take the snapshot, and compare it with the previous one. Tracing starts if not tracing.
+
+        Args:
+            file_name(str | Path | None, optional): The file to dump the snapshot for tracemalloc.Snapshot.load().
+                Defaults to None.
+
+        Returns:
+            str: The summary.
+        """
+        with self._lock, tempfile.TemporaryDirectory() as temp_dir:
+            self.start()
+            snapshot_file = Path(temp_dir) / 'snapshot.tracemalloc' if file_name is None else Path(file_name)
+            snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+            tracemalloc.take_snapshot().dump(str(snapshot_file))
+            object_counts = count_objects()
+            snapshot_time = time.time()
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                sites = executor.submit(load_site_statistics, str(snapshot_file)).result()
+
+            sizes = subsystem_sizes(sites)
+            summary = self.summary(sites, sizes, object_counts)
+            if self.snapshot_time is not None:
+                summary = f'{summary}\n({snapshot_time - self.snapshot_time:.0f} sec since the last snapshot)'
+
+            self.snapshot_time = snapshot_time
+            self.snapshots += 1
+            self.sites = sites
+            self.subsystem_sizes = sizes
+            self.object_counts = object_counts
+
+        return summary
+
+    def top_sites(self, sites: dict[tuple[str, int], tuple[int, int]]) -> list[tuple[str, int, int, int]]:
+        """
+        Get the allocation sites which grew most since the previous snapshot.
+
+        Args:
+            sites(dict[tuple[str, int], tuple[int, int]]): The size and the blocks by site. (see site_statistics())
+
+        Returns:
+            list[tuple[str, int, int, int]]: The site (ex. 'opus_cache_utilities.py:88'),
+                the size, the size growth and the blocks growth, by the size growth.
+        """
+        site_sizes = {key: size for key, (size, _) in sites.items()}
+        previous_sizes = {key: size for key, (size, _) in self.sites.items()}
+        size_growth = growth(site_sizes, previous_sizes)
+        top_sites = []
+        for (site_file, lineno), size_diff in size_growth[: self.top]:
+            size, count = sites.get((site_file, lineno), (0, 0))
+            count_diff = count - self.sites.get((site_file, lineno), (0, 0))[1]
+            top_sites.append((f'{Path(site_file).name}:{lineno}', size, size_diff, count_diff))
+
+        return top_sites
+
+    def summary(
+        self,
+        sites: dict[tuple[str, int], tuple[int, int]],
+        sizes: Counter,
+        object_counts: Counter,
+    ) -> str:
+        """
+        Make the summary of the growth since the previous snapshot.
+
+        Args:
+            sites(dict[tuple[str, int], tuple[int, int]]): The size and the blocks by site. (see site_statistics())
+            sizes(Counter): The size by subsystem. (see subsystem_sizes())
+            object_counts(Counter): The objects by class. (see count_objects())
+
+        Returns:
+            str: The summary.
+        """
+        rss = process_rss()
+        traced, peak = tracemalloc.get_traced_memory()
+        header = (
+            f'rss:{"unknown" if rss is None else format_size(rss)} '
+            f'traced:{format_size(traced)} (peak {format_size(peak)}) snapshot #{self.snapshots + 1}'
+        )
+        lines = [header, 'allocation sites:']
+        for site, size, size_diff, count_diff in self.top_sites(sites):
+            lines.append(f'  {format_growth(size_diff):>11} {format_size(size):>11} {count_diff:+8} blocks  {site}')
+
+        lines.append('traced memory by subsystem:')
+        for subsystem, size_diff in growth(sizes, self.subsystem_sizes)[: self.top]:
+            lines.append(f'  {format_growth(size_diff):>11} {format_size(sizes[subsystem]):>11}  {subsystem}')
+
+        subsystem_counts = Counter()
+        for (subsystem, _), count in object_counts.items():
+            subsystem_counts[subsystem] += count
+
+        previous_subsystem_counts = Counter()
+        for (subsystem, _), count in self.object_counts.items():
+            previous_subsystem_counts[subsystem] += count
+
+        lines.append('objects by subsystem:')
+        for subsystem, count_diff in growth(subsystem_counts, previous_subsystem_counts)[: self.top]:
+            lines.append(f'  {count_diff:+9} {subsystem_counts[subsystem]:9}  {subsystem}')
+
+        lines.append('objects by class:')
+        for key, count_diff in growth(object_counts, self.object_counts)[: self.top]:
+            lines.append(f'  {count_diff:+9} {object_counts[key]:9}  {key[1]}')
+
+        return '\n'.join(lines)
+
+
+def growth(counts: dict[Any, int], previous: dict[Any, int]) -> list[tuple[Any, int]]:
+    """
+    Get the growth of the counts, largest first.
+
+    Args:
+        counts(dict[Any, int]): The counts.
+        previous(dict[Any, int]): The previous counts.
+
+    Returns:
+        list[tuple[Any, int]]: The key and the growth, without the keys which did not change.
+            The keys of the same growth are in the order of the counts.
+    """
+    keys = [*counts, *(key for key in previous if key not in counts)]
+    diffs = [(key, counts.get(key, 0) - previous.get(key, 0)) for key in keys]
+    return sorted((item for item in diffs if item[1] != 0), key=lambda item: item[1], reverse=True)
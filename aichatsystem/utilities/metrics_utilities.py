@@ -0,0 +1,630 @@
+#!/usr/bin/env python3
+"""
+The classes and functions for in-process metrics, served in Prometheus text exposition format.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def format_value(value: float) -> str:
+    """
+    Format the sample value.
+
+    Args:
+        value(float): The value.
+
+    Returns:
+        str: The formatted value.
+    """
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+
+    return repr(float(value))
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    """
+    Format the labels.
+
+    Args:
+        labels(dict[str, str]): The labels.
+
+    Returns:
+        str: The formatted labels. (ex. '{engine="voicevox"}') Empty if no labels.
+    """
+    if not labels:
+        return ''
+
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+        for key, value in labels.items()
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+class Metric:
+    """
+    Base class of metrics. A metric has children per label values.
+
+    NOTE: Updates take only the lock of the child, so hot paths do not contend with other metrics.
+    """
+
+    type_name = ''
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> None:
+        """
+        Initialize the metric.
+
+        Args:
+            name(str): The metric name. (ex. 'aichat_tts_latency_seconds')
+            help_text(str): The help text.
+            labelnames(tuple[str, ...], optional): The label names. Defaults to ().
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._children = {}
+        self._lock = threading.Lock()
+        if not labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, **labels: str) -> Any:  # noqa: ANN401
+        """
+        Get the child of the label values. Call without labels for the metric without labels.
+
+        Args:
+            **labels(str): The label values.
+
+        Returns:
+            Any: The child which has the same update methods as the metric.
+
+        Raises:
+            ValueError: If the label names do not match.
+        """
+        if set(labels) != set(self.labelnames):
+            raise_message = f'Invalid labels for {self.name}. Expected: {", ".join(self.labelnames)}'
+            raise ValueError(raise_message)
+
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+
+        return child
+
+    def render(self) -> list[str]:
+        """
+        Render the metric in text exposition format.
+
+        Returns:
+            list[str]: The lines.
+        """
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.type_name}']
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            lines.extend(child.render(self.name, labels))
+
+        return lines
+
+    def _new_child(self) -> Any:  # noqa: ANN401
+        """
+        Make the child.
+
+        Raises:
+            NotImplementedError: If not implemented in subclass.
+        """
+        raise_message = 'Subclasses must implement _new_child'
+        raise NotImplementedError(raise_message)
+
+
+class _CounterChild:
+    """
+    The counter value. The value can be a function evaluated at scrape.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the value.
+        """
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """
+        Increase the value.
+
+        Args:
+            amount(float, optional): The amount. Defaults to 1.0.
+        """
+        with self._lock:
+            self.value += amount
+
+        return
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Get the value from the function at scrape. (ex. cache hits) The function must not decrease.
+
+        Args:
+            function(Callable[[], float]): The function.
+        """
+        self.function = function
+        return
+
+    def render(self, name: str, labels: dict[str, str]) -> list[str]:
+        """
+        Render the sample.
+
+        Args:
+            name(str): The metric name.
+            labels(dict[str, str]): The labels.
+
+        Returns:
+            list[str]: The lines.
+        """
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception:
+                logging.exception('Failed to get the counter value of %s', name)
+                return []
+
+        return [f'{name}_total{format_labels(labels)} {format_value(value)}']
+
+
+class _GaugeChild:
+    """
+    The gauge value. The value can be a function evaluated at scrape.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the value.
+        """
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        """
+        Set the value.
+
+        Args:
+            value(float): The value.
+        """
+        self.value = value
+        return
+
+    def inc(self, amount: float = 1.0) -> None:
+        """
+        Increase the value.
+
+        Args:
+            amount(float, optional): The amount. Defaults to 1.0.
+        """
+        with self._lock:
+            self.value += amount
+
+        return
+
+    def dec(self, amount: float = 1.0) -> None:
+        """
+        Decrease the value.
+
+        Args:
+            amount(float, optional): The amount. Defaults to 1.0.
+        """
+        self.inc(-amount)
+        return
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Get the value from the function at scrape, such as the queue length.
+
+        Args:
+            function(Callable[[], float]): The function.
+        """
+        self.function = function
+        return
+
+    def render(self, name: str, labels: dict[str, str]) -> list[str]:
+        """
+        Render the sample.
+
+        Args:
+            name(str): The metric name.
+            labels(dict[str, str]): The labels.
+
+        Returns:
+            list[str]: The lines.
+        """
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception:
+                logging.exception('Failed to get the gauge value of %s', name)
+                return []
+
+        return [f'{name}{format_labels(labels)} {format_value(value)}']
+
+
+class _HistogramChild:
+    """
+    The histogram with fixed buckets.
+    """
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        """
+        Initialize the buckets.
+
+        Args:
+            buckets(tuple[float, ...]): The upper bounds of buckets in ascending order.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """
+        Observe the value.
+
+        Args:
+            value(float): The value. (ex. latency in seconds)
+        """
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.sum += value
+
+        return
+
+    def render(self, name: str, labels: dict[str, str]) -> list[str]:
+        """
+        Render the samples. Bucket counts are cumulative.
+
+        Args:
+            name(str): The metric name.
+            labels(dict[str, str]): The labels.
+
+        Returns:
+            list[str]: The lines.
+        """
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), counts):
+            cumulative += count
+            bucket_labels = format_labels({**labels, 'le': format_value(bound)})
+            lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+
+        lines.append(f'{name}_sum{format_labels(labels)} {format_value(total)}')
+        lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+        return lines
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing counter.
+    """
+
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1.0) -> None:
+        """
+        Increase the value of the counter without labels.
+
+        Args:
+            amount(float, optional): The amount. Defaults to 1.0.
+        """
+        self.labels().inc(amount)
+        return
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Get the value of the counter without labels from the function at scrape.
+
+        Args:
+            function(Callable[[], float]): The function. It must not decrease.
+        """
+        self.labels().set_function(function)
+        return
+
+    def _new_child(self) -> _CounterChild:
+        """
+        Make the child.
+
+        Returns:
+            _CounterChild: The child.
+        """
+        return _CounterChild()
+
+
+class Gauge(Metric):
+    """
+    The value which can go up and down.
+    """
+
+    type_name = 'gauge'
+
+    def set(self, value: float) -> None:
+        """
+        Set the value of the gauge without labels.
+
+        Args:
+            value(float): The value.
+        """
+        self.labels().set(value)
+        return
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Get the value of the gauge without labels from the function at scrape.
+
+        Args:
+            function(Callable[[], float]): The function.
+        """
+        self.labels().set_function(function)
+        return
+
+    def _new_child(self) -> _GaugeChild:
+        """
+        Make the child.
+
+        Returns:
+            _GaugeChild: The child.
+        """
+        return _GaugeChild()
+
+
+class Histogram(Metric):
+    """
+    The distribution of values with fixed buckets.
+    """
+
+    type_name = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        """
+        Initialize the histogram.
+
+        Args:
+            name(str): The metric name. (ex. 'aichat_tts_latency_seconds')
+            help_text(str): The help text.
+            labelnames(tuple[str, ...], optional): The label names. Defaults to ().
+            buckets(tuple[float, ...], optional): The upper bounds of buckets. Defaults to LATENCY_BUCKETS.
+        """
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames)
+
+    def observe(self, value: float) -> None:
+        """
+        Observe the value of the histogram without labels.
+
+        Args:
+            value(float): The value. (ex. latency in seconds)
+        """
+        self.labels().observe(value)
+        return
+
+    def _new_child(self) -> _HistogramChild:
+        """
+        Make the child.
+
+        Returns:
+            _HistogramChild: The child.
+        """
+        return _HistogramChild(self.buckets)
+
+
+class MetricsRegistry:
+    """
+    The registry of metrics.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the registry.
+        """
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        """
+        Get or register the counter.
+
+        Args:
+            name(str): The metric name without '_total'.
+            help_text(str): The help text.
+            labelnames(tuple[str, ...], optional): The label names. Defaults to ().
+
+        Returns:
+            Counter: The counter.
+        """
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        """
+        Get or register the gauge.
+
+        Args:
+            name(str): The metric name.
+            help_text(str): The help text.
+            labelnames(tuple[str, ...], optional): The label names. Defaults to ().
+
+        Returns:
+            Gauge: The gauge.
+        """
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        """
+        Get or register the histogram.
+
+        Args:
+            name(str): The metric name.
+            help_text(str): The help text.
+            labelnames(tuple[str, ...], optional): The label names. Defaults to ().
+            buckets(tuple[float, ...], optional): The upper bounds of buckets. Defaults to LATENCY_BUCKETS.
+
+        Returns:
+            Histogram: The histogram.
+        """
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        Render all metrics in text exposition format.
+
+        Returns:
+            str: The exposition text.
+        """
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, metric: Metric) -> Any:  # noqa: ANN401
+        """
+        Register the metric. If the name is already registered, the registered metric is returned.
+
+        Args:
+            metric(Metric): The metric.
+
+        Returns:
+            Any: The registered metric.
+
+        Raises:
+            ValueError: If the name is registered with other type.
+        """
+        with self._lock:
+            registered = self.metrics.setdefault(metric.name, metric)
+
+        if type(registered) is not type(metric):
+            raise_message = f'Metric {metric.name} is already registered as {registered.type_name}'
+            raise ValueError(raise_message)
+
+        return registered
+
+
+def start_metrics_server(registry: MetricsRegistry, host: str = '127.0.0.1', port: int = 9100) -> ThreadingHTTPServer:
+    """
+    Serve the metrics at http://host:port/metrics in the background thread.
+
+    Args:
+        registry(MetricsRegistry): The registry.
+        host(str, optional): The host. Defaults to '127.0.0.1'. (local only)
+        port(int, optional): The port. Defaults to 9100.
+
+    Returns:
+        ThreadingHTTPServer: The server. Call shutdown() to stop.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """
+        The handler of the metrics endpoint.
+        """
+
+        def do_GET(self) -> None:
+            """
+            Respond the metrics.
+            """
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002, ANN401, ARG002
+            """
+            Do not print access logs.
+            """
+            return
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    logging.info('Metrics server started at http://%s:%d/metrics', host, port)
+    return server
+
+
+async def monitor_loop_lag(histogram: Histogram, interval: float = 0.5) -> None:
+    """
+    Observe the event loop lag until cancelled. The lag is the delay of waking up from sleep.
+
+    Args:
+        histogram(Histogram): The histogram to observe the lag in seconds.
+        interval(float, optional): The sleep interval in seconds. Defaults to 0.5.
+    """
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        histogram.observe(max(0.0, time.perf_counter() - start - interval))
+
+
+def process_rss() -> int | None:
+    """
+    Get the resident set size of the process.
+
+    NOTE: /proc is read on Linux. On other platforms, the peak RSS is used instead.
+
+    Returns:
+        int | None: RSS in bytes. None if unknown.
+    """
+    try:
+        return int(Path('/proc/self/statm').read_text().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    try:
+        import resource  # noqa: PLC0415
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+The class and functions for pre-encoded opus clip cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from discord import opus  # pip install discord.py[voice]
+
+from .audio_stream_utilities import FRAME_SIZE, SAMPLE_SIZE, OpusClip, fade, sec_to_bytes
+from .discord_voice_utilities import decode_pcm
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# NOTE: File format is the magic, and the packets with 2 bytes little endian length prefix.
+MAGIC = b'OPC1'
+LENGTH_FORMAT = '<H'
+LENGTH_SIZE = struct.calcsize(LENGTH_FORMAT)
+SUFFIX = '.opus'
+UTTERANCE_PREFIX = 'tts_'
+
+
+def encode_opus(pcm: bytes, fade_len: float = 0.01) -> list[bytes]:
+    """
+    Encode pcm to opus packets. Fades are applied before encoding, because opus clips are not crossfaded.
+
+    Args:
+        pcm(bytes): 48kHz 16bit stereo pcm.
+        fade_len(float, optional): Fade length in seconds. Defaults to 0.01.
+
+    Returns:
+        list[bytes]: Opus packets, one packet per 20ms frame.
+    """
+    pcm = pcm[: len(pcm) - len(pcm) % SAMPLE_SIZE]
+    size = min(sec_to_bytes(fade_len), len(pcm) // 2)
+    if size > 0:
+        pcm = fade(pcm[:size], fade_in=True) + pcm[size:-size] + fade(pcm[-size:], fade_in=False)
+
+    if len(pcm) % FRAME_SIZE != 0:
+        pcm = pcm + bytes(FRAME_SIZE - len(pcm) % FRAME_SIZE)
+
+    encoder = opus.Encoder()
+    frames = range(0, len(pcm), FRAME_SIZE)
+    return [encoder.encode(pcm[idx : idx + FRAME_SIZE], encoder.SAMPLES_PER_FRAME) for idx in frames]
+
+
+def write_opus_file(file_name: str | Path, packets: list[bytes]) -> None:
+    """
+    Write opus packets to the cache file. The file is replaced atomically.
+
+    Args:
+        file_name(str | Path): The cache file name.
+        packets(list[bytes]): Opus packets.
+    """
+    temp_file_name = Path(f'{file_name}.{os.getpid()}.tmp')
+    # NOTE: The temp file is per process, so bot processes of shards can share the cache directory.
+    with temp_file_name.open('wb') as f:
+        f.write(MAGIC)
+        for packet in packets:
+            f.write(struct.pack(LENGTH_FORMAT, len(packet)))
+            f.write(packet)
+
+    temp_file_name.replace(file_name)
+    return
+
+
+def read_opus_file(file_name: str | Path) -> OpusClip:
+    """
+    Map the cache file to memory, and slice the packets without copy.
+
+    Args:
+        file_name(str | Path): The cache file name.
+
+    Returns:
+        OpusClip: The clip of the packets.
+
+    Raises:
+        ValueError: If the file is not the opus cache file.
+    """
+    with Path(file_name).open('rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # NOTE: The mapping is kept after the file is closed.
+
+    view = memoryview(mapped)
+    if view[: len(MAGIC)] != MAGIC:
+        raise_message = f'Not opus cache file: {file_name}'
+        raise ValueError(raise_message)
+
+    packets = []
+    pos = len(MAGIC)
+    while pos < len(view):
+        (length,) = struct.unpack_from(LENGTH_FORMAT, view, pos)
+        pos += LENGTH_SIZE
+        packets.append(view[pos : pos + length])
+        pos += length
+
+    return OpusClip(packets, mapped)
+
+
+class OpusCache:
+    """
+    The cache of pre-encoded opus clips. Fixed clips (ex. fillers) and synthesized utterances are stored.
+
+    NOTE: Each clip maps its file, and the mapping holds the file descriptor.
+          So the utterances are limited to max_utterances, and the least recently used ones are removed.
+    """
+
+    def __init__(self, cache_dir: str = './sound_files/opus_cache/', max_utterances: int = 256) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir(str, optional): The cache directory. Defaults to './sound_files/opus_cache/'.
+            max_utterances(int, optional): The max synthesized utterances. Defaults to 256.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_utterances = max_utterances
+        self.clips = {}
+        self.utterances = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def load(self) -> int:
+        """
+        Map all cache files in the cache directory.
+        The utterance files over max_utterances are removed from the oldest.
+
+        Returns:
+            int: Number of loaded clips.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        file_names = sorted(self.cache_dir.glob(f'*{SUFFIX}'), key=lambda file_name: file_name.stat().st_mtime)
+        utterance_files = [file_name for file_name in file_names if file_name.stem.startswith(UTTERANCE_PREFIX)]
+        for file_name in utterance_files[: max(0, len(utterance_files) - self.max_utterances)]:
+            file_name.unlink(missing_ok=True)
+            file_names.remove(file_name)
+
+        for file_name in file_names:
+            try:
+                clip = read_opus_file(file_name)
+            except (OSError, ValueError):
+                logging.exception('Failed to load opus cache %s', file_name)
+                continue
+
+            self._store(file_name.stem, clip)
+
+        return len(self.clips)
+
+    def get(self, key: str) -> OpusClip | None:
+        """
+        Get the clip.
+
+        Args:
+            key(str): The clip key.
+
+        Returns:
+            OpusClip | None: The clip, or None if not cached.
+        """
+        with self._lock:
+            clip = self.clips.get(key)
+            if clip is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                if key in self.utterances:
+                    self.utterances.move_to_end(key)
+
+        return clip
+
+    def put(self, key: str, pcm: bytes) -> OpusClip | None:
+        """
+        Encode the pcm once, and store it to the cache file.
+
+        NOTE: Encoding is CPU bound, so call it in the executor.
+
+        Args:
+            key(str): The clip key.
+            pcm(bytes): 48kHz 16bit stereo pcm.
+
+        Returns:
+            OpusClip | None: The stored clip, or None if failed.
+        """
+        file_name = self.cache_dir / f'{key}{SUFFIX}'
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            write_opus_file(file_name, encode_opus(pcm))
+            clip = read_opus_file(file_name)
+        except (OSError, ValueError, opus.OpusError):
+            logging.exception('Failed to store opus cache %s', file_name)
+            return None
+
+        self._store(key, clip)
+        return clip
+
+    def _store(self, key: str, clip: OpusClip) -> None:
+        """
+        Store the clip, and remove the least recently used utterances over max_utterances.
+        The replaced and removed clips are closed, and the files of the removed utterances are deleted.
+
+        Args:
+            key(str): The clip key.
+            clip(OpusClip): The clip.
+        """
+        removed = []
+        with self._lock:
+            old_clip = self.clips.get(key)
+            self.clips[key] = clip
+            if key.startswith(UTTERANCE_PREFIX):
+                self.utterances[key] = None
+                self.utterances.move_to_end(key)
+                while len(self.utterances) > self.max_utterances:
+                    removed_key, _ = self.utterances.popitem(last=False)
+                    removed.append((removed_key, self.clips.pop(removed_key)))
+
+        if old_clip is not None:
+            old_clip.close()
+
+        for removed_key, removed_clip in removed:
+            removed_clip.close()
+            try:
+                (self.cache_dir / f'{removed_key}{SUFFIX}').unlink(missing_ok=True)
+            except OSError:
+                logging.exception('Failed to remove opus cache %s', removed_key)
+
+        return
+
+    @staticmethod
+    def utterance_key(text: str, config: dict[str, Any]) -> str:
+        """
+        Make the key of the synthesized utterance from the text and the voice config.
+
+        Args:
+            text(str): The text of the utterance.
+            config(dict[str, Any]): Configuration for the voice generation.
+
+        Returns:
+            str: The clip key.
+        """
+        source = json.dumps([text, config], ensure_ascii=False, sort_keys=True, default=str)
+        return f'{UTTERANCE_PREFIX}{hashlib.sha1(source.encode()).hexdigest()}'  # noqa: S324
+        # NOTE: Use sha1 because it is not for security.
+
+
+def build_cache(source_dir: str, cache_dir: str) -> list[str]:
+    """
+    Encode all wav files in the source directory to the cache. The key is the file name without suffix.
+
+    Args:
+        source_dir(str): The directory of wav files. (ex. './sound_files/filler/nojyaloli/')
+        cache_dir(str): The cache directory.
+
+    Returns:
+        list[str]: The keys of stored clips.
+    """
+    cache = OpusCache(cache_dir)
+    keys = []
+    for wav_file_name in sorted(Path(source_dir).glob('*.wav')):
+        pcm = decode_pcm(wav_file_name.read_bytes())
+        if cache.put(wav_file_name.stem, pcm) is not None:
+            keys.append(wav_file_name.stem)
+
+    return keys
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+The classes for the async streaming pipeline, such as LLM -> segmenter -> TTS -> audio post-processing -> playback.
+
+Each stage runs as a task, and passes items to the next stage through the bounded queue,
+so a slow stage applies back pressure to the previous stages instead of buffering without limit.
+Sync functions and sync iterators run in the executor, so they do not block the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from abc import ABCMeta, abstractmethod
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterable, Iterable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+_END = object()
+
+
+class StageTiming:
+    """
+    The timing of the stage.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the timing.
+        """
+        self.items = 0
+        self.busy_time = 0.0
+        self.first_output_time = None
+        self.last_output_time = None
+
+    def on_output(self, time_start: float) -> None:
+        """
+        Record the output of the item.
+
+        Args:
+            time_start(float): The start time of the pipeline. (time.perf_counter())
+        """
+        now = time.perf_counter() - time_start
+        self.items += 1
+        if self.first_output_time is None:
+            self.first_output_time = now
+
+        self.last_output_time = now
+        return
+
+    def report(self) -> dict[str, Any]:
+        """
+        Get the timing.
+
+        Returns:
+            dict[str, Any]: 'items', 'busy_time', 'first_output_time' and 'last_output_time' in seconds.
+        """
+        return {
+            'items': self.items,
+            'busy_time': self.busy_time,
+            'first_output_time': self.first_output_time,
+            'last_output_time': self.last_output_time,
+        }
+
+
+class Stage(metaclass=ABCMeta):
+    """
+    The stage of the pipeline.
+    """
+
+    def __init__(self, name: str) -> None:
+        """
+        Initialize the stage.
+
+        Args:
+            name(str): The stage name. (ex. 'tts')
+        """
+        self.name = name
+        self.timing = StageTiming()
+        self.time_start = time.perf_counter()
+
+    @abstractmethod
+    async def run(self, inputs: asyncio.Queue | None, outputs: asyncio.Queue | None) -> None:
+        """
+        Process the items until the end of the inputs.
+
+        Args:
+            inputs(asyncio.Queue | None): The queue from the previous stage. None for the source.
+            outputs(asyncio.Queue | None): The queue to the next stage. None for the sink.
+        """
+        raise NotImplementedError
+
+    async def put(self, outputs: asyncio.Queue | None, item: Any) -> None:  # noqa: ANN401
+        """
+        Pass the item to the next stage. It waits while the queue is full.
+
+        Args:
+            outputs(asyncio.Queue | None): The queue to the next stage.
+            item(Any): The item.
+        """
+        self.timing.on_output(self.time_start)
+        if outputs is not None:
+            await outputs.put(item)
+
+        return
+
+    async def call(self, func: Callable[..., Any], *args: Any) -> Any:  # noqa: ANN401
+        """
+        Call the function, in the executor if it is sync, and measure the busy time.
+
+        Args:
+            func(Callable[..., Any]): The function or coroutine function.
+            *args(Any): The arguments.
+
+        Returns:
+            Any: The result.
+        """
+        start = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(func):
+                return await func(*args)
+
+            return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+        finally:
+            self.timing.busy_time += time.perf_counter() - start
+
+
+async def _iter_inputs(inputs: asyncio.Queue) -> AsyncIterable[Any]:
+    """
+    Get the items from the queue until the end.
+
+    Args:
+        inputs(asyncio.Queue): The queue.
+
+    Yields:
+        Any: The item.
+    """
+    while (item := await inputs.get()) is not _END:
+        yield item
+
+
+class Source(Stage):
+    """
+    The first stage, which produces the items from the iterable, such as the LLM stream.
+    """
+
+    def __init__(self, name: str, items: Iterable[Any] | AsyncIterable[Any]) -> None:
+        """
+        Initialize the stage.
+
+        Args:
+            name(str): The stage name.
+            items(Iterable[Any] | AsyncIterable[Any]): The items. A sync iterator is pulled in the executor.
+        """
+        super().__init__(name)
+        self.items = items
+
+    async def run(self, _inputs: asyncio.Queue | None, outputs: asyncio.Queue | None) -> None:
+        """
+        Pass all items to the next stage.
+
+        Args:
+            _inputs(asyncio.Queue | None): Not used.
+            outputs(asyncio.Queue | None): The queue to the next stage.
+        """
+        if hasattr(self.items, '__aiter__'):
+            async for item in self.items:
+                await self.put(outputs, item)
+
+            return
+
+        iterator = iter(self.items)
+        while (item := await self.call(next, iterator, _END)) is not _END:
+            await self.put(outputs, item)
+
+        return
+
+
+class Transform(Stage):
+    """
+    The stateful stage, which outputs zero or more items per input, such as the segmenter.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        feed: Callable[[Any], Iterable[Any]],
+        flush: Callable[[], Iterable[Any]] | None = None,
+        poll: Callable[[], Iterable[Any]] | None = None,
+        poll_interval: float = 0.1,
+    ) -> None:
+        """
+        Initialize the stage. The functions should be quick, because they run in the event loop.
+
+        Args:
+            name(str): The stage name.
+            feed(Callable[[Any], Iterable[Any]]): Get the outputs of the input. (ex. ChunkingPolicy.feed)
+            flush(Callable[[], Iterable[Any]] | None, optional): Get the rest of outputs at the end.
+                (ex. ChunkingPolicy.flush) Defaults to None.
+            poll(Callable[[], Iterable[Any]] | None, optional): Get the outputs while no input arrives.
+                (ex. ChunkingPolicy.poll) Defaults to None.
+            poll_interval(float, optional): Call poll after no input for this time in seconds. Defaults to 0.1.
+        """
+        super().__init__(name)
+        self.feed = feed
+        self.flush = flush
+        self.poll = poll
+        self.poll_interval = poll_interval
+
+    async def run(self, inputs: asyncio.Queue | None, outputs: asyncio.Queue | None) -> None:
+        """
+        Pass the outputs of all inputs to the next stage.
+
+        Args:
+            inputs(asyncio.Queue | None): The queue from the previous stage.
+            outputs(asyncio.Queue | None): The queue to the next stage.
+        """
+        while True:
+            if self.poll is None:
+                item = await inputs.get()
+            else:
+                try:
+                    item = await asyncio.wait_for(inputs.get(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    await self._emit(outputs, self.poll)
+                    continue
+
+            if item is _END:
+                break
+
+            await self._emit(outputs, self.feed, item)
+
+        if self.flush is not None:
+            await self._emit(outputs, self.flush)
+
+        return
+
+    async def _emit(
+        self,
+        outputs: asyncio.Queue | None,
+        func: Callable[..., Iterable[Any]],
+        *args: Any,  # noqa: ANN401
+    ) -> None:
+        """
+        Pass the outputs of the function to the next stage.
+
+        Args:
+            outputs(asyncio.Queue | None): The queue to the next stage.
+            func(Callable[..., Iterable[Any]]): The function. (feed, flush or poll)
+            *args(Any): The arguments.
+        """
+        start = time.perf_counter()
+        results = list(func(*args))
+        self.timing.busy_time += time.perf_counter() - start
+        for result in results:
+            await self.put(outputs, result)
+
+        return
+
+
+class Map(Stage):
+    """
+    The stage which converts each item, up to the concurrency at the same time. (ex. TTS, audio decode)
+    The order of items is kept, and None results are dropped.
+    """
+
+    def __init__(self, name: str, func: Callable[[Any], Any], concurrency: int = 1) -> None:
+        """
+        Initialize the stage.
+
+        Args:
+            name(str): The stage name.
+            func(Callable[[Any], Any]): The function or coroutine function. A sync function runs in the executor.
+            concurrency(int, optional): The max number of items in progress. Defaults to 1.
+        """
+        super().__init__(name)
+        self.func = func
+        self.concurrency = concurrency
+
+    async def run(self, inputs: asyncio.Queue | None, outputs: asyncio.Queue | None) -> None:
+        """
+        Pass the results of all inputs to the next stage in order.
+
+        Args:
+            inputs(asyncio.Queue | None): The queue from the previous stage.
+            outputs(asyncio.Queue | None): The queue to the next stage.
+        """
+        in_progress = deque()
+        try:
+            async for item in _iter_inputs(inputs):
+                in_progress.append(asyncio.ensure_future(self.call(self.func, item)))
+                if len(in_progress) >= self.concurrency:
+                    await self._put_result(outputs, in_progress.popleft())
+
+            while in_progress:
+                await self._put_result(outputs, in_progress.popleft())
+        finally:
+            for task in in_progress:
+                task.cancel()
+
+        return
+
+    async def _put_result(self, outputs: asyncio.Queue | None, task: asyncio.Future) -> None:
+        """
+        Wait for the result, and pass it to the next stage if not None.
+
+        Args:
+            outputs(asyncio.Queue | None): The queue to the next stage.
+            task(asyncio.Future): The task of the item.
+        """
+        result = await task
+        if result is not None:
+            await self.put(outputs, result)
+
+        return
+
+
+class Sink(Stage):
+    """
+    The last stage, which consumes the items, such as the playback.
+    """
+
+    def __init__(self, name: str, func: Callable[[Any], Any]) -> None:
+        """
+        Initialize the stage.
+
+        Args:
+            name(str): The stage name.
+            func(Callable[[Any], Any]): The function or coroutine function.
+                A sync function runs in the event loop, so it should be quick.
+        """
+        super().__init__(name)
+        self.func = func
+
+    async def run(self, inputs: asyncio.Queue | None, _outputs: asyncio.Queue | None) -> None:
+        """
+        Consume all inputs.
+
+        Args:
+            inputs(asyncio.Queue | None): The queue from the previous stage.
+            _outputs(asyncio.Queue | None): Not used.
+        """
+        async for item in _iter_inputs(inputs):
+            start = time.perf_counter()
+            result = self.func(item)
+            if asyncio.iscoroutine(result):
+                await result
+
+            self.timing.busy_time += time.perf_counter() - start
+            self.timing.on_output(self.time_start)
+
+        return
+
+
+class Pipeline:
+    """
+    Run the stages connected by bounded queues.
+    """
+
+    def __init__(self, stages: list[Stage], buffer_size: int = 4) -> None:
+        """
+        Initialize the pipeline.
+
+        Args:
+            stages(list[Stage]): The stages. The first is the source.
+            buffer_size(int, optional): The max number of items waiting between stages. Defaults to 4.
+        """
+        self.stages = stages
+        self.buffer_size = buffer_size
+        self.is_cancelled = False
+        self._tasks = []
+
+    async def run(self) -> bool:
+        """
+        Run all stages until the source ends, or the pipeline is cancelled.
+
+        Returns:
+            bool: True if all items are processed. False if cancelled.
+
+        Raises:
+            Exception: The error of the stage. The other stages are cancelled.
+        """
+        time_start = time.perf_counter()
+        queues = [None] + [asyncio.Queue(self.buffer_size) for _ in self.stages[1:]] + [None]
+        for stage in self.stages:
+            stage.time_start = time_start
+
+        self._tasks = [
+            asyncio.ensure_future(self._run_stage(stage, queues[idx], queues[idx + 1]))
+            for idx, stage in enumerate(self.stages)
+        ]
+        if self.is_cancelled:
+            self.cancel()
+
+        try:
+            await asyncio.gather(*self._tasks)
+        except asyncio.CancelledError:
+            if not self.is_cancelled:
+                self.cancel()
+                raise
+
+            return False
+        except Exception:
+            for task in self._tasks:
+                task.cancel()
+
+            raise
+
+        return not self.is_cancelled
+
+    def cancel(self) -> None:
+        """
+        Cancel all stages. Items in progress are discarded.
+        """
+        self.is_cancelled = True
+        for task in self._tasks:
+            task.cancel()
+
+        return
+
+    def report(self) -> dict[str, dict[str, Any]]:
+        """
+        Get the timing of each stage.
+
+        Returns:
+            dict[str, dict[str, Any]]: The timing per stage name. (see StageTiming.report())
+        """
+        return {stage.name: stage.timing.report() for stage in self.stages}
+
+    @staticmethod
+    async def _run_stage(stage: Stage, inputs: asyncio.Queue | None, outputs: asyncio.Queue | None) -> None:
+        """
+        Run the stage, and pass the end to the next stage.
+
+        Args:
+            stage(Stage): The stage.
+            inputs(asyncio.Queue | None): The queue from the previous stage.
+            outputs(asyncio.Queue | None): The queue to the next stage.
+        """
+        await stage.run(inputs, outputs)
+        if outputs is not None:
+            await outputs.put(_END)
+
+        return
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+The sampling profiler over all threads, which can be started and stopped in the running process.
+
+The sampler thread reads the stacks of all threads by sys._current_frames() at the interval,
+so the profiled code is not instrumented and the overhead is small.
+The samples are kept as the code objects, and the function names are made only for the report.
+The stacks are written in the collapsed format, which flamegraph tools read:
+MainThread;run (discord_bot.py:120);aichat (discord_bot.py:523) 42
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from types import CodeType, FrameType
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+IDLE_FUNCTIONS = (
+    'select (selectors.py:',
+    'wait (threading.py:',
+    '_wait_for_tstate_lock (threading.py:',
+    '_worker (thread.py:',
+    'serve_forever (socketserver.py:',
+)
+# NOTE: C functions have no frame, so a thread blocked in C is sampled at its Python caller.
+#       The stacks ending at these functions are waiting (ex. the idle event loop), and are left out of the summary.
+
+
+@lru_cache(maxsize=4096)
+def function_name(file_name: str, name: str, first_line: int) -> str:
+    """
+    Get the name of the function for the collapsed stack.
+
+    Args:
+        file_name(str): The source file name.
+        name(str): The function name.
+        first_line(int): The first line of the function.
+
+    Returns:
+        str: The function name with the file name and the first line. (ex. 'aichat (discord_bot.py:523)')
+    """
+    return f'{name} ({Path(file_name).name}:{first_line})'
+
+
+def code_name(code: CodeType) -> str:
+    """
+    Get the name of the code for the collapsed stack.
+
+    Args:
+        code(CodeType): The code object.
+
+    Returns:
+        str: The function name with the file name and the first line. (ex. 'aichat (discord_bot.py:523)')
+    """
+    return function_name(code.co_filename, code.co_name, code.co_firstlineno)
+
+
+def frame_name(frame: FrameType) -> str:
+    """
+    Get the name of the frame for the collapsed stack.
+
+    Args:
+        frame(FrameType): The frame.
+
+    Returns:
+        str: The function name with the file name and the first line. (ex. 'aichat (discord_bot.py:523)')
+    """
+    return code_name(frame.f_code)
+
+
+class SamplingProfiler:
+    """
+    Sample the stacks of all threads in the background thread.
+    """
+
+    def __init__(self, interval: float = 0.1) -> None:
+        """
+        Initialize the profiler.
+
+        Args:
+            interval(float, optional): The sampling interval in seconds. Defaults to 0.1. (10Hz)
+        """
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._names = {}
+
+    @property
+    def is_running(self) -> bool:
+        """
+        Whether the profiler is sampling.
+
+        Returns:
+            bool: True if sampling.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """
+        Start sampling. The previous samples are cleared.
+
+        Raises:
+            RuntimeError: If the profiler is already sampling.
+        """
+        if self.is_running:
+            raise_message = 'The profiler is already running.'
+            raise RuntimeError(raise_message)
+
+        self.stacks.clear()
+        self.samples = 0
+        self.duration = 0.0
+        self._names = {}
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return
+
+    def stop(self) -> None:
+        """
+        Stop sampling, and wait for the sampler thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+        return
+
+    async def profile(self, seconds: float) -> None:
+        """
+        Sample for the seconds without blocking the event loop.
+
+        Args:
+            seconds(float): The duration in seconds.
+        """
+        self.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.stop()
+
+    def sample(self) -> None:
+        """
+        Record the stacks of all threads except the sampler. The stack is the thread name and the code objects.
+        """
+        me = threading.get_ident()
+        for ident, thread_frame in sys._current_frames().items():  # noqa: SLF001
+            if ident == me:
+                continue
+
+            stack = []
+            frame = thread_frame
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+
+            stack.append(self._thread_name(ident))
+            self.stacks[tuple(reversed(stack))] += 1
+
+        self.samples += 1
+        return
+
+    def named_stacks(self) -> Counter:
+        """
+        Get the samples with the function names.
+
+        Returns:
+            Counter: The count by the stack, root first. (key: (thread name, function name, ...))
+        """
+        named = Counter()
+        for stack, count in self.stacks.items():
+            named[(stack[0], *map(code_name, stack[1:]))] += count
+
+        return named
+
+    def collapsed(self) -> str:
+        """
+        Get the samples in the collapsed stack format.
+
+        Returns:
+            str: One stack per line, root first and separated by ';', with the count.
+        """
+        return ''.join(f'{";".join(stack)} {count}\n' for stack, count in sorted(self.named_stacks().items()))
+
+    def write_collapsed(self, file_name: str | Path) -> None:
+        """
+        Write the samples in the collapsed stack format, which flamegraph.pl converts to the SVG.
+
+        Args:
+            file_name(str | Path): The file name. (ex. 'profile.collapsed')
+        """
+        Path(file_name).parent.mkdir(parents=True, exist_ok=True)
+        Path(file_name).write_text(self.collapsed(), encoding='utf-8')
+        return
+
+    def top_functions(self, top: int = 10) -> list[tuple[str, int, int]]:
+        """
+        Get the hot functions. The stacks waiting in IDLE_FUNCTIONS are left out.
+
+        Args:
+            top(int, optional): The number of functions. Defaults to 10.
+
+        Returns:
+            list[tuple[str, int, int]]: The function, the self samples and the total samples, by self samples.
+        """
+        self_counts = Counter()
+        total_counts = Counter()
+        for stack, count in self.named_stacks().items():
+            if stack[-1].startswith(IDLE_FUNCTIONS):
+                continue
+
+            self_counts[stack[-1]] += count
+            for name in set(stack[1:]):
+                total_counts[name] += count
+
+        return [(name, count, total_counts[name]) for name, count in self_counts.most_common(top)]
+
+    def summary(self, top: int = 10) -> str:
+        """
+        Make the summary of the hot functions. The percentages are of the samples over all threads.
+
+        Args:
+            top(int, optional): The number of functions. Defaults to 10.
+
+        Returns:
+            str: The summary.
+        """
+        stacks = self.named_stacks()
+        threads = {stack[0] for stack in stacks}
+        thread_samples = max(1, sum(stacks.values()))
+        idle = sum(count for stack, count in stacks.items() if stack[-1].startswith(IDLE_FUNCTIONS))
+        lines = [
+            (
+                f'{self.samples} samples in {self.duration:.1f} sec, '
+                f'{len(threads)} threads, idle {idle / thread_samples:.1%}'
+            ),
+            '  self  total  function',
+        ]
+        for name, self_count, total_count in self.top_functions(top):
+            lines.append(f'{self_count / thread_samples:6.1%} {total_count / thread_samples:6.1%}  {name}')
+
+        return '\n'.join(lines)
+
+    def _thread_name(self, ident: int) -> str:
+        """
+        Get the name of the thread.
+
+        Args:
+            ident(int): The thread ident.
+
+        Returns:
+            str: The thread name, or the ident if unknown.
+        """
+        if ident not in self._names:
+            self._names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+        return self._names.get(ident, str(ident))
+
+    def _run(self) -> None:
+        """
+        Sampler thread. The samples are taken on the fixed schedule.
+        """
+        time_start = time.perf_counter()
+        next_time = time_start
+        while not self._stop.is_set():
+            self.sample()
+            next_time += self.interval
+            self._stop.wait(max(0.0, next_time - time.perf_counter()))
+
+        self.duration = time.perf_counter() - time_start
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+The class and functions for delta prompt logging.
+
+Each distinct message is logged once with its content hash:
+    [prompt:message] <hash> role:<role> content:<content>
+And each prompt is logged as the references to the previous prompt and the added messages:
+    [prompt] id:<prompt hash> base:<previous prompt hash or -> add:<hash>,<hash>,...
+So the log grows linearly with the conversation length, and the prompt of any turn can be rebuilt.
+The encoder is reset per log file, so each file has all messages it references.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import TYPE_CHECKING
+
+from .log_analysis_utilities import parse_line
+
+if TYPE_CHECKING:
+    from collections.abc import Hashable, Iterable, Iterator
+
+MESSAGE_STATUS = 'prompt:message'
+PROMPT_STATUS = 'prompt'
+NO_BASE = '-'
+MISSING_ROLE = 'missing'
+
+
+def message_hash(role: str, content: str) -> str:
+    """
+    Get the content hash of the message.
+
+    Args:
+        role(str): The role.
+        content(str): The content.
+
+    Returns:
+        str: The hash.
+    """
+    return hashlib.sha256(f'{role}\0{content}'.encode()).hexdigest()[:16]
+
+
+def prompt_hash(refs: list[str]) -> str:
+    """
+    Get the hash of the prompt from the message hashes.
+
+    Args:
+        refs(list[str]): The message hashes.
+
+    Returns:
+        str: The hash.
+    """
+    return hashlib.sha256(','.join(refs).encode()).hexdigest()[:16]
+
+
+class PromptDeltaEncoder:
+    """
+    Encode prompts to the log lines of new messages and references.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the encoder.
+        """
+        self.logged_messages = set()
+        self.last_refs = []
+        self.last_id = None
+        self.file_id = None
+
+    def reset(self) -> None:
+        """
+        Forget the logged messages and the last prompt, so the next prompt is logged in full.
+        """
+        self.logged_messages = set()
+        self.last_refs = []
+        self.last_id = None
+        return
+
+    def encode(self, prompt: list[dict[str, str]], file_id: Hashable = None) -> list[tuple[str, str]]:
+        """
+        Encode the prompt.
+
+        Args:
+            prompt(list[dict[str, str]]): The prompt. Each message has 'role' and 'content'.
+            file_id(Hashable, optional): The ID of the log file the lines are written to.
+                (ex. LogWriter.opened_files in LogWriter.write_deferred()) The encoder is reset when it is changed.
+                Defaults to None.
+
+        Returns:
+            list[tuple[str, str]]: The status and the text of the log lines.
+        """
+        if file_id != self.file_id:
+            self.reset()
+            self.file_id = file_id
+
+        lines = []
+        refs = []
+        for p in prompt:
+            role, content = p['role'], p['content']
+            ref = message_hash(role, content)
+            refs.append(ref)
+            if ref not in self.logged_messages:
+                self.logged_messages.add(ref)
+                lines.append((MESSAGE_STATUS, f'{ref} role:{role} content:{content}'))
+
+        is_continued = self.last_id is not None and refs[: len(self.last_refs)] == self.last_refs
+        base = self.last_id if is_continued else NO_BASE
+        added = refs[len(self.last_refs) :] if is_continued else refs
+        current_id = prompt_hash(refs)
+        lines.append((PROMPT_STATUS, f'id:{current_id} base:{base} add:{",".join(added)}'))
+        self.last_refs = refs
+        self.last_id = current_id
+        return lines
+
+
+def rebuild_prompts(lines: Iterable[str]) -> Iterator[tuple[str, list[dict[str, str]]]]:
+    """
+    Rebuild the prompt of each turn from the log lines.
+
+    NOTE: Prompts of the old format (all messages logged as '[prompt] role:<role> content:<content>')
+          are also rebuilt. Their ID is the time of the lines.
+          The messages and the previous prompt not found in the lines (ex. removed log files) are
+          rebuilt as the messages of MISSING_ROLE with the reference as the content.
+
+    Args:
+        lines(Iterable[str]): The log lines. (see log_analysis_utilities.iter_log_lines())
+
+    Yields:
+        tuple[str, list[dict[str, str]]]: The prompt ID and the prompt.
+    """
+    messages = {}
+    prompts = {}
+    legacy_time = None
+    legacy_prompt = []
+    for line in lines:
+        parsed = parse_line(line)
+        if parsed is None:
+            continue
+
+        log_time, status, text = parsed
+        is_legacy = status == PROMPT_STATUS and text.startswith('role:')
+        if legacy_prompt and (not is_legacy or log_time != legacy_time):
+            yield str(legacy_time), legacy_prompt
+            legacy_prompt = []
+
+        if is_legacy:
+            legacy_time = log_time
+            legacy_prompt.append(_parse_message(text))
+        elif status == MESSAGE_STATUS:
+            ref, _, body = text.partition(' ')
+            messages[ref] = _parse_message(body)
+        elif status == PROMPT_STATUS and text.startswith('id:'):
+            fields = dict(field.split(':', 1) for field in text.split(' '))
+            if fields['base'] == NO_BASE:
+                refs = []
+            else:
+                refs = list(prompts.get(fields['base'], [f'base:{fields["base"]}']))
+
+            refs.extend(ref for ref in fields['add'].split(',') if ref)
+            prompts[fields['id']] = refs
+            yield fields['id'], [dict(messages.get(ref, {'role': MISSING_ROLE, 'content': ref})) for ref in refs]
+
+    if legacy_prompt:
+        yield str(legacy_time), legacy_prompt
+
+
+def _parse_message(text: str) -> dict[str, str]:
+    """
+    Parse the message of the log line.
+
+    Args:
+        text(str): The text. (ex. 'role:user content:hello')
+
+    Returns:
+        dict[str, str]: The message.
+    """
+    role, _, content = text.partition(' content:')
+    return {'role': role.removeprefix('role:'), 'content': content}
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+The registry of LLM and TTS providers, and the function for lazy imports.
+
+Provider modules import large SDKs (openai, google-generativeai, google-cloud-texttospeech),
+so they are imported only when the config selects them.
+"""
+
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import sys
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from types import ModuleType
+
+LLM_PROVIDERS = {
+    'openai': ('llm.openai_wrapper', 'OpenAIWrapper'),
+    'gemini': ('llm.gemini_wrapper', 'GeminiWrapper'),
+}
+TTS_PROVIDERS = {
+    'voicevox': ('tts.voicevox_wrapper', 'VoicevoxWrapper'),
+    'google-tts': ('tts.google_tts_wrapper', 'GoogleTTSWrapper'),
+}
+
+
+def load_provider(providers: dict[str, tuple[str, str]], name: str) -> type:
+    """
+    Import the module of the provider, and get the wrapper class.
+
+    Args:
+        providers(dict[str, tuple[str, str]]): The registry. (LLM_PROVIDERS or TTS_PROVIDERS)
+        name(str): The provider name. (ex. 'openai')
+
+    Returns:
+        type: The wrapper class.
+
+    Raises:
+        ValueError: If the provider is not registered.
+    """
+    if name not in providers:
+        raise_message = f'Invalid provider: {name}. Supported providers are: {", ".join(providers)}'
+        raise ValueError(raise_message)
+
+    module_name, class_name = providers[name]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def get_llm_class(name: str) -> type:
+    """
+    Get the LLM wrapper class of the provider.
+
+    Args:
+        name(str): The provider name. ('openai' or 'gemini')
+
+    Returns:
+        type: The wrapper class.
+    """
+    return load_provider(LLM_PROVIDERS, name)
+
+
+def get_tts_class(name: str) -> type:
+    """
+    Get the TTS wrapper class of the provider.
+
+    Args:
+        name(str): The provider name. ('voicevox' or 'google-tts')
+
+    Returns:
+        type: The wrapper class.
+    """
+    return load_provider(TTS_PROVIDERS, name)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Import the module lazily. The module is executed at the first attribute access.
+
+    Args:
+        name(str): The module name. (ex. 'ffmpeg')
+
+    Returns:
+        ModuleType: The module.
+
+    Raises:
+        ModuleNotFoundError: If the module is not installed.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise_message = f'No module named {name!r}'
+        raise ModuleNotFoundError(raise_message, name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+The class for cancelling in-flight work of a chat session.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Callable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class CancelScope:
+    """
+    Cancellation scope of one turn. It covers the LLM stream, pending TTS requests and queued playback.
+    """
+
+    def __init__(self, owner: Any = None) -> None:  # noqa: ANN401
+        """
+        Initialize the scope.
+
+        NOTE: Create it in the event loop.
+
+        Args:
+            owner(Any, optional): The owner of the turn. (ex. user ID) Defaults to None.
+        """
+        self.owner = owner
+        self.is_cancelled = False
+        self.finished = asyncio.Event()
+        self._callbacks = []
+
+    def add_callback(self, callback: Callable[[], Any]) -> None:
+        """
+        Add the callback called at cancel. (ex. stop playback) If already cancelled, it is called immediately.
+
+        Args:
+            callback(Callable[[], Any]): The callback.
+        """
+        if self.is_cancelled:
+            self._call(callback)
+        else:
+            self._callbacks.append(callback)
+
+        return
+
+    def cancel(self) -> bool:
+        """
+        Cancel the turn.
+
+        Returns:
+            bool: False if already cancelled or finished.
+        """
+        if self.is_cancelled or self.finished.is_set():
+            return False
+
+        self.is_cancelled = True
+        callbacks = self._callbacks
+        self._callbacks = []
+        for callback in callbacks:
+            self._call(callback)
+
+        return True
+
+    def finish(self) -> None:
+        """
+        Mark the turn finished.
+        """
+        self._callbacks = []
+        self.finished.set()
+        return
+
+    @staticmethod
+    def _call(callback: Callable[[], Any]) -> None:
+        """
+        Call the callback. Errors are only logged, so other callbacks are called.
+
+        Args:
+            callback(Callable[[], Any]): The callback.
+        """
+        try:
+            callback()
+        except Exception:
+            logging.exception('Failed to cancel.')
+
+        return
+
+
+class SessionManager:
+    """
+    Manage the running turn per session (ex. guild).
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the manager.
+        """
+        self.scopes = {}
+
+    async def start(self, key: Any, owner: Any = None) -> CancelScope:  # noqa: ANN401
+        """
+        Start new turn. The running turn of the session is cancelled, and waited until it finished.
+
+        NOTE: The key type depends on the session, so "Any" is allowed.
+
+        Args:
+            key(Any): The session key. (ex. guild ID)
+            owner(Any, optional): The owner of the turn. (ex. user ID) Defaults to None.
+
+        Returns:
+            CancelScope: The scope of the new turn.
+        """
+        previous = self.scopes.get(key)
+        scope = CancelScope(owner)
+        self.scopes[key] = scope
+        if previous is not None:
+            previous.cancel()
+            await previous.finished.wait()
+
+        return scope
+
+    def cancel(self, key: Any, owner: Any = None) -> bool:  # noqa: ANN401
+        """
+        Cancel the running turn of the session.
+
+        Args:
+            key(Any): The session key. (ex. guild ID)
+            owner(Any, optional): Cancel only the turn of this owner. Defaults to None (any turn).
+
+        Returns:
+            bool: False if no turn is running, or the turn is of other owner.
+        """
+        scope = self.scopes.get(key)
+        if scope is None or (owner is not None and scope.owner != owner):
+            return False
+
+        return scope.cancel()
+
+    def finish(self, key: Any, scope: CancelScope) -> None:  # noqa: ANN401
+        """
+        Finish the turn.
+
+        Args:
+            key(Any): The session key. (ex. guild ID)
+            scope(CancelScope): The scope of the turn.
+        """
+        scope.finish()
+        if self.scopes.get(key) is scope:
+            del self.scopes[key]
+
+        return
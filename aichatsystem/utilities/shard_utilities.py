@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+The class and functions for running the discord bot in multiple processes, each owning a subset of shards.
+
+The launcher passes the shard settings to each process by the environment variables:
+    AICHAT_SHARD_COUNT: The total number of shards. 'auto' uses the count recommended by discord.
+    AICHAT_SHARD_IDS: The comma separated shard IDs of the process. (ex. '0,2')
+    AICHAT_PROCESS_INDEX: The index of the process. Log files, traces and the metrics port are per process.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import subprocess
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SHARD_COUNT_ENV = 'AICHAT_SHARD_COUNT'
+SHARD_IDS_ENV = 'AICHAT_SHARD_IDS'
+PROCESS_INDEX_ENV = 'AICHAT_PROCESS_INDEX'
+
+
+def split_shards(shard_count: int, processes: int) -> list[list[int]]:
+    """
+    Split the shards to the processes round robin.
+
+    Args:
+        shard_count(int): The total number of shards.
+        processes(int): The number of processes.
+
+    Returns:
+        list[list[int]]: The shard IDs of each process.
+
+    Raises:
+        ValueError: If the number of processes is less than 1 or more than the number of shards.
+    """
+    if not 1 <= processes <= shard_count:
+        raise_message = f'The number of processes must be 1 to {shard_count}: {processes}'
+        raise ValueError(raise_message)
+
+    return [list(range(idx, shard_count, processes)) for idx in range(processes)]
+
+
+@dataclass(frozen=True)
+class ShardConfig:
+    """
+    The shard settings of the process.
+    """
+
+    is_sharded: bool = False
+    shard_count: int | None = None
+    shard_ids: tuple[int, ...] | None = None
+    process_index: int | None = None
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = os.environ) -> ShardConfig:
+        """
+        Read the shard settings from the environment variables.
+
+        Args:
+            environ(Mapping[str, str], optional): The environment variables. Defaults to os.environ.
+
+        Returns:
+            ShardConfig: The shard settings. Not sharded if AICHAT_SHARD_COUNT is not set.
+
+        Raises:
+            ValueError: If the settings are invalid.
+        """
+        count_text = environ.get(SHARD_COUNT_ENV, '').strip()
+        ids_text = environ.get(SHARD_IDS_ENV, '').strip()
+        index_text = environ.get(PROCESS_INDEX_ENV, '').strip()
+        if not count_text:
+            return cls()
+
+        shard_count = None if count_text == 'auto' else int(count_text)
+        shard_ids = tuple(int(shard_id) for shard_id in ids_text.split(',')) if ids_text else None
+        if shard_ids is not None and (shard_count is None or any(not 0 <= i < shard_count for i in shard_ids)):
+            raise_message = f'Invalid shard IDs {ids_text} of shard count {count_text}'
+            raise ValueError(raise_message)
+
+        process_index = int(index_text) if index_text else None
+        return cls(is_sharded=True, shard_count=shard_count, shard_ids=shard_ids, process_index=process_index)
+
+    def to_env(self) -> dict[str, str]:
+        """
+        Get the environment variables of the shard settings.
+
+        Returns:
+            dict[str, str]: The environment variables.
+        """
+        if not self.is_sharded:
+            return {}
+
+        environ = {SHARD_COUNT_ENV: 'auto' if self.shard_count is None else str(self.shard_count)}
+        if self.shard_ids is not None:
+            environ[SHARD_IDS_ENV] = ','.join(str(shard_id) for shard_id in self.shard_ids)
+
+        if self.process_index is not None:
+            environ[PROCESS_INDEX_ENV] = str(self.process_index)
+
+        return environ
+
+    def bot_options(self) -> dict[str, int | list[int]]:
+        """
+        Get the keyword arguments of commands.AutoShardedBot.
+
+        Returns:
+            dict[str, int | list[int]]: 'shard_count' and 'shard_ids' if set.
+        """
+        options = {}
+        if self.shard_count is not None:
+            options['shard_count'] = self.shard_count
+
+        if self.shard_ids is not None:
+            options['shard_ids'] = list(self.shard_ids)
+
+        return options
+
+    def process_name(self) -> str | None:
+        """
+        Get the name of per process log files and directories.
+
+        Returns:
+            str | None: The name. (ex. 'p1') None if the process index is not set.
+        """
+        return None if self.process_index is None else f'p{self.process_index}'
+
+
+class ShardLauncher:
+    """
+    Run the bot processes, each owning a subset of shards, and restart them when they exit.
+    """
+
+    def __init__(
+        self,
+        command: list[str],
+        shard_count: int,
+        processes: int,
+        restart_delay: float = 5.0,
+        max_restart_delay: float = 60.0,
+    ) -> None:
+        """
+        Initialize the launcher.
+
+        Args:
+            command(list[str]): The command of the bot process. (ex. [sys.executable, 'discord_bot.py'])
+            shard_count(int): The total number of shards.
+            processes(int): The number of processes.
+            restart_delay(float, optional): The first delay to restart the exited process in seconds. Defaults to 5.
+            max_restart_delay(float, optional): The delay doubles up to this time in seconds. Defaults to 60.
+        """
+        self.command = command
+        self.configs = [
+            ShardConfig(is_sharded=True, shard_count=shard_count, shard_ids=tuple(shard_ids), process_index=idx)
+            for idx, shard_ids in enumerate(split_shards(shard_count, processes))
+        ]
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.processes = [None] * len(self.configs)
+        self._delays = [restart_delay] * len(self.configs)
+        self._restart_at = [0.0] * len(self.configs)
+
+    def start(self, idx: int) -> subprocess.Popen:
+        """
+        Start the process of the index.
+
+        Args:
+            idx(int): The process index.
+
+        Returns:
+            subprocess.Popen: The process.
+        """
+        config = self.configs[idx]
+        environ = dict(os.environ)
+        environ.update(config.to_env())
+        self.processes[idx] = subprocess.Popen(self.command, env=environ)  # noqa: S603
+        logging.info('Started process %d (pid %d) with shards %s', idx, self.processes[idx].pid, config.shard_ids)
+        return self.processes[idx]
+
+    def poll(self) -> None:
+        """
+        Restart the exited processes after the delay. The delay is reset when the process runs long enough.
+        """
+        now = time.monotonic()
+        for idx, process in enumerate(self.processes):
+            if process is None:
+                if now >= self._restart_at[idx]:
+                    self.start(idx)
+                    self._restart_at[idx] = now
+
+                continue
+
+            return_code = process.poll()
+            if return_code is None:
+                if now - self._restart_at[idx] > self.max_restart_delay:
+                    self._delays[idx] = self.restart_delay
+
+                continue
+
+            logging.warning('Process %d exited with code %d. Restart in %.1f sec', idx, return_code, self._delays[idx])
+            self.processes[idx] = None
+            self._restart_at[idx] = now + self._delays[idx]
+            self._delays[idx] = min(self._delays[idx] * 2, self.max_restart_delay)
+
+        return
+
+    def run(self, interval: float = 1.0) -> None:
+        """
+        Start all processes, and keep them running until interrupted.
+
+        Args:
+            interval(float, optional): The polling interval in seconds. Defaults to 1.
+        """
+        try:
+            while True:
+                self.poll()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            logging.info('Stopping bot processes')
+        finally:
+            self.stop()
+
+        return
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Terminate all processes, and kill them if not exited in the timeout.
+
+        Args:
+            timeout(float, optional): The timeout in seconds. Defaults to 10.
+        """
+        running = [process for process in self.processes if process is not None]
+        for process in running:
+            process.terminate()
+
+        for process in running:
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:  # noqa: PERF203
+                process.kill()
+
+        self.processes = [None] * len(self.configs)
+        return
@@ -3,73 +3,222 @@
 The class and functions for play wav sound.
 """
 
+from __future__ import annotations
+
 import logging
 import tempfile
 import threading
 import wave
-from typing import Callable
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from .provider_utilities import lazy_import
 
-import simpleaudio as audio  # pip install simpleaudio
+audio = lazy_import('simpleaudio')  # pip install simpleaudio
+# NOTE: simpleaudio is imported at the first local playback. (sound debug and sound test)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-class SoundControler:
+class PlaybackScheduler:
     """
-    The class and functions for play wav sound.
+    Play clips in order on a single worker thread.
+
+    The next clip is started by the completion callback of the previous clip, so nobody needs to poll.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        sink: Callable[[Any, Callable[[bool], None]], None],
+        stop: Callable[[], None] | None = None,
+        max_in_flight: int = 1,
+    ) -> None:
         """
-        The class and functions for play wav sound.
+        Initialize the scheduler and start the worker thread.
+
+        Args:
+            sink(Callable[[Any, Callable[[bool], None]], None]): Start playing the clip, and call the callback
+                with True when played to the end, or with False when stopped. It may block until played.
+            stop(Callable[[], None] | None, optional): Stop the clips in flight. Defaults to None.
+            max_in_flight(int, optional): Number of clips passed to the sink at once.
+                Use 2 or more for the sink which has its own buffer (ex. JitterBuffer). Defaults to 1.
         """
-        self.thread_list = []
-        self.thread_status_list = []
+        self.sink = sink
+        self.stop = stop
+        self.max_in_flight = max_in_flight
+        self._queue = deque()
+        self._in_flight = 0
+        self._idle_waiters = []
+        self._is_closed = False
+        self._generation = 0
+        self._condition = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name='PlaybackScheduler', daemon=True)
+        self._worker.start()
 
-    def append_thread(self, func: Callable[[str], None], args: tuple) -> None:
+    def submit(self, clip: Any) -> Future:  # noqa: ANN401
         """
-        Apeend play wav sound thread.
+        Append a clip to the queue.
+
+        NOTE: The clip type depends on the sink, so "Any" is allowed.
 
         Args:
-            func(Callable[[str], None]): Target function.
-            args(tuple): Function arguments.
+            clip(Any): The clip passed to the sink. (ex. wav file name, pcm)
+
+        Returns:
+            Future: The future of the clip. Its result is True if played to the end, and False if stopped.
+                It is cancelled if flushed before start, or submitted after close().
+                Use asyncio.wrap_future() to await it.
+        """
+        future = Future()
+        with self._condition:
+            if not self._is_closed:
+                self._queue.append((clip, future))
+                self._condition.notify_all()
+                return future
+
+        future.cancel()
+        return future
+
+    def all_done(self) -> Future:
+        """
+        Get the future which is done when all submitted clips finished.
+
+        Returns:
+            Future: The future. Use asyncio.wrap_future() to await it.
+        """
+        future = Future()
+        with self._condition:
+            if len(self._queue) == 0 and self._in_flight == 0:
+                future.set_result(True)
+            else:
+                self._idle_waiters.append(future)
+
+        return future
+
+    def queue_length(self) -> int:
         """
-        self.thread_list.append(threading.Thread(target=func, args=args))
-        self.thread_status_list.append('before_start')
+        Get the number of clips not finished.
 
-    def thread_control(self) -> None:
+        Returns:
+            int: Queued and in flight clips.
         """
-        Start thread if lataset start thread is finished.
+        with self._condition:
+            return len(self._queue) + self._in_flight
+
+    def flush(self) -> None:
+        """
+        Drop queued clips which are not started.
         """
-        if self.thread_status_list == []:
-            return
+        with self._condition:
+            dropped = list(self._queue)
+            self._queue.clear()
+
+        for _, future in dropped:
+            future.cancel()
+
+        self._notify_if_idle()
+        return
 
-        for idx, status in enumerate(self.thread_status_list):
-            if idx > 0 and self.thread_status_list[idx - 1] != 'finish':
-                break
+    def cancel(self) -> None:
+        """
+        Drop queued clips and stop the clips in flight.
+        The clip being passed to the sink at the same time is also stopped, see _run().
+        """
+        with self._condition:
+            self._generation += 1
 
-            if status == 'before_start':
-                self.thread_list[idx].start()
-                self.thread_status_list[idx] = 'running'
-                break
-            elif status == 'running':  # noqa: RET508
-                # NOTE: Do not break.
-                if not self.thread_list[idx].is_alive():
-                    self.thread_status_list[idx] = 'finish'
-                    break
+        self.flush()
+        if self.stop is not None:
+            self.stop()
 
         return
 
-    def is_finish_all_thread(self) -> bool:
+    def close(self) -> None:
         """
-        Check all thread finished.
+        Cancel all clips and stop the worker thread.
         """
-        is_fin = False
-        if self.thread_status_list[-1] == 'finish':
-            is_fin = True
+        with self._condition:
+            self._is_closed = True
+            self._condition.notify_all()
+
+        self.cancel()
+        return
+
+    def _run(self) -> None:
+        """
+        Worker thread. Wait for a clip and a free slot, then pass the clip to the sink.
+        """
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._is_closed or (len(self._queue) > 0 and self._in_flight < self.max_in_flight),
+                )
+                if self._is_closed:
+                    return
+
+                clip, future = self._queue.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                self._in_flight += 1
+                generation = self._generation
+
+            try:
+                self.sink(clip, lambda is_played, future=future: self._on_done(future, is_played))
+            except Exception as e:
+                logging.exception('Failed to play clip.')
+                self._on_done(future, error=e)
 
-        return is_fin
+            with self._condition:
+                is_cancelled = generation != self._generation
+
+            if is_cancelled and self.stop is not None:
+                self.stop()
+                # NOTE: cancel() can run after the clip is taken from the queue and before the sink has it,
+                #       then stop() of cancel() misses the clip. Only this thread passes clips to the sink,
+                #       so stopping again stops only the clips of the cancelled turn.
+
+    def _on_done(self, future: Future, is_played: bool = False, error: Exception | None = None) -> None:  # noqa: FBT001, FBT002
+        """
+        Completion callback of a clip. Free the slot and wake up the worker to start the next clip.
+
+        Args:
+            future(Future): The future of the clip.
+            is_played(bool, optional): Whether the clip was played to the end. Defaults to False.
+            error(Exception | None, optional): The error raised by the sink. Defaults to None.
+        """
+        with self._condition:
+            if future.done():
+                return
+
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(is_played)
+
+        self._notify_if_idle()
+        return
+
+    def _notify_if_idle(self) -> None:
+        """
+        Resolve the futures returned by all_done() if no clip remains.
+        """
+        with self._condition:
+            if len(self._queue) > 0 or self._in_flight > 0:
+                return
+
+            waiters = self._idle_waiters
+            self._idle_waiters = []
+
+        for waiter in waiters:
+            waiter.set_result(True)
+
+        return
 
 
 def generate_wav(data: bytes, file_name: str = './sound_files/audio.wav') -> str:
@@ -112,3 +261,24 @@ def play_wav(file_name: str) -> None:
     play_obj = wav_obj.play()
     play_obj.wait_done()
     return
+
+
+def stop_wav() -> None:
+    """
+    Stop all playing wav sound.
+    """
+    audio.stop_all()
+    return
+
+
+def play_wav_clip(file_name: str, on_done: Callable[[bool], None]) -> None:
+    """
+    Play wav file, for the sink of PlaybackScheduler.
+
+    Args:
+        file_name(str): wav file name.
+        on_done(Callable[[bool], None]): Called when played.
+    """
+    play_wav(file_name)
+    on_done(True)  # noqa: FBT003
+    return
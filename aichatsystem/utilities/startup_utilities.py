@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+The functions for the startup time profile of the entry points with --profile-startup.
+
+With --profile-startup, the entry point runs again in the child process with 'python -X importtime'.
+The parent reads the import times of each module and the initialization phases from the stderr of the child,
+and prints the report when the child is ready or exits. Other stderr lines are passed through.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+PROFILE_FLAG = '--profile-startup'
+PROFILE_ENV = 'AICHAT_PROFILE_STARTUP'
+MARKER = 'aichat-startup:'
+IMPORT_TIME_PATTERN = re.compile(r'^import time:\s*(\d+) \|\s*(\d+) \|( *)(\S+)\s*$')
+
+
+class StartupProfile:
+    """
+    Collect the import times and the initialization phases.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the profile.
+        """
+        self.imports = []
+        self.phases = []
+        self.is_ready = False
+        self.time_start = time.perf_counter()
+        self.ready_time = None
+
+    def feed(self, line: str) -> bool:
+        """
+        Parse the stderr line of the child.
+
+        Args:
+            line(str): The line.
+
+        Returns:
+            bool: True if the line is for the profile.
+        """
+        if line.startswith('import time:'):
+            match = IMPORT_TIME_PATTERN.match(line)
+            if match is not None:
+                self_us, cumulative_us, indent, module = match.groups()
+                self.imports.append((module, int(self_us) / 1e6, int(cumulative_us) / 1e6, (len(indent) - 1) // 2))
+
+            return True
+
+        if not line.startswith(MARKER):
+            return False
+
+        event, _, value = line[len(MARKER) :].strip().partition(' ')
+        if event == 'phase':
+            name, _, seconds = value.rpartition(' ')
+            self.phases.append((name, float(seconds)))
+        elif event == 'ready':
+            self.is_ready = True
+            self.ready_time = time.perf_counter() - self.time_start
+
+        return True
+
+    def report(self, top: int = 20) -> str:
+        """
+        Make the report. The modules imported by the entry point directly are listed with the cumulative time,
+        and the slowest modules are listed with the self time.
+
+        Args:
+            top(int, optional): The number of modules in each list. Defaults to 20.
+
+        Returns:
+            str: The report.
+        """
+        total_import = sum(self_time for _, self_time, _, _ in self.imports)
+        lines = ['==== Startup Profile ====']
+        if self.ready_time is not None:
+            lines.append(f'time to ready: {self.ready_time:.3f} sec')
+
+        lines.append(f'import total: {total_import:.3f} sec ({len(self.imports)} modules)')
+        lines.append('')
+        lines.append('-- top level imports (cumulative) --')
+        top_level = sorted((i for i in self.imports if i[3] == 0), key=lambda i: i[2], reverse=True)
+        lines.extend(f'{cumulative:10.3f} sec  {module}' for module, _, cumulative, _ in top_level[:top])
+        lines.append('')
+        lines.append('-- slowest modules (self) --')
+        slowest = sorted(self.imports, key=lambda i: i[1], reverse=True)
+        lines.extend(f'{self_time:10.3f} sec  {module}' for module, self_time, _, _ in slowest[:top])
+        if self.phases:
+            lines.append('')
+            lines.append('-- initialization phases --')
+            lines.extend(f'{seconds:10.3f} sec  {name}' for name, seconds in self.phases)
+
+        return '\n'.join(lines)
+
+
+def is_profiling() -> bool:
+    """
+    Check if the process is the child of the startup profile.
+
+    Returns:
+        bool: True if profiling.
+    """
+    return bool(os.environ.get(PROFILE_ENV))
+
+
+def profile_if_requested(argv: list[str] | None = None) -> None:
+    """
+    If --profile-startup is given, run the entry point in the child process and exit with its exit code.
+    Call it at the beginning of the main block of the entry point.
+
+    Args:
+        argv(list[str] | None, optional): The command line arguments. Defaults to None (sys.argv).
+    """
+    argv = sys.argv if argv is None else argv
+    if PROFILE_FLAG not in argv or is_profiling():
+        return
+
+    args = [arg for arg in argv if arg != PROFILE_FLAG]
+    sys.exit(run_profiled(args))
+
+
+def run_profiled(args: list[str]) -> int:
+    """
+    Run the script in the child process with 'python -X importtime', and print the profile.
+
+    Args:
+        args(list[str]): The script and its arguments. (ex. ['discord_bot.py'])
+
+    Returns:
+        int: The exit code of the child.
+    """
+    environ = dict(os.environ)
+    environ[PROFILE_ENV] = '1'
+    profile = StartupProfile()
+    process = subprocess.Popen(  # noqa: S603
+        [sys.executable, '-X', 'importtime', *args],
+        env=environ,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding='utf-8',
+        errors='replace',
+    )
+    is_reported = False
+    try:
+        for line in process.stderr:
+            if not profile.feed(line.rstrip('\n')):
+                sys.stderr.write(line)
+            elif profile.is_ready and not is_reported:
+                print(profile.report(), file=sys.stderr)
+                is_reported = True
+
+        return_code = process.wait()
+    except KeyboardInterrupt:
+        return_code = process.wait()
+
+    if not is_reported:
+        print(profile.report(), file=sys.stderr)
+
+    return return_code
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Measure the initialization phase. (ex. 'load config', 'connect TTS')
+    It does nothing if not profiling.
+
+    Args:
+        name(str): The phase name.
+
+    Yields:
+        None
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if is_profiling():
+            print(f'{MARKER} phase {name} {time.perf_counter() - start:.6f}', file=sys.stderr, flush=True)
+
+
+def ready() -> None:
+    """
+    Mark the entry point is ready. The report is printed at this time.
+    """
+    if is_profiling():
+        print(f'{MARKER} ready', file=sys.stderr, flush=True)
+
+    return
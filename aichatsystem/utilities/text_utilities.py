@@ -5,6 +5,12 @@ The class definition for check some marks in the text.
 
 from __future__ import annotations
 
+import re
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
 
 class WordMarks:
     """
@@ -24,6 +30,15 @@ class WordMarks:
         # NOTE: Japanese sentence, so use Full-width letter.
         return
 
+    def split_marks(self) -> str:
+        """
+        Get all split marks.
+
+        Returns:
+            str: The split marks joined.
+        """
+        return ''.join(self.punctuation_marks + self.exclamation_marks + self.question_marks + self.new_line_marks)
+
     def split_text(self, text: str) -> list[str]:
         """
         Split the input text based on punctuation and new line marks.
@@ -34,24 +49,8 @@ class WordMarks:
         Returns:
             List[str]: A list of split text segments.
         """
-        is_append = False
-        split_text = []
-        txt = ''
-        for letter in text:
-            is_sp, _, _, _, _ = self.check_letter(letter)
-            if not is_sp and is_append and len(txt) > 0:
-                split_text.append(txt)
-                txt = ''
-                is_append = False
-
-            txt = txt + letter
-            if is_sp:
-                is_append = True
-
-        if len(txt) > 0:
-            split_text.append(txt)
-
-        return split_text
+        segmenter = StreamingSegmenter(self, drop_new_line=False)
+        return list(segmenter.iter_segments([text]))
 
     def split_text_for_voice(self, text: str) -> list[str]:
         """
@@ -63,26 +62,8 @@ class WordMarks:
         Returns:
             List[str]: A list of split text segments suitable for voice processing.
         """
-        is_append = False
-        split_text = []
-        txt = ''
-        for letter in text:
-            is_sp, _, _, _, is_n = self.check_letter(letter)
-            if not is_sp and is_append and len(txt) > 0:
-                split_text.append(txt)
-                txt = ''
-                is_append = False
-
-            if not is_n:
-                txt = txt + letter
-
-            if is_sp:
-                is_append = True
-
-        if len(txt) > 0:
-            split_text.append(txt)
-
-        return split_text
+        segmenter = StreamingSegmenter(self, drop_new_line=True)
+        return list(segmenter.iter_segments([text]))
 
     def check_letter(self, letter: str) -> tuple[bool, bool, bool, bool, bool]:
         """
@@ -101,3 +82,132 @@ class WordMarks:
         is_n = letter in self.new_line_marks
         is_sp = is_p or is_e or is_q or is_n
         return is_sp, is_p, is_e, is_q, is_n
+
+
+class StreamingSegmenter:
+    """
+    Split streamed text chunks into segments at the split marks.
+
+    A segment is completed when a letter other than the split marks follows the split marks,
+    so the continuous marks (ex. '!?') stay in one segment even if they are divided into chunks.
+    The boundaries are found by the precompiled regular expression, and the incomplete segment is
+    buffered in the list and joined once, so the cost is linear in the text length.
+    """
+
+    def __init__(self, word_marks: WordMarks | None = None, *, drop_new_line: bool = True) -> None:
+        """
+        Initialize the segmenter.
+
+        Args:
+            word_marks (WordMarks | None, optional): The split marks. Defaults to None (use WordMarks()).
+            drop_new_line (bool, optional): Remove new line marks from segments, for voice processing.
+                Defaults to True.
+        """
+        word_marks = word_marks or WordMarks()
+        marks = re.escape(word_marks.split_marks())
+        self._mark_run = re.compile(f'[{marks}]+')
+        self._mark_set = frozenset(word_marks.split_marks())
+        self._drop_table = str.maketrans('', '', ''.join(word_marks.new_line_marks)) if drop_new_line else None
+        self._parts = []
+        self._is_mark_tail = False
+
+    def pending_length(self) -> int:
+        """
+        Get the length of the incomplete segment.
+
+        Returns:
+            int: Number of buffered letters.
+        """
+        return sum(len(part) for part in self._parts)
+
+    def cut(self) -> str:
+        """
+        Take the incomplete segment out, even if it does not end with the split marks.
+
+        Returns:
+            str: The incomplete segment.
+        """
+        segment = self._join(self._parts)
+        self._parts = []
+        self._is_mark_tail = False
+        return segment
+
+    def feed(self, chunk: str) -> Iterator[str]:
+        """
+        Feed a text chunk, and yield completed segments.
+
+        Args:
+            chunk (str): The text chunk.
+
+        Yields:
+            str: The completed segment.
+        """
+        if not chunk:
+            return
+
+        parts = self._parts
+        if self._is_mark_tail and chunk[0] not in self._mark_set:
+            segment = self._join(parts)
+            parts = self._parts = []
+            if segment:
+                yield segment
+
+        pos = 0
+        self._is_mark_tail = False
+        for match in self._mark_run.finditer(chunk):
+            end = match.end()
+            if end == len(chunk):
+                self._is_mark_tail = True
+                break
+
+            parts.append(chunk[pos:end])
+            segment = self._join(parts)
+            parts = self._parts = []
+            pos = end
+            if segment:
+                yield segment
+
+        if pos < len(chunk):
+            parts.append(chunk[pos:])
+
+    def flush(self) -> Iterator[str]:
+        """
+        Yield the rest as the last segment.
+
+        Yields:
+            str: The last segment.
+        """
+        segment = self.cut()
+        if segment:
+            yield segment
+
+    def iter_segments(self, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Feed all chunks and flush.
+
+        Args:
+            chunks (Iterable[str]): The text chunks. (ex. generator of LLM stream)
+
+        Yields:
+            str: The segment.
+        """
+        for chunk in chunks:
+            yield from self.feed(chunk)
+
+        yield from self.flush()
+
+    def _join(self, parts: list[str]) -> str:
+        """
+        Join the buffered parts into the segment.
+
+        Args:
+            parts (list[str]): The buffered parts.
+
+        Returns:
+            str: The segment.
+        """
+        segment = ''.join(parts)
+        if self._drop_table is not None:
+            segment = segment.translate(self._drop_table)
+
+        return segment
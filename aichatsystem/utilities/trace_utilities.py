@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+The classes for structured trace events of the aichat pipeline.
+
+Each message gets a trace ID. Spans and events of the trace are written as JSON lines:
+{"trace_id": "...", "name": "tts", "start_ms": 812.4, "duration_ms": 203.1, ...}
+start_ms is the offset from the trace start, measured by the monotonic clock.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .log_utilities import LogWriter, Time, TimeForm
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from concurrent.futures import Future
+
+
+class Tracer:
+    """
+    Start traces, and write their events to the JSONL file in the background thread.
+    """
+
+    def __init__(self, trace_dir: str = './log_files/trace', enabled: bool = True) -> None:  # noqa: FBT001, FBT002
+        """
+        Initialize the tracer.
+
+        Args:
+            trace_dir(str, optional): The directory of trace files. Defaults to './log_files/trace'.
+            enabled(bool, optional): If False, traces do nothing. Defaults to True.
+        """
+        self.enabled = enabled
+        self.trace_dir = Path(trace_dir)
+        self.writer = LogWriter(use_csv=False)
+        self._ids = itertools.count(1)
+        self._prefix = f'{os.getpid():x}-{int(time.time()):x}'
+
+    def start_trace(self, **attrs: Any) -> Trace:  # noqa: ANN401
+        """
+        Start new trace.
+
+        Args:
+            **attrs(Any): Attributes of the trace. (ex. guild ID, model name)
+
+        Returns:
+            Trace: The trace.
+        """
+        trace_id = f'{self._prefix}-{next(self._ids)}'
+        trace = Trace(self if self.enabled else None, trace_id)
+        trace.event('trace_start', wall_time=datetime.now().isoformat(), **attrs)  # noqa: DTZ005
+        return trace
+
+    def emit(self, record: dict[str, Any]) -> None:
+        """
+        Write the event. It does not block.
+
+        Args:
+            record(dict[str, Any]): The event.
+        """
+        file_name = self.trace_dir / f'{Time().get_time_str(TimeForm.LOG_FILE_NAME)}.jsonl'
+        self.writer.write(json.dumps(record, ensure_ascii=False, default=str), str(file_name))
+        return
+
+    def open(self) -> None:
+        """
+        Make the trace directory.
+        """
+        if self.enabled:
+            self.trace_dir.mkdir(parents=True, exist_ok=True)
+
+        return
+
+    def close(self) -> None:
+        """
+        Write all queued events.
+        """
+        self.writer.close()
+        return
+
+
+class Span:
+    """
+    A span of the trace. The event is written when the span ends.
+    """
+
+    def __init__(self, trace: Trace, name: str, attrs: dict[str, Any], start: int | None = None) -> None:
+        """
+        Start the span.
+
+        Args:
+            trace(Trace): The trace.
+            name(str): The span name. (ex. 'tts')
+            attrs(dict[str, Any]): Attributes of the span.
+            start(int | None, optional): The start time by time.perf_counter_ns(). Defaults to None (now).
+        """
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter_ns() if start is None else start
+        self.is_ended = False
+
+    def end(self, **attrs: Any) -> None:  # noqa: ANN401
+        """
+        End the span. Ending twice is ignored.
+
+        Args:
+            **attrs(Any): Attributes added at the end. (ex. result length)
+        """
+        if self.is_ended:
+            return
+
+        self.is_ended = True
+        self.attrs.update(attrs)
+        self.trace.emit(self.name, self.start, time.perf_counter_ns(), self.attrs)
+        return
+
+
+class Trace:
+    """
+    The trace of one message.
+    """
+
+    def __init__(self, tracer: Tracer | None, trace_id: str) -> None:
+        """
+        Initialize the trace.
+
+        Args:
+            tracer(Tracer | None): The tracer. If None, the trace does nothing.
+            trace_id(str): The trace ID.
+        """
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.start = time.perf_counter_ns()
+        self._lock = threading.Lock()
+        self._playing = 0
+        self._last_end = None
+
+    def start_span(self, name: str, **attrs: Any) -> Span:  # noqa: ANN401
+        """
+        Start the span. Call Span.end() to write it.
+
+        Args:
+            name(str): The span name. (ex. 'llm_ttft')
+            **attrs(Any): Attributes of the span.
+
+        Returns:
+            Span: The span.
+        """
+        return Span(self, name, attrs)
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Span]:  # noqa: ANN401
+        """
+        The span of the with block.
+
+        Args:
+            name(str): The span name. (ex. 'prompt_load')
+            **attrs(Any): Attributes of the span.
+
+        Yields:
+            Span: The span.
+        """
+        span = Span(self, name, attrs)
+        try:
+            yield span
+        finally:
+            span.end()
+
+    def event(self, name: str, **attrs: Any) -> None:  # noqa: ANN401
+        """
+        Write the event without duration.
+
+        Args:
+            name(str): The event name. (ex. 'token_chunk')
+            **attrs(Any): Attributes of the event.
+        """
+        now = time.perf_counter_ns()
+        self.emit(name, now, now, attrs)
+        return
+
+    def playback(self, future: Future, **attrs: Any) -> None:  # noqa: ANN401
+        """
+        Trace the submitted clip. The playback span starts when the previous clip ends,
+        and the gap span is written if nothing was playing when the clip was submitted.
+
+        Args:
+            future(Future): The future of the clip. (see PlaybackScheduler.submit())
+            **attrs(Any): Attributes of the span.
+        """
+        if self.tracer is None:
+            return
+
+        now = time.perf_counter_ns()
+        with self._lock:
+            if self._playing == 0 and self._last_end is not None:
+                self.emit('gap', self._last_end, now, {})
+
+            span = Span(self, 'playback', attrs, now)
+            if self._playing != 0:
+                span.start = None
+
+            self._playing += 1
+
+        future.add_done_callback(lambda f: self._on_played(span, f))
+        return
+
+    def emit(self, name: str, start: int, end: int, attrs: dict[str, Any]) -> None:
+        """
+        Write the span.
+
+        Args:
+            name(str): The span name.
+            start(int): The start time by time.perf_counter_ns().
+            end(int): The end time by time.perf_counter_ns().
+            attrs(dict[str, Any]): Attributes of the span.
+        """
+        if self.tracer is None:
+            return
+
+        record = {
+            'trace_id': self.trace_id,
+            'name': name,
+            'start_ms': (start - self.start) / 1e6,
+            'duration_ms': (end - start) / 1e6,
+        }
+        record.update(attrs)
+        self.tracer.emit(record)
+        return
+
+    def _on_played(self, span: Span, future: Future) -> None:
+        """
+        Completion callback of the clip.
+
+        Args:
+            span(Span): The playback span.
+            future(Future): The future of the clip.
+        """
+        now = time.perf_counter_ns()
+        with self._lock:
+            if span.start is None:
+                span.start = self._last_end if self._last_end is not None else now
+                # NOTE: Clips are played in order, so the clip started when the previous clip ended.
+
+            self._playing -= 1
+            self._last_end = now
+
+        played = not future.cancelled() and future.exception() is None and future.result()
+        span.attrs['played'] = played
+        self.emit(span.name, span.start, now, span.attrs)
+        return
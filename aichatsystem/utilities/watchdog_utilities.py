@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+The watchdog of the event loop, which finds the blocking calls in coroutines.
+
+The heartbeat coroutine wakes up at the interval, and the delay of waking up is the loop lag.
+The watcher thread checks the last heartbeat, and while the loop is stalled over the threshold,
+it samples the stack of the loop thread. When the loop wakes up again, the stall is reported
+with the call site, which is the innermost frame of this project in the samples.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    from types import FrameType
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+UNKNOWN_SITE = 'unknown'
+
+
+def call_site(frame: FrameType | None, root: Path = PROJECT_ROOT) -> tuple[str, list[str]]:
+    """
+    Get the call site of the blocking call from the stack.
+
+    Args:
+        frame(FrameType | None): The innermost frame of the loop thread.
+        root(Path, optional): The project directory. Defaults to PROJECT_ROOT. (aichatsystem)
+
+    Returns:
+        str: The innermost frame in the project, or the innermost frame if none. (ex. 'aichat (discord_bot.py:612)')
+        list[str]: The stack, innermost first.
+    """
+    stack = []
+    site = None
+    while frame is not None:
+        code = frame.f_code
+        name = f'{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})'
+        stack.append(name)
+        is_project = code.co_filename.startswith(str(root)) and code.co_filename != __file__
+        if site is None and is_project:
+            site = name
+
+        frame = frame.f_back
+
+    if site is None:
+        site = stack[0] if stack else UNKNOWN_SITE
+
+    return site, stack
+
+
+class LoopWatchdog:
+    """
+    Measure the loop lag continuously, and attribute the stalls over the threshold to the call sites.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.1,
+        interval: float = 0.05,
+        on_blocked: Callable[[str, float, list[str]], Any] | None = None,
+        histogram: Any = None,  # noqa: ANN401
+    ) -> None:
+        """
+        Initialize the watchdog. Run run() as a task in the event loop.
+
+        Args:
+            threshold(float, optional): The stall to report in seconds. Defaults to 0.1.
+            interval(float, optional): The heartbeat interval in seconds. Defaults to 0.05.
+            on_blocked(Callable[[str, float, list[str]], Any] | None, optional): Called in the event loop
+                with the call site, the stall in seconds and the stack (innermost first). Defaults to None.
+            histogram(Any, optional): The histogram to observe the lag in seconds. (ex. Histogram) Defaults to None.
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.on_blocked = on_blocked
+        self.histogram = histogram
+        self.counts = Counter()
+        self.blocked_time = Counter()
+        self._beat = time.perf_counter()
+        self._samples = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._loop_thread = None
+
+    async def run(self) -> None:
+        """
+        The heartbeat until cancelled. The watcher thread runs while the heartbeat runs.
+        """
+        self._loop_thread = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._stop.clear()
+        watcher = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        watcher.start()
+        try:
+            while True:
+                start = time.perf_counter()
+                self._beat = start
+                await asyncio.sleep(self.interval)
+                self.on_beat(max(0.0, time.perf_counter() - start - self.interval))
+        finally:
+            self._stop.set()
+
+    def on_beat(self, lag: float) -> None:
+        """
+        Observe the lag, and report the stall if sampled. Called in the event loop.
+
+        Args:
+            lag(float): The loop lag in seconds.
+        """
+        if self.histogram is not None:
+            self.histogram.observe(lag)
+
+        with self._lock:
+            samples = self._samples
+            self._samples = []
+
+        if lag < self.threshold:
+            return
+
+        sites = Counter(site for site, _ in samples)
+        site = sites.most_common(1)[0][0] if sites else UNKNOWN_SITE
+        stack = next((stack for sample_site, stack in samples if sample_site == site), [])
+        # NOTE: A short stall can end before the watcher samples it, then the site is unknown.
+        self.counts[site] += 1
+        self.blocked_time[site] += lag
+        if self.on_blocked is not None:
+            self.on_blocked(site, lag, stack)
+
+        return
+
+    def sample(self) -> None:
+        """
+        Sample the stack of the loop thread. Called from the watcher thread.
+        """
+        frame = sys._current_frames().get(self._loop_thread)  # noqa: SLF001
+        if frame is None:
+            return
+
+        sample = call_site(frame)
+        with self._lock:
+            self._samples.append(sample)
+
+        return
+
+    def _watch(self) -> None:
+        """
+        Watcher thread. Sample while the heartbeat is late over the threshold.
+        """
+        while not self._stop.wait(self.interval / 2):
+            if time.perf_counter() - self._beat - self.interval > self.threshold:
+                self.sample()
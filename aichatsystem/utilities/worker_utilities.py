@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+The classes for processing inputs per session (ex. guild) with bounded queues.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+OVERLOAD_POLICIES = ('drop_oldest', 'merge', 'reply_busy')
+
+
+class SessionWorker:
+    """
+    Process the items of one session in order, with the bounded queue.
+    """
+
+    def __init__(
+        self,
+        key: Any,  # noqa: ANN401
+        pool: WorkerPool,
+    ) -> None:
+        """
+        Initialize the worker. Call start() in the event loop.
+
+        NOTE: The key type depends on the session, so "Any" is allowed.
+
+        Args:
+            key(Any): The session key. (ex. guild ID)
+            pool(WorkerPool): The pool which owns the worker.
+        """
+        self.key = key
+        self.pool = pool
+        self.queue = deque()
+        self.is_busy = False
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self) -> None:
+        """
+        Start the worker task.
+        """
+        self._task = asyncio.create_task(self._run())
+        return
+
+    def submit(self, item: Any) -> bool:  # noqa: ANN401
+        """
+        Queue the item. When the queue is full, the overload policy of the pool is applied.
+
+        Args:
+            item(Any): The item. (ex. message)
+
+        Returns:
+            bool: False if the item is rejected by 'reply_busy' policy.
+        """
+        if len(self.queue) >= self.pool.max_queue:
+            policy = self.pool.policy
+            self.pool.overloads[policy] += 1
+            if policy == 'reply_busy':
+                self.pool.call(self.pool.on_rejected, item)
+                return False
+
+            if policy == 'merge' and self.queue:
+                self.queue[-1] = self.pool.merge(self.queue[-1], item)
+                return True
+
+            dropped = self.queue.popleft()
+            self.pool.call(self.pool.on_rejected, dropped)
+
+        self.queue.append(item)
+        self._wakeup.set()
+        return True
+
+    def depth(self) -> int:
+        """
+        Get the number of items waiting and in progress.
+
+        Returns:
+            int: The queue depth.
+        """
+        return len(self.queue) + self.is_busy
+
+    async def _run(self) -> None:
+        """
+        The worker task. It exits after idle for the idle timeout.
+        """
+        while True:
+            if not self.queue:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.pool.idle_timeout)
+                except asyncio.TimeoutError:
+                    if not self.queue:
+                        self.pool.remove(self)
+                        return
+
+                continue
+
+            item = self.queue.popleft()
+            self.is_busy = True
+            try:
+                async with self.pool.limit:
+                    self.pool.active += 1
+                    try:
+                        await self.pool.handler(item)
+                    finally:
+                        self.pool.active -= 1
+            except Exception:
+                logging.exception('Failed to process the item of %s', self.key)
+            finally:
+                self.is_busy = False
+
+
+class WorkerPool:
+    """
+    Run one worker task per session, so sessions make progress independently.
+    """
+
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        handler: Callable[[Any], Awaitable[Any]],
+        max_queue: int = 4,
+        policy: str = 'drop_oldest',
+        merge: Callable[[Any, Any], Any] | None = None,
+        on_rejected: Callable[[Any], Any] | None = None,
+        max_concurrency: int = 4,
+        idle_timeout: float = 300.0,
+    ) -> None:
+        """
+        Initialize the pool.
+
+        Args:
+            handler(Callable[[Any], Awaitable[Any]]): The coroutine function to process the item.
+            max_queue(int, optional): Max number of waiting items per session. Defaults to 4.
+            policy(str, optional): The overload policy when the queue is full. Defaults to 'drop_oldest'.
+                'drop_oldest': drop the oldest waiting item.
+                'merge': merge the new item into the newest waiting item.
+                'reply_busy': reject the new item.
+            merge(Callable[[Any, Any], Any] | None, optional): Merge the waiting item and the new item.
+                Required for 'merge' policy. Defaults to None.
+            on_rejected(Callable[[Any], Any] | None, optional): Called with the dropped or rejected item.
+                If it returns a coroutine, it is run as a task. Defaults to None.
+            max_concurrency(int, optional): Max number of items processed at the same time over all sessions.
+                It limits the load on the shared LLM and TTS. Defaults to 4.
+            idle_timeout(float, optional): The worker exits after idle for this time in seconds. Defaults to 300.
+
+        Raises:
+            ValueError: If the policy is invalid.
+        """
+        if policy not in OVERLOAD_POLICIES:
+            raise_message = f'Invalid overload policy. Supported policies are: {", ".join(OVERLOAD_POLICIES)}'
+            raise ValueError(raise_message)
+
+        if policy == 'merge' and merge is None:
+            raise_message = 'merge function is required for merge policy'
+            raise ValueError(raise_message)
+
+        self.handler = handler
+        self.max_queue = max_queue
+        self.policy = policy
+        self.merge = merge
+        self.on_rejected = on_rejected
+        self.idle_timeout = idle_timeout
+        self.max_concurrency = max_concurrency
+        self.limit = None
+        # NOTE: The semaphore is made in the event loop at the first submit().
+        self.active = 0
+        self.workers = {}
+        self.overloads = dict.fromkeys(OVERLOAD_POLICIES, 0)
+        self._tasks = set()
+
+    def submit(self, key: Any, item: Any) -> bool:  # noqa: ANN401
+        """
+        Queue the item to the worker of the session. The worker is started if not running.
+
+        Args:
+            key(Any): The session key. (ex. guild ID)
+            item(Any): The item.
+
+        Returns:
+            bool: False if the item is rejected.
+        """
+        if self.limit is None:
+            self.limit = asyncio.Semaphore(self.max_concurrency)
+
+        worker = self.workers.get(key)
+        if worker is None:
+            worker = SessionWorker(key, self)
+            self.workers[key] = worker
+            worker.start()
+
+        return worker.submit(item)
+
+    def queue_depths(self) -> dict[Any, int]:
+        """
+        Get the queue depth per session.
+
+        Returns:
+            dict[Any, int]: The queue depths.
+        """
+        return {key: worker.depth() for key, worker in list(self.workers.items())}
+
+    def remove(self, worker: SessionWorker) -> None:
+        """
+        Remove the idle worker.
+
+        Args:
+            worker(SessionWorker): The worker.
+        """
+        if self.workers.get(worker.key) is worker:
+            del self.workers[worker.key]
+
+        return
+
+    def call(self, callback: Callable[[Any], Any] | None, item: Any) -> None:  # noqa: ANN401
+        """
+        Call the callback. If it returns a coroutine, it is run as a task.
+
+        Args:
+            callback(Callable[[Any], Any] | None): The callback.
+            item(Any): The item.
+        """
+        if callback is None:
+            return
+
+        result = callback(item)
+        if asyncio.iscoroutine(result):
+            task = asyncio.create_task(result)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        return
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the voice pipeline with recorded token traces.
+
+Each token trace in benchmarks/traces is replayed with its timings through the same stages as aichat()
+(llm -> segment -> tts -> decode -> playback), against the local stand-in TTS server, into the fake voice sink.
+TTFA, gaps, duration and CPU time per scenario are written as JSON, so two runs can be compared with diff.
+
+Run from the repository root:
+    python ./benchmarks/bench_pipeline.py --output before.json
+    python ./benchmarks/bench_pipeline.py --tts-latency 0.8 --tts-concurrency 1 --output after.json
+
+Token traces of real replies are saved by the bot with TOKEN_TRACE_DIR. (see discord_bot.py)
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'aichatsystem'))
+
+import utilities.benchmark_utilities as bench_util
+import utilities.chunking_utilities as chunk_util
+import utilities.latency_utilities as latency_util
+from tts.voicevox_wrapper import VoicevoxWrapper
+
+TRACE_DIR = Path(__file__).resolve().parent / 'traces'
+
+
+def make_synthesize(tts_client: VoicevoxWrapper, predictor: latency_util.LatencyPredictor) -> Callable[[str], bytes]:
+    """
+    Make the tts stage, which records the synthesis time for the adaptive chunking like the bot.
+
+    Args:
+        tts_client(VoicevoxWrapper): The TTS client.
+        predictor(latency_util.LatencyPredictor): The predictor of the synthesis time.
+
+    Returns:
+        Callable[[str], bytes]: Generate the wav of the segment.
+    """
+    voice_config = {'speaker': 1}
+
+    def synthesize(segment: str) -> bytes:
+        """
+        Generate the wav of the segment. It runs in the executor.
+
+        Args:
+            segment(str): The segment.
+
+        Returns:
+            bytes: The wav data.
+        """
+        tts_start = time.perf_counter()
+        audio_query = tts_client.generate_audio_query(segment, voice_config)
+        voice_data = tts_client.generate_voice(audio_query, voice_config)
+        predictor.record('tts', 'voicevox', len(segment), time.perf_counter() - tts_start)
+        return voice_data
+
+    return synthesize
+
+
+def get_decode(name: str) -> Callable[[bytes], bytes]:
+    """
+    Get the decode stage.
+
+    Args:
+        name(str): 'wav' to read the wav of the stand-in server, or 'ffmpeg' to use decode_pcm() like the bot.
+
+    Returns:
+        Callable[[bytes], bytes]: Convert the wav to 48kHz 16bit stereo pcm.
+    """
+    if name == 'ffmpeg':
+        from utilities.discord_voice_utilities import decode_pcm  # noqa: PLC0415
+
+        return decode_pcm
+
+    return bench_util.decode_wav
+
+
+def run_scenario(
+    chunks: list[tuple[float, str]],
+    tts_client: VoicevoxWrapper,
+    args: argparse.Namespace,
+) -> dict[str, Any]:
+    """
+    Replay the token trace once.
+
+    Args:
+        chunks(list[tuple[float, str]]): The token trace.
+        tts_client(VoicevoxWrapper): The TTS client.
+        args(argparse.Namespace): The command line arguments.
+
+    Returns:
+        dict[str, Any]: The report. (see benchmark_utilities.run_replay())
+    """
+    predictor = latency_util.LatencyPredictor()
+    sink = bench_util.FakeVoiceSink()
+    chunking_policy = chunk_util.make_chunking_policy(
+        args.chunking,
+        first_len=args.first_chunk_len,
+        max_len=args.max_chunk_len,
+        estimate_synthesis=lambda length: predictor.predict('tts', 'voicevox', length),
+        get_backlog=sink.buffered_time,
+    )
+    sink.start()
+    try:
+        return asyncio.run(
+            bench_util.run_replay(
+                chunks,
+                chunking_policy,
+                make_synthesize(tts_client, predictor),
+                get_decode(args.decode),
+                sink,
+                args.tts_concurrency,
+                args.buffer_size,
+                args.speed,
+            ),
+        )
+    finally:
+        sink.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('traces', nargs='*', type=Path, help='Token trace files. Defaults to benchmarks/traces.')
+    parser.add_argument('--output', type=Path, help='The JSON report file. Defaults to stdout.')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per scenario.')
+    parser.add_argument('--speed', type=float, default=1.0, help='The replay speed of token traces.')
+    parser.add_argument('--tts-address', help='Use the real VOICEVOX engine instead of the stand-in server.')
+    parser.add_argument('--tts-latency', type=float, default=0.3, help='The base synthesis latency in seconds.')
+    parser.add_argument('--tts-latency-per-char', type=float, default=0.01, help='The synthesis latency per letter.')
+    parser.add_argument('--tts-jitter', type=float, default=0.0, help='The max random synthesis latency added.')
+    parser.add_argument('--speech-time-per-char', type=float, default=0.12, help='The voice length per letter.')
+    parser.add_argument('--tts-concurrency', type=int, default=2, help='TTS_CONCURRENCY of the bot.')
+    parser.add_argument('--buffer-size', type=int, default=4, help='PIPELINE_BUFFER_SIZE of the bot.')
+    parser.add_argument('--chunking', default='adaptive', choices=sorted(chunk_util.CHUNKING_POLICIES))
+    parser.add_argument('--first-chunk-len', type=int, default=15, help='FIRST_CHUNK_LEN of the bot.')
+    parser.add_argument('--max-chunk-len', type=int, default=120, help='MAX_CHUNK_LEN of the bot.')
+    parser.add_argument('--decode', default='wav', choices=('wav', 'ffmpeg'), help='Use ffmpeg with --tts-address.')
+    args = parser.parse_args()
+
+    trace_files = sorted(args.traces or TRACE_DIR.glob('*.jsonl'))
+    tts_server = None
+    if args.tts_address is None:
+        tts_server = bench_util.FakeTTSServer(
+            args.tts_latency, args.tts_latency_per_char, args.tts_jitter, args.speech_time_per_char,
+        )
+        tts_server.start()
+
+    try:
+        tts_client = VoicevoxWrapper(args.tts_address or tts_server.address)
+        scenarios = []
+        for trace_file in trace_files:
+            chunks = bench_util.load_token_trace(trace_file)
+            for run in range(1, args.repeat + 1):
+                report = run_scenario(chunks, tts_client, args)
+                scenarios.append({'scenario': trace_file.stem, 'run': run, **report})
+                print(
+                    f'{trace_file.stem} #{run}: ttfa:{report["ttfa"]:.3f} sec gaps:{report["gaps"]["count"]} '
+                    f'({report["gaps"]["total"]:.3f} sec) duration:{report["duration"]:.3f} sec '
+                    f'cpu:{report["cpu_time"]:.3f} sec',
+                    file=sys.stderr,
+                )
+    finally:
+        if tts_server is not None:
+            tts_server.stop()
+
+    config = {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()}
+    config['traces'] = [trace_file.name for trace_file in trace_files]
+    config.pop('output')
+    result = json.dumps(bench_util.round_report({'config': config, 'scenarios': scenarios}), indent=2, sort_keys=True)
+    if args.output is None:
+        print(result)
+    else:
+        args.output.write_text(result + '\n', encoding='utf-8')
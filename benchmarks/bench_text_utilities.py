@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks of the text segmentation on long texts.
+
+Run from the repository root:
+    python ./benchmarks/bench_text_utilities.py
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'aichatsystem'))
+
+from utilities.text_utilities import StreamingSegmenter, WordMarks
+
+SENTENCE = (
+    'いろはにほへとちりぬるを、わかよたれそつねならむ！？ういのおくやまきょうこえて。'  # noqa: RUF001
+    '\nあさきゆめみしえひもせす。'
+)
+
+
+def legacy_streaming(chunks: list[str]) -> list[str]:
+    """
+    The per-letter loop which was used in aichat(), for comparison.
+
+    Args:
+        chunks(list[str]): Text chunks.
+
+    Returns:
+        list[str]: Segments.
+    """
+    word_marks = WordMarks()
+    segments = []
+    text_buffer = ''
+    is_make_voice = False
+    for txt in chunks:
+        for letter in txt:
+            is_sp, _, _, _, is_n = word_marks.check_letter(letter)
+            if not is_sp and is_make_voice and len(text_buffer) > 0:
+                segments.append(text_buffer)
+                text_buffer = ''
+                is_make_voice = False
+
+            if not is_n:
+                text_buffer = text_buffer + letter
+
+            if is_sp:
+                is_make_voice = True
+
+    segments.append(text_buffer)
+    return segments
+
+
+def segmenter_streaming(chunks: list[str]) -> list[str]:
+    """
+    StreamingSegmenter.
+
+    Args:
+        chunks(list[str]): Text chunks.
+
+    Returns:
+        list[str]: Segments.
+    """
+    return list(StreamingSegmenter().iter_segments(chunks))
+
+
+def make_chunks(text: str, chunk_len: int) -> list[str]:
+    """
+    Split the text into chunks like LLM streaming.
+
+    Args:
+        text(str): Text.
+        chunk_len(int): Letters per chunk.
+
+    Returns:
+        list[str]: Text chunks.
+    """
+    return [text[idx : idx + chunk_len] for idx in range(0, len(text), chunk_len)]
+
+
+if __name__ == '__main__':
+    for repeat in (10, 100, 1000):
+        text = SENTENCE * repeat
+        for chunk_len in (3, 50, len(text)):
+            # NOTE: The whole text in one chunk is the case of split_text_for_voice().
+            chunks = make_chunks(text, chunk_len)
+            assert legacy_streaming(chunks) == segmenter_streaming(chunks)  # noqa: S101
+            number = max(1, 1000 // repeat)
+            legacy = min(timeit.repeat(lambda c=chunks: legacy_streaming(c), number=number, repeat=3)) / number
+            new = min(timeit.repeat(lambda c=chunks: segmenter_streaming(c), number=number, repeat=3)) / number
+            print(
+                f'letters:{len(text):>7} chunk_len:{chunk_len:>7} '
+                f'legacy:{legacy * 1000:9.3f} ms segmenter:{new * 1000:9.3f} ms speedup:{legacy / new:6.1f}x',
+            )
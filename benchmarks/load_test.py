@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Load test of the message handling with concurrent voice channels, for capacity planning.
+
+Each simulated channel sends a message, waits until the voice reply is played, thinks, and sends the next one.
+Messages take the same path as the bot: debounce -> per-guild worker with the bounded queue
+-> voice pipeline (llm -> segment -> tts -> decode -> playback) with the TTS limit.
+The LLM is the replay of token traces, the TTS is the stand-in server in a child process,
+and each guild has the fake voice sink which reads 20ms frames like the discord audio player.
+
+The number of channels is ramped. Each step reports throughput, TTFA percentiles, gaps, event loop lag and RSS,
+and the saturation point is the first step the process can not sustain.
+
+Run from the repository root:
+    python ./benchmarks/load_test.py --channels 1,2,4,8,16,32 --step-duration 60 --output load.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from pathlib import Path
+from typing import Any
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'aichatsystem'))
+
+import utilities.benchmark_utilities as bench_util
+import utilities.chunking_utilities as chunk_util
+import utilities.debounce_utilities as debounce_util
+import utilities.latency_utilities as latency_util
+import utilities.metrics_utilities as metrics_util
+import utilities.worker_utilities as worker_util
+from tts.voicevox_wrapper import VoicevoxWrapper
+
+TRACE_DIR = Path(__file__).resolve().parent / 'traces'
+
+
+class FakeMessage:
+    """
+    The message of the fake gateway.
+    """
+
+    def __init__(self, guild_id: int, chunks: list[tuple[float, str]]) -> None:
+        """
+        Initialize the message. Make it in the event loop.
+
+        Args:
+            guild_id(int): The guild ID. Each guild has one channel.
+            chunks(list[tuple[float, str]]): The token trace of the reply.
+        """
+        self.guild_id = guild_id
+        self.chunks = chunks
+        self.time_received = time.perf_counter()
+        self.done = asyncio.get_running_loop().create_future()
+
+    def finish(self) -> None:
+        """
+        Notify the channel that the reply was played or the message was dropped.
+        """
+        if not self.done.done():
+            self.done.set_result(None)
+
+        return
+
+
+class LoadTest:
+    """
+    Run the ramp of concurrent channels in one event loop, the same as one bot process.
+    """
+
+    def __init__(self, args: argparse.Namespace, traces: list[list[tuple[float, str]]], tts_address: str) -> None:
+        """
+        Initialize the load test. Call run() in the event loop.
+
+        Args:
+            args(argparse.Namespace): The command line arguments.
+            traces(list[list[tuple[float, str]]]): The token traces. Each message uses one at random.
+            tts_address(str): The address of the TTS server.
+        """
+        self.args = args
+        self.traces = traces
+        self.tts_client = VoicevoxWrapper(tts_address)
+        self.tts_predictor = latency_util.LatencyPredictor()
+        self.sinks = {}
+        self.stats = None
+        self.tts_limit = None
+        self.random = random.Random(args.seed)  # noqa: S311
+        self.workers = worker_util.WorkerPool(
+            self.handle,
+            args.queue_size,
+            args.overload_policy,
+            merge=self.merge_queued,
+            on_rejected=self.reject,
+            max_concurrency=args.max_turns,
+        )
+        self.debouncer = debounce_util.MessageDebouncer(
+            lambda _key, message: self.submit(message),
+            self.merge_burst,
+            args.debounce_quiet_period,
+        )
+
+    def submit(self, message: FakeMessage) -> None:
+        """
+        Queue the message to the worker of the guild.
+
+        Args:
+            message(FakeMessage): The message.
+        """
+        self.workers.submit(message.guild_id, message)
+        return
+
+    def merge_burst(self, messages: list[FakeMessage]) -> FakeMessage:
+        """
+        Merge the burst of messages. The last message is answered.
+
+        Args:
+            messages(list[FakeMessage]): The messages.
+
+        Returns:
+            FakeMessage: The last message.
+        """
+        for message in messages[:-1]:
+            message.finish()
+
+        return messages[-1]
+
+    def merge_queued(self, queued: FakeMessage, message: FakeMessage) -> FakeMessage:
+        """
+        Merge the new message into the waiting message. The new message is answered.
+
+        Args:
+            queued(FakeMessage): The waiting message.
+            message(FakeMessage): The new message.
+
+        Returns:
+            FakeMessage: The new message.
+        """
+        queued.finish()
+        return message
+
+    def reject(self, message: FakeMessage) -> None:
+        """
+        Count the message dropped by the overload policy.
+
+        Args:
+            message(FakeMessage): The message.
+        """
+        self.stats['dropped'] += 1
+        message.finish()
+        return
+
+    async def synthesize(self, segment: str) -> bytes:
+        """
+        The tts stage with the TTS limit, the same as synthesize_voice() of the bot.
+
+        Args:
+            segment(str): The segment.
+
+        Returns:
+            bytes: The wav data.
+        """
+        loop = asyncio.get_running_loop()
+        voice_config = {'speaker': 1}
+        async with self.tts_limit:
+            tts_start = time.perf_counter()
+            audio_query = await loop.run_in_executor(None, self.tts_client.generate_audio_query, segment, voice_config)
+            voice_data = await loop.run_in_executor(None, self.tts_client.generate_voice, audio_query, voice_config)
+            tts_time = time.perf_counter() - tts_start
+
+        self.tts_predictor.record('tts', 'voicevox', len(segment), tts_time)
+        return voice_data
+
+    async def handle(self, message: FakeMessage) -> None:
+        """
+        Answer the message with voice. Called by the worker of the guild.
+
+        Args:
+            message(FakeMessage): The message.
+        """
+        sink = self.sinks[message.guild_id]
+        chunking_policy = chunk_util.make_chunking_policy(
+            self.args.chunking,
+            first_len=self.args.first_chunk_len,
+            max_len=self.args.max_chunk_len,
+            estimate_synthesis=lambda length: self.tts_predictor.predict('tts', 'voicevox', length),
+            get_backlog=sink.buffered_time,
+        )
+        try:
+            report = await bench_util.run_replay(
+                message.chunks,
+                chunking_policy,
+                self.synthesize,
+                bench_util.decode_wav,
+                sink,
+                self.args.tts_concurrency,
+                self.args.buffer_size,
+                time_start=message.time_received,
+            )
+            self.stats['turns'].append((time.perf_counter(), report))
+        finally:
+            message.finish()
+
+    async def channel(self, guild_id: int, stop: asyncio.Event) -> None:
+        """
+        Send messages of one channel until the step ends.
+
+        Args:
+            guild_id(int): The guild ID.
+            stop(asyncio.Event): Set at the end of the step.
+        """
+        await asyncio.sleep(self.random.uniform(0.0, self.args.think_time))
+        # NOTE: The channels start at random times, so the messages do not arrive at once.
+        while not stop.is_set():
+            message = FakeMessage(guild_id, self.random.choice(self.traces))
+            if self.args.debounce_quiet_period > 0:
+                self.debouncer.add(guild_id, message)
+            else:
+                self.submit(message)
+
+            await message.done
+            think_time = self.args.think_time * self.random.uniform(0.5, 1.5)
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop.wait(), think_time)
+
+    async def run_step(self, channels: int) -> dict[str, Any]:
+        """
+        Run the channels for the step duration, and wait for the replies in progress.
+
+        Args:
+            channels(int): The number of channels.
+
+        Returns:
+            dict[str, Any]: The step report.
+        """
+        for guild_id in range(channels):
+            if guild_id not in self.sinks:
+                self.sinks[guild_id] = bench_util.FakeVoiceSink()
+                self.sinks[guild_id].start()
+
+        self.stats = {'turns': [], 'dropped': 0}
+        loop_lag = bench_util.Samples()
+        lag_task = asyncio.create_task(metrics_util.monitor_loop_lag(loop_lag, self.args.lag_interval))
+        stop = asyncio.Event()
+        cpu_start = time.process_time()
+        time_start = time.perf_counter()
+        tasks = [asyncio.create_task(self.channel(guild_id, stop)) for guild_id in range(channels)]
+        await asyncio.sleep(self.args.step_duration)
+        time_end = time.perf_counter()
+        rss = metrics_util.process_rss()
+        stop.set()
+        await asyncio.gather(*tasks)
+        lag_task.cancel()
+        cpu_time = time.process_time() - cpu_start
+
+        reports = [report for _, report in self.stats['turns']]
+        turns = [finish_time for finish_time, _ in self.stats['turns'] if finish_time <= time_end]
+        # NOTE: The throughput counts the replies finished in the step.
+        #       TTFA and gaps include the replies finished after the step, which were started in it.
+        ttfa = bench_util.Samples()
+        for report in reports:
+            if report['ttfa'] is not None:
+                ttfa.observe(report['ttfa'])
+
+        audio_time = sum(report['audio_time'] for report in reports)
+        gap_time = sum(report['gaps']['total'] for report in reports)
+        return {
+            'channels': channels,
+            'turns': len(turns),
+            'throughput': len(turns) / (time_end - time_start),
+            'ttfa': ttfa.summary(),
+            'gap_ratio': gap_time / audio_time if audio_time > 0 else 0.0,
+            'gaps': sum(report['gaps']['count'] for report in reports),
+            'loop_lag': loop_lag.summary(),
+            'dropped': self.stats['dropped'],
+            'rss_bytes': rss,
+            'cpu_time': cpu_time,
+        }
+
+    async def run(self) -> list[dict[str, Any]]:
+        """
+        Run the ramp. It stops after the first saturated step unless --full-ramp.
+
+        Returns:
+            list[dict[str, Any]]: The step reports.
+        """
+        if self.args.executor_workers:
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(self.args.executor_workers))
+
+        self.tts_limit = asyncio.Semaphore(self.args.max_tts)
+        steps = []
+        try:
+            for channels in self.args.channels:
+                step = await self.run_step(channels)
+                steps.append(step)
+                print(
+                    f'channels:{channels:>4} turns:{step["turns"]:>5} throughput:{step["throughput"]:7.3f}/sec '
+                    f'ttfa p50:{step["ttfa"]["p50"] or 0:6.3f} p90:{step["ttfa"]["p90"] or 0:6.3f} sec '
+                    f'gap:{step["gap_ratio"]:6.1%} lag p99:{step["loop_lag"]["p99"] or 0:6.3f} sec '
+                    f'rss:{(step["rss_bytes"] or 0) / 2**20:7.1f} MiB dropped:{step["dropped"]}',
+                    file=sys.stderr,
+                )
+                saturation = bench_util.find_saturation(steps, **self.saturation_limits())
+                if saturation['saturated_channels'] is not None and not self.args.full_ramp:
+                    break
+        finally:
+            for sink in self.sinks.values():
+                sink.stop()
+
+        return steps
+
+    def saturation_limits(self) -> dict[str, float | None]:
+        """
+        Get the limits of find_saturation().
+
+        Returns:
+            dict[str, float | None]: The keyword arguments.
+        """
+        return {
+            'max_ttfa_increase': self.args.max_ttfa_increase,
+            'ttfa_slo': self.args.ttfa_slo,
+            'max_gap_increase': self.args.max_gap_increase,
+            'max_loop_lag': self.args.max_loop_lag,
+            'min_efficiency': self.args.min_efficiency,
+        }
+
+
+def serve_tts(options: dict[str, Any], ports: Any) -> None:  # noqa: ANN401
+    """
+    Run the stand-in TTS server in the child process, so it does not share the GIL with the bot.
+
+    Args:
+        options(dict[str, Any]): The arguments of FakeTTSServer.
+        ports(Any): The multiprocessing queue to send the port.
+    """
+    server = bench_util.FakeTTSServer(**options)
+    server.start()
+    ports.put(server.port)
+    threading.Event().wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('traces', nargs='*', type=Path, help='Token trace files. Defaults to benchmarks/traces.')
+    parser.add_argument('--output', type=Path, help='The JSON report file. Defaults to stdout.')
+    parser.add_argument('--channels', default='1,2,4,8,16,32', help='The ramp of concurrent channels.')
+    parser.add_argument('--step-duration', type=float, default=60.0, help='The duration of each step in seconds.')
+    parser.add_argument('--full-ramp', action='store_true', help='Run all steps after the saturation.')
+    parser.add_argument('--think-time', type=float, default=3.0, help='The mean wait between replies and messages.')
+    parser.add_argument('--seed', type=int, default=0, help='The seed of the traces and the think times.')
+    parser.add_argument('--tts-address', help='Use the real VOICEVOX engine instead of the stand-in server.')
+    parser.add_argument('--tts-latency', type=float, default=0.3, help='The base synthesis latency in seconds.')
+    parser.add_argument('--tts-latency-per-char', type=float, default=0.01, help='The synthesis latency per letter.')
+    parser.add_argument('--tts-jitter', type=float, default=0.1, help='The max random synthesis latency added.')
+    parser.add_argument('--speech-time-per-char', type=float, default=0.12, help='The voice length per letter.')
+    parser.add_argument('--tts-workers', type=int, help='The syntheses at the same time on the stand-in server.')
+    parser.add_argument('--queue-size', type=int, default=4, help='GUILD_QUEUE_SIZE of the bot.')
+    parser.add_argument('--overload-policy', default='drop_oldest', choices=worker_util.OVERLOAD_POLICIES)
+    parser.add_argument('--max-turns', type=int, default=4, help='MAX_CONCURRENT_TURNS of the bot.')
+    parser.add_argument('--max-tts', type=int, default=2, help='MAX_CONCURRENT_TTS of the bot.')
+    parser.add_argument('--tts-concurrency', type=int, default=2, help='TTS_CONCURRENCY of the bot.')
+    parser.add_argument('--buffer-size', type=int, default=4, help='PIPELINE_BUFFER_SIZE of the bot.')
+    parser.add_argument('--chunking', default='adaptive', choices=sorted(chunk_util.CHUNKING_POLICIES))
+    parser.add_argument('--first-chunk-len', type=int, default=15, help='FIRST_CHUNK_LEN of the bot.')
+    parser.add_argument('--max-chunk-len', type=int, default=120, help='MAX_CHUNK_LEN of the bot.')
+    parser.add_argument('--debounce-quiet-period', type=float, default=0.6, help='0 to disable the debounce.')
+    parser.add_argument('--executor-workers', type=int, help='The threads of the executor. Defaults to asyncio.')
+    parser.add_argument('--lag-interval', type=float, default=0.05, help='The interval of the loop lag probe.')
+    parser.add_argument('--max-ttfa-increase', type=float, default=1.0, help='The limit of TTFA p90 increase.')
+    parser.add_argument('--ttfa-slo', type=float, help='The limit of TTFA p90 in seconds.')
+    parser.add_argument('--max-gap-increase', type=float, default=0.05, help='The limit of gaps per audio time.')
+    parser.add_argument('--max-loop-lag', type=float, default=0.1, help='The limit of loop lag p99 in seconds.')
+    parser.add_argument('--min-efficiency', type=float, default=0.5, help='The limit of throughput per channel.')
+    args = parser.parse_args()
+    args.channels = [int(channels) for channels in args.channels.split(',')]
+
+    trace_files = sorted(args.traces or TRACE_DIR.glob('*.jsonl'))
+    traces = [bench_util.load_token_trace(trace_file) for trace_file in trace_files]
+    tts_process = None
+    tts_address = args.tts_address
+    if tts_address is None:
+        ports = multiprocessing.Queue()
+        options = {
+            'latency': args.tts_latency,
+            'latency_per_char': args.tts_latency_per_char,
+            'jitter': args.tts_jitter,
+            'speech_time_per_char': args.speech_time_per_char,
+            'max_concurrency': args.tts_workers,
+            'seed': args.seed,
+        }
+        tts_process = multiprocessing.Process(target=serve_tts, args=(options, ports), daemon=True)
+        tts_process.start()
+        tts_address = f'127.0.0.1:{ports.get(timeout=10)}'
+
+    try:
+        load_test = LoadTest(args, traces, tts_address)
+        steps = asyncio.run(load_test.run())
+    finally:
+        if tts_process is not None:
+            tts_process.terminate()
+
+    config = {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()}
+    config['traces'] = [trace_file.name for trace_file in trace_files]
+    config.pop('output')
+    report = {
+        'config': config,
+        'steps': steps,
+        'saturation': bench_util.find_saturation(steps, **load_test.saturation_limits()),
+    }
+    result = json.dumps(bench_util.round_report(report), indent=2, sort_keys=True)
+    if args.output is None:
+        print(result)
+    else:
+        args.output.write_text(result + '\n', encoding='utf-8')
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import mmap
+from array import array
+
+from utilities.audio_stream_utilities import FRAME_SIZE, JitterBuffer, OpusClip, sec_to_bytes
+
+
+def make_pcm(sec, value=1000):
+    return array('h', [value] * (sec_to_bytes(sec) // 2)).tobytes()
+
+
+def test_silence_when_starved():
+    buffer = JitterBuffer()
+    assert buffer.read_packet() == (bytes(FRAME_SIZE), False)
+
+
+def test_clip_callback_after_last_frame():
+    buffer = JitterBuffer(crossfade_len=0, fade_len=0)
+    played = []
+    buffer.append(make_pcm(0.05), played.append)
+    buffer.read_packet()
+    buffer.read_packet()
+    assert played == []
+    buffer.read_packet()
+    assert played == [True]
+    assert buffer.wait_drained(0)
+
+
+def test_crossfade_shortens_stream():
+    buffer = JitterBuffer(crossfade_len=0.01, fade_len=0)
+    buffer.append(make_pcm(0.1))
+    buffer.append(make_pcm(0.1))
+    assert abs(buffer.buffered_time() - 0.19) < 1e-6
+
+
+def test_clear_notifies_dropped_clips():
+    buffer = JitterBuffer()
+    played = []
+    buffer.append(make_pcm(0.1), played.append)
+    buffer.clear()
+    assert played == [False]
+    assert buffer.read_packet() == (bytes(FRAME_SIZE), False)
+
+
+def test_opus_clip_is_passed_through_in_order():
+    buffer = JitterBuffer(crossfade_len=0, fade_len=0)
+    played = []
+    buffer.append(make_pcm(0.02), played.append)
+    buffer.append_opus(OpusClip([b'a', b'b']), played.append)
+    buffer.append(make_pcm(0.02))
+    assert buffer.read_packet()[1] is False
+    assert buffer.read_packet() == (b'a', True)
+    assert played == [True]
+    assert buffer.read_packet() == (b'b', True)
+    assert played == [True, True]
+    assert buffer.read_packet()[1] is False
+    assert buffer.wait_drained(0)
+
+
+def test_opus_clip_close_keeps_queued_packets(tmp_path):
+    file_name = tmp_path / 'clip.bin'
+    file_name.write_bytes(b'ab')
+    with file_name.open('rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(mapped)
+    clip = OpusClip([view[0:1], view[1:2]], mapped)
+    del view
+    buffer = JitterBuffer(crossfade_len=0, fade_len=0)
+    buffer.append_opus(clip)
+    clip.close()
+    assert clip.packets == []
+    assert not mapped.closed
+    assert buffer.read_packet() == (b'a', True)
+    assert buffer.read_packet() == (b'b', True)
+
+    with file_name.open('rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(mapped)
+    clip = OpusClip([view[0:1]], mapped)
+    del view
+    clip.close()
+    assert mapped.closed
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip('simpleaudio')
+
+from utilities.audio_stream_utilities import FRAME_LENGTH
+from utilities.benchmark_utilities import (
+    FakeVoiceSink,
+    Samples,
+    TokenTraceRecorder,
+    decode_wav,
+    find_saturation,
+    load_token_trace,
+    make_wav,
+    replay_token_trace,
+    run_replay,
+    summarize_frames,
+)
+from utilities.chunking_utilities import SentenceChunkingPolicy
+
+
+def test_token_trace_round_trip(tmp_path):
+    recorder = TokenTraceRecorder()
+    recorder.add('こんにちは')
+    recorder.add('。')
+    recorder.save(tmp_path / 'trace.jsonl')
+    chunks = load_token_trace(tmp_path / 'trace.jsonl')
+    assert [text for _, text in chunks] == ['こんにちは', '。']
+    assert chunks[0][0] <= chunks[1][0]
+
+
+def test_replay_keeps_timings():
+    time_start = time.perf_counter()
+    times = [time.perf_counter() - time_start for _ in replay_token_trace([(0.0, 'a'), (0.1, 'b')])]
+    assert times[0] < 0.05
+    assert 0.09 < times[1] < 0.2
+
+
+def test_summarize_frames_finds_gaps():
+    frames = [1.0 + FRAME_LENGTH * idx for idx in range(10)] + [1.5 + FRAME_LENGTH * idx for idx in range(5)]
+    report = summarize_frames(frames, 0.5)
+    assert report['ttfa'] == pytest.approx(0.5)
+    assert report['gaps']['count'] == 1
+    assert report['gaps']['total'] == pytest.approx(0.5 - FRAME_LENGTH * 10)
+    assert report['audio_time'] == pytest.approx(FRAME_LENGTH * 15)
+
+
+def test_replay_plays_all_segments():
+    sink = FakeVoiceSink()
+    sink.start()
+    try:
+        report = asyncio.run(
+            run_replay(
+                [(0.0, 'あい。'), (0.05, 'うえ。')],
+                SentenceChunkingPolicy(),
+                lambda segment: make_wav(0.1 * len(segment)),
+                decode_wav,
+                sink,
+            ),
+        )
+    finally:
+        sink.stop()
+
+    assert report['segments'] == 2
+    assert report['ttfa'] is not None
+    assert report['audio_time'] == pytest.approx(0.6, abs=0.1)
+
+
+def make_step(channels, throughput, ttfa_p90, dropped=0):
+    return {
+        'channels': channels,
+        'throughput': throughput,
+        'ttfa': {'p90': ttfa_p90},
+        'gap_ratio': 0.0,
+        'loop_lag': {'p99': 0.001},
+        'dropped': dropped,
+    }
+
+
+def test_find_saturation():
+    steps = [make_step(1, 0.2, 1.5), make_step(2, 0.4, 1.6), make_step(4, 0.3, 3.0)]
+    assert find_saturation(steps) == {'max_channels': 2, 'saturated_channels': 4, 'reasons': ['ttfa', 'throughput']}
+    assert find_saturation(steps[:2])['saturated_channels'] is None
+    assert find_saturation([make_step(1, 0.2, 1.5), make_step(2, 0.4, 1.5, dropped=1)])['reasons'] == ['dropped']
+
+
+def test_samples_summary():
+    samples = Samples()
+    assert samples.summary()['p50'] is None
+    for value in (0.1, 0.2, 0.3):
+        samples.observe(value)
+
+    assert samples.summary()['p50'] == pytest.approx(0.2)
+    assert samples.summary()['max'] == pytest.approx(0.3)
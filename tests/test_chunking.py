@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import Future
+
+import pytest
+from utilities.chunking_utilities import (
+    AdaptiveChunkingPolicy,
+    ChunkingMetrics,
+    SentenceChunkingPolicy,
+    make_chunking_policy,
+)
+
+TEXT = 'こんにちは。今日はいい天気じゃのう。散歩にでも行くかの？'  # noqa: RUF001
+
+
+def stream(text, size=3):
+    return [text[idx : idx + size] for idx in range(0, len(text), size)]
+
+
+def test_sentence_policy_splits_every_mark():
+    chunks = list(SentenceChunkingPolicy().iter_chunks(stream(TEXT)))
+    assert chunks == ['こんにちは。', '今日はいい天気じゃのう。', '散歩にでも行くかの？']  # noqa: RUF001
+
+
+def test_adaptive_first_chunk_is_cut_short():
+    policy = AdaptiveChunkingPolicy(first_len=4)
+    chunks = list(policy.iter_chunks(stream('あいうえおかきくけこ。さしすせそ。')))
+    assert chunks[0] == 'あいうえおか'
+    assert ''.join(chunks) == 'あいうえおかきくけこ。さしすせそ。'
+
+
+def test_adaptive_merges_while_backlog_is_enough():
+    policy = AdaptiveChunkingPolicy(estimate_synthesis=lambda length: 0.01 * length, get_backlog=lambda: 10.0)
+    chunks = list(policy.iter_chunks(stream(TEXT)))
+    assert chunks == ['こんにちは。', '今日はいい天気じゃのう。散歩にでも行くかの？']  # noqa: RUF001
+
+
+def test_adaptive_does_not_merge_without_estimate():
+    policy = AdaptiveChunkingPolicy(get_backlog=lambda: 10.0)
+    chunks = list(policy.iter_chunks(stream(TEXT)))
+    assert chunks == list(SentenceChunkingPolicy().iter_chunks(stream(TEXT)))
+
+
+def test_adaptive_releases_held_text_when_backlog_drains():
+    backlog = [10.0]
+    policy = AdaptiveChunkingPolicy(estimate_synthesis=lambda length: 0.01 * length, get_backlog=lambda: backlog[0])
+    chunks = [text for chunk in stream(TEXT) for text in policy.feed(chunk)]
+    assert chunks == ['こんにちは。']
+    assert list(policy.poll()) == []
+    backlog[0] = 0.0
+    assert list(policy.poll()) == ['今日はいい天気じゃのう。']
+    assert list(policy.flush()) == ['散歩にでも行くかの？']  # noqa: RUF001
+
+
+def test_make_chunking_policy():
+    policy = make_chunking_policy('sentence', first_len=4)
+    assert isinstance(policy, SentenceChunkingPolicy)
+    policy = make_chunking_policy('adaptive', first_len=4, margin=0.5)
+    assert isinstance(policy, AdaptiveChunkingPolicy)
+    assert policy.margin == 0.5
+    with pytest.raises(ValueError, match='Invalid chunking policy'):
+        make_chunking_policy('unknown')
+
+
+def test_metrics_counts_gap_only_when_idle():
+    metrics = ChunkingMetrics(0.0)
+    first, second, third = Future(), Future(), Future()
+    metrics.on_submit('あ', first)
+    metrics.on_submit('い', second)
+    first.set_result(True)
+    second.set_result(True)
+    metrics.on_submit('う', third)
+    report = metrics.report()
+    assert report['chunks'] == 3
+    assert report['gaps'] == 1
+
+
+def test_metrics_with_finished_future():
+    metrics = ChunkingMetrics(0.0)
+    finished = Future()
+    finished.set_result(True)
+    metrics.on_submit('あ', finished)
+    metrics.on_submit('い', Future())
+    assert metrics.report()['gaps'] == 1
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import dataclasses
+import time
+
+import pytest
+import utilities.config_utilities as config_util
+from utilities.config_utilities import ConfigService, get_config_value, parse_config
+
+SAMPLE_CONFIG = './configs/sample_config.yaml'
+
+
+def test_sample_config_is_valid():
+    config = ConfigService(SAMPLE_CONFIG).snapshot
+    assert config.tts.address == '127.0.0.1:50021'
+    assert config.character.filler_dir == './sound_files/filler/nojyaloli/'
+    assert config.voice_config()['speed'] == 1.2
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        config.tts.port = 1
+
+    assert config.character.guild_prompt_log_path(1234).endswith('prompt_log.1234.csv')
+
+
+def test_invalid_values_are_rejected():
+    with pytest.raises(ValueError, match=r'TTS\.PORT'):
+        parse_config({'TTS': {'PORT': 'abc'}})
+    with pytest.raises(ValueError, match='SPEAKER'):
+        parse_config({'TTS': {'SPEAKER': 1}})
+    assert parse_config({'TTS': {'SPEED_SCALE': 1}}).tts.speed_scale == 1.0
+    with pytest.raises(TypeError, match='TTS'):
+        parse_config({'TTS': 'voicevox'})
+
+
+def test_reload_swaps_snapshot(tmp_path):
+    config_file_name = tmp_path / 'config.yaml'
+    config_file_name.write_text('TTS:\n  SPEAKER_ID: 1\n')
+    service = ConfigService(str(config_file_name))
+    old = service.snapshot
+    changed = []
+    service.add_listener(changed.append)
+    config_file_name.write_text('TTS:\n  SPEAKER_ID: 2\n')
+    assert service.reload()
+    assert service.snapshot.tts.speaker_id == 2
+    assert old.tts.speaker_id == 1
+    assert changed == [service.snapshot]
+    config_file_name.write_text('TTS:\n  SPEAKER_ID: two\n')
+    assert not service.reload()
+    assert service.snapshot.tts.speaker_id == 2
+
+
+def test_config_value_is_reloaded_when_changed(tmp_path, monkeypatch):
+    config_file_name = tmp_path / 'config.yaml'
+    config_file_name.write_text('MESSAGE: hello\n')
+    service = ConfigService(str(config_file_name), poll_interval=0.01)
+    monkeypatch.setattr(config_util, '_services', {str(config_file_name): service})
+    assert get_config_value('MESSAGE', config_file_name=str(config_file_name)) == 'hello'
+    config_file_name.write_text('MESSAGE: good bye\n')
+    deadline = time.monotonic() + 5
+    while get_config_value('MESSAGE', config_file_name=str(config_file_name)) != 'good bye':
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    service.stop_watching()
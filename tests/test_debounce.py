@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from utilities.debounce_utilities import MessageDebouncer
+
+
+def make_debouncer(flushed, **kwargs: float):
+    return MessageDebouncer(lambda key, item: flushed.append((key, item)), '\n'.join, **kwargs)
+
+
+def test_merge_burst_after_quiet_period():
+    async def run():
+        flushed = []
+        debouncer = make_debouncer(flushed, quiet_period=0.05, max_wait=1.0)
+        for text in ('えっと', 'あのね', '今日の天気は？'):  # noqa: RUF001
+            debouncer.add('user', text)
+            await asyncio.sleep(0.02)
+
+        assert flushed == []
+        await asyncio.sleep(0.06)
+        assert flushed == [('user', 'えっと\nあのね\n今日の天気は？')]  # noqa: RUF001
+
+    asyncio.run(run())
+
+
+def test_max_wait_bounds_latency():
+    async def run():
+        flushed = []
+        debouncer = make_debouncer(flushed, quiet_period=0.05, max_wait=0.1)
+        for idx in range(8):
+            debouncer.add('user', str(idx))
+            await asyncio.sleep(0.03)
+
+        await asyncio.sleep(0.06)
+        assert len(flushed) >= 2
+        assert ''.join(item.replace('\n', '') for _, item in flushed) == '01234567'
+
+    asyncio.run(run())
+
+
+def test_typing_early_start_and_extend():
+    async def run():
+        flushed = []
+        debouncer = make_debouncer(flushed, quiet_period=1.0, max_wait=1.0, typing_quiet_period=0.02, typing_wait=0.1)
+        debouncer.add('a', 'no typing')
+        debouncer.add('b', 'first')
+        debouncer.typing('b')
+        await asyncio.sleep(0.05)
+        assert flushed == [('a', 'no typing')]
+        debouncer.add('b', 'second')
+        await asyncio.sleep(0.05)
+        assert flushed == [('a', 'no typing'), ('b', 'first\nsecond')]
+
+    asyncio.run(run())
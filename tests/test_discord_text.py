@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from utilities.discord_text_utilities import StreamingReply, split_message
+
+
+def test_split_message_at_marks():
+    text = 'あ' * 12 + '。' + 'い' * 5 + '\n' + 'う' * 10
+    assert split_message(text, 20) == ['あ' * 12 + '。' + 'い' * 5 + '\n', 'う' * 10]
+    assert split_message('あ' * 12 + '。' + 'い' * 10, 20) == ['あ' * 12 + '。', 'い' * 10]
+    assert split_message('x' * 25, 10) == ['x' * 10, 'x' * 10, 'x' * 5]
+    assert split_message('', 10) == ['']
+
+
+def test_streaming_reply_coalesces_edits():
+    async def run():
+        channel = []
+
+        class Sent:
+            def __init__(self, content) -> None:
+                self.content = content
+                channel.append(self)
+
+        async def send(content):
+            return Sent(content)
+
+        async def edit(sent, content):
+            sent.content = content
+
+        reply = StreamingReply(send, edit, prefix='@user ', min_interval=0.05, limit=20)
+        reply.feed('こんにちは')
+        await asyncio.sleep(0)
+        for _ in range(10):
+            reply.feed('、元気')
+            await asyncio.sleep(0.01)
+
+        sent = await reply.finish()
+        assert [message.content for message in sent] == [message.content for message in channel]
+        assert ''.join(message.content for message in channel) == '@user こんにちは' + '、元気' * 10
+        assert all(len(message.content) <= 20 for message in channel)
+        assert reply.edits < 10
+
+    asyncio.run(run())
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+from utilities.latency_utilities import LatencyPredictor, prompt_length
+
+
+def test_prompt_length():
+    assert prompt_length([{'role': 'user', 'content': 'abc'}]) == 7
+
+
+def test_predict_needs_samples():
+    predictor = LatencyPredictor(min_samples=2)
+    predictor.record('openai', 'gpt-4o', 100, 1.0)
+    assert predictor.predict('openai', 'gpt-4o', 100) is None
+
+
+def test_predict_by_prompt_length():
+    predictor = LatencyPredictor()
+    for length in (100, 200, 300):
+        predictor.record('openai', 'gpt-4o', length, length / 100)
+    assert abs(predictor.predict('openai', 'gpt-4o', 400) - 4.0) < 1e-9
+    assert predictor.predict('gemini', 'gemini-1.5-pro', 400) is None
+
+
+def test_rolling_window():
+    predictor = LatencyPredictor(window=3)
+    for latency in (10.0, 10.0, 10.0, 1.0, 1.0, 1.0):
+        predictor.record('openai', 'gpt-4o', 100, latency)
+    assert predictor.predict('openai', 'gpt-4o', 100) == 1.0
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import csv
+from datetime import datetime
+
+from utilities.log_analysis_utilities import (
+    compare,
+    filter_replies,
+    iter_log_lines,
+    iter_replies,
+    log_file_key,
+    percentile,
+    summarize,
+    throughput_per_hour,
+)
+
+
+def write_log(file_name, replies):
+    with file_name.open('w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        for time_str, model, start, text in replies:
+            writer.writerow([f'{time_str} [system] ==== GenerateSpeach ===='])
+            writer.writerow([f'{time_str} [system] llm_name:openai'])
+            writer.writerow([f'{time_str} [system] model_name:{model}'])
+            writer.writerow([f'{time_str} [system] speach_start_time:{start}'])
+            writer.writerow([f'{time_str} [system] text_length:{len(text)}'])
+            writer.writerow([f'{time_str} [system] {text}'])
+
+
+def test_log_file_key():
+    file_names = ['2024_0601.log', '2024_0601.1000.log.gz', '2024_0531.log', '2024_0601.999.log.gz']
+    assert sorted(file_names, key=log_file_key) == [
+        '2024_0531.log',
+        '2024_0601.999.log.gz',
+        '2024_0601.1000.log.gz',
+        '2024_0601.log',
+    ]
+
+
+def test_percentile():
+    assert percentile([1.0, 2.0, 3.0, 4.0, 5.0], 50) == 3.0
+    assert percentile([1.0, 2.0], 90) == 1.9
+
+
+def test_replies_are_parsed_with_multiline_text(tmp_path):
+    write_log(
+        tmp_path / '2024_0601.log',
+        [('2024-06-01 10:00:00', 'gpt-4o', 1.0, 'こんにちは,\n"元気"'), ('2024-06-01 11:00:00', 'gpt-4o', 2.0, 'a')],
+    )
+    replies = list(iter_replies(iter_log_lines([tmp_path / '2024_0601.log'])))
+    assert len(replies) == 2
+    assert replies[0]['model'] == 'gpt-4o'
+    assert replies[0]['speach_start_time'] == 1.0
+    assert replies[0]['text_length'] == 11
+    assert [row['replies'] for row in throughput_per_hour(replies)] == [1, 1]
+
+
+def test_replies_at_the_same_time_are_told_apart_by_turn():
+    lines = [
+        '2024-06-01 10:00:00 [system#t-1] ==== GenerateSpeach ====',
+        '2024-06-01 10:00:00 [system#t-1] model_name:gpt-4o',
+        '2024-06-01 10:00:01 [system#t-2] ==== GenerateSpeach ====',
+        '2024-06-01 10:00:01 [system#t-2] model_name:gemini-1.5-pro',
+        '2024-06-01 10:00:02 [system#t-2] speach_start_time:2.0',
+        '2024-06-01 10:00:02 [system#t-1] speach_start_time:1.0',
+        '2024-06-01 10:00:03 [system#t-1] ==== Cancelled ====',
+        '2024-06-01 10:00:03 [system#t-1] text_length:1',
+        '2024-06-01 10:00:04 [system#t-2] text_length:2',
+    ]
+    replies = {reply['model']: reply for reply in iter_replies(lines)}
+    assert replies['gpt-4o']['speach_start_time'] == 1.0
+    assert replies['gpt-4o']['cancelled'] is True
+    assert replies['gemini-1.5-pro']['speach_start_time'] == 2.0
+    assert replies['gemini-1.5-pro']['cancelled'] is False
+
+
+def test_summary_and_regression(tmp_path):
+    write_log(
+        tmp_path / 'a.log',
+        [('2024-06-01 10:00:00', 'gpt-4o', 1.0, 'a'), ('2024-06-02 10:00:00', 'gpt-4o', 2.0, 'a')],
+    )
+    replies = list(iter_replies(iter_log_lines([tmp_path / 'a.log'])))
+    day = datetime(2024, 6, 2)  # noqa: DTZ001
+    before = summarize(filter_replies(replies, until=day), 'model', ('speach_start_time',))
+    after = summarize(filter_replies(replies, since=day), 'model', ('speach_start_time',))
+    assert before[0]['p50'] == 1.0
+    rows = compare(before, after)
+    assert rows[0]['regression'] is True
+    assert rows[0]['change_p50'] == 1.0
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from utilities.log_analysis_utilities import iter_log_lines
+from utilities.log_utilities import LogRotation, LogWriter
+
+
+def test_lines_are_written_in_order(tmp_path):
+    log_file_name = tmp_path / 'test.log'
+    writer = LogWriter(flush_size=2, flush_interval=10)
+    for idx in range(5):
+        assert writer.write(f'line {idx}', str(log_file_name))
+
+    writer.flush()
+    assert log_file_name.read_text(encoding='utf-8').splitlines() == [f'line {idx}' for idx in range(5)]
+    writer.close()
+
+
+def test_current_path_is_used(tmp_path):
+    log_file_name = tmp_path / 'current.log'
+    writer = LogWriter()
+    writer.current_path = str(log_file_name)
+    writer.write('hello')
+    writer.close()
+    assert log_file_name.read_text(encoding='utf-8').splitlines() == ['hello']
+
+
+def test_lines_are_dropped_when_full(tmp_path):
+    log_file_name = tmp_path / 'full.log'
+    writer = LogWriter(max_queue=1)
+    writer._thread = object()  # NOTE: Do not start the writer thread, so the queue is not drained.
+    assert writer.write('a', str(log_file_name))
+    assert not writer.write('b', str(log_file_name))
+    assert writer.dropped == 1
+
+
+def test_rotated_segments_are_compressed_and_readable(tmp_path):
+    log_file_name = tmp_path / '2024_0601.log'
+    rotation = LogRotation(max_bytes=20, retention_days=None)
+    writer = LogWriter(rotation=rotation)
+    for idx in range(3):
+        writer.write(f'line {idx} ' + 'x' * 20, str(log_file_name))
+
+    writer.close()
+    rotation.wait()
+    segments = sorted(tmp_path.glob('*.log*'))
+    assert [segment.name for segment in segments] == [f'2024_0601.00{idx}.log.gz' for idx in range(1, 4)]
+    lines = list(iter_log_lines(segments))
+    assert lines == [f'line {idx} ' + 'x' * 20 for idx in range(3)]
+
+
+def test_lines_are_rotated_by_the_written_size(tmp_path):
+    log_file_name = tmp_path / '2024_0601.log'
+    log_file_name.write_text('x' * 60 + '\n', encoding='utf-8')
+    rotation = LogRotation(max_bytes=100, compression=None, retention_days=None)
+    writer = LogWriter(use_csv=False, rotation=rotation)
+    for idx in range(13):
+        writer.write(f'line {idx:02d} ' + 'x' * 11, str(log_file_name))
+
+    writer.close()
+    rotation.wait()
+    segments = sorted(tmp_path.glob('2024_0601.*.log'))
+    assert [len(segment.read_text(encoding='utf-8').splitlines()) for segment in segments] == [3, 5, 5]
+    assert all(segment.stat().st_size >= 100 for segment in segments)
+    assert log_file_name.read_text(encoding='utf-8').splitlines() == ['line 12 ' + 'x' * 11]
+
+
+def test_expired_files_are_removed(tmp_path):
+    old_file_name = tmp_path / '2024_0501.p1.003.log.gz'
+    other_file_name = tmp_path / '2024_0501.p2.log'
+    for file_name in (old_file_name, other_file_name):
+        file_name.write_bytes(b'')
+        os.utime(file_name, (0, 0))
+
+    active_file_name = tmp_path / '2024_0601.p1.log'
+    active_file_name.write_text('')
+    rotation = LogRotation(retention_days=1)
+    assert rotation.remove_expired(tmp_path, active_file_name) == [old_file_name]
+    assert active_file_name.exists()
+    assert other_file_name.exists()
+
+
+def test_expired_files_are_removed_when_opened(tmp_path):
+    old_file_name = tmp_path / '2024_0501.log'
+    old_file_name.write_text('')
+    os.utime(old_file_name, (0, 0))
+    rotation = LogRotation(retention_days=1)
+    writer = LogWriter(rotation=rotation)
+    writer.write('hello', str(tmp_path / '2024_0601.log'))
+    writer.close()
+    rotation.wait()
+    assert not old_file_name.exists()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import tracemalloc
+
+import utilities.memory_utilities as memory_util
+import utilities.metrics_utilities as metrics_util
+
+
+def test_file_subsystem():
+    assert memory_util.file_subsystem(metrics_util.__file__) == 'utilities.metrics_utilities'
+    assert memory_util.file_subsystem('/venv/lib/python3.11/site-packages/discord/client.py') == 'discord'
+    assert memory_util.file_subsystem('/venv/lib/python3.11/site-packages/six.py') == 'six'
+    assert memory_util.file_subsystem(tracemalloc.__file__) == 'stdlib'
+    assert memory_util.type_subsystem(metrics_util.Counter) == 'utilities.metrics_utilities'
+    assert memory_util.type_subsystem(dict) == 'builtins'
+
+
+def test_growth():
+    assert memory_util.growth({'a': 3, 'b': 1, 'c': 2}, {'a': 1, 'b': 1, 'd': 1}) == [('a', 2), ('c', 2), ('d', -1)]
+    assert memory_util.format_growth(1.5 * 1024 * 1024) == '+1.5 MiB'
+    assert memory_util.format_growth(-2048) == '-2.0 KiB'
+
+
+class Leaked:
+    """
+    The object counted by the memory profiler.
+    """
+
+
+def test_memory_profiler_snapshot(tmp_path):
+    profiler = memory_util.MemoryProfiler(top=3)
+    key = (memory_util.type_subsystem(Leaked), f'{Leaked.__module__}.Leaked')
+    try:
+        profiler.take_snapshot()
+        assert profiler.is_tracing
+        assert profiler.object_counts[key] == 0
+        keep = [Leaked() for _ in range(2000)]
+        summary = profiler.take_snapshot(tmp_path / 'memory.tracemalloc')
+        assert 'snapshot #2' in summary
+        assert 'sec since the last snapshot' in summary
+        assert profiler.object_counts[key] == 2000
+        assert sum(profiler.subsystem_sizes.values()) > 0
+        assert profiler.traced_memory() > 0
+        assert tracemalloc.Snapshot.load(str(tmp_path / 'memory.tracemalloc')).traces
+        assert len(keep) == 2000
+    finally:
+        profiler.stop()
+
+    assert not profiler.is_tracing
+    assert profiler.sites == {}
+    assert not profiler.object_counts
+
+
+def test_subsystem_sizes():
+    sites = {
+        (metrics_util.__file__, 10): (100, 1),
+        (metrics_util.__file__, 20): (50, 2),
+        ('/usr/lib/json.py', 1): (7, 1),
+    }
+    assert memory_util.subsystem_sizes(sites) == {'utilities.metrics_utilities': 150, 'stdlib': 7}
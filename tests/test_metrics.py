@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+from urllib.request import urlopen
+
+import pytest
+from utilities.metrics_utilities import MetricsRegistry, process_rss, start_metrics_server
+
+
+def test_render_counter_gauge_histogram():
+    registry = MetricsRegistry()
+    registry.counter('messages', 'Messages.').inc()
+    registry.gauge('queue', 'Queue.').set_function(lambda: 3)
+    registry.counter('cache_hits', 'Cache hits.', ('cache',)).labels(cache='opus').set_function(lambda: 7)
+    histogram = registry.histogram('latency_seconds', 'Latency.', ('engine',), buckets=(0.1, 1.0))
+    histogram.labels(engine='voicevox').observe(0.05)
+    histogram.labels(engine='voicevox').observe(0.5)
+    histogram.labels(engine='voicevox').observe(5)
+    lines = registry.render().splitlines()
+    assert 'messages_total 1.0' in lines
+    assert 'queue 3.0' in lines
+    assert 'cache_hits_total{cache="opus"} 7.0' in lines
+    assert 'latency_seconds_bucket{engine="voicevox",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{engine="voicevox",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{engine="voicevox",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{engine="voicevox"} 3' in lines
+
+
+def test_register_twice_returns_same_metric():
+    registry = MetricsRegistry()
+    assert registry.counter('messages', 'Messages.') is registry.counter('messages', 'Messages.')
+    with pytest.raises(ValueError, match='already registered'):
+        registry.gauge('messages', 'Messages.')
+    with pytest.raises(ValueError, match='Invalid labels'):
+        registry.histogram('latency_seconds', 'Latency.', ('engine',)).labels(model='x')
+
+
+def test_metrics_server():
+    registry = MetricsRegistry()
+    registry.counter('messages', 'Messages.').inc(2)
+    server = start_metrics_server(registry, port=0)
+    try:
+        with urlopen(f'http://127.0.0.1:{server.server_port}/metrics') as response:
+            assert 'messages_total 2.0' in response.read().decode()
+    finally:
+        server.shutdown()
+
+
+def test_process_rss():
+    rss = process_rss()
+    assert rss is None or rss > 0
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+pytest.importorskip('discord')
+pytest.importorskip('simpleaudio')
+pytest.importorskip('ffmpeg')
+
+import utilities.opus_cache_utilities as opus_util
+
+
+@pytest.fixture
+def fake_encode(monkeypatch):
+    monkeypatch.setattr(opus_util, 'encode_opus', lambda pcm: [pcm])
+
+
+@pytest.mark.usefixtures('fake_encode')
+def test_utterances_are_limited(tmp_path):
+    cache = opus_util.OpusCache(str(tmp_path), max_utterances=2)
+    filler = cache.put('filler', b'f')
+    first = cache.put('tts_1', b'1')
+    cache.put('tts_2', b'2')
+    assert cache.get('tts_1') is first
+    cache.put('tts_3', b'3')
+    assert cache.get('tts_2') is None
+    assert not (tmp_path / 'tts_2.opus').exists()
+    assert list(cache.utterances) == ['tts_1', 'tts_3']
+    assert cache.get('filler') is filler
+    assert bytes(first.packets[0]) == b'1'
+
+
+@pytest.mark.usefixtures('fake_encode')
+def test_put_closes_replaced_clip(tmp_path):
+    cache = opus_util.OpusCache(str(tmp_path))
+    old_clip = cache.put('tts_1', b'1')
+    mapping = old_clip.mapping
+    cache.put('tts_1', b'2')
+    assert mapping.closed
+    assert bytes(cache.get('tts_1').packets[0]) == b'2'
+
+
+def test_load_prunes_old_utterances(tmp_path):
+    for idx, key in enumerate(['tts_1', 'tts_2', 'tts_3', 'filler']):
+        opus_util.write_opus_file(tmp_path / f'{key}.opus', [key.encode()])
+        os.utime(tmp_path / f'{key}.opus', (idx, idx))
+
+    cache = opus_util.OpusCache(str(tmp_path), max_utterances=2)
+    assert cache.load() == 3
+    assert sorted(cache.clips) == ['filler', 'tts_2', 'tts_3']
+    assert not (tmp_path / 'tts_1.opus').exists()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+
+from utilities.pipeline_utilities import Map, Pipeline, Sink, Source, Transform
+
+
+def test_pipeline_keeps_order_with_concurrency():
+    async def run():
+        results = []
+
+        async def synthesize(text):
+            await asyncio.sleep(0.03 if text == 'a' else 0.01)
+            return text.upper()
+
+        def segment(chunk):
+            return chunk.split('|')
+
+        pipeline = Pipeline(
+            [
+                Source('llm', ['a|b', 'c|skip', 'd']),
+                Transform('segment', segment, lambda: ['e']),
+                Map('tts', synthesize, concurrency=3),
+                Map('filter', lambda text: None if text == 'SKIP' else text),
+                Sink('playback', results.append),
+            ],
+            buffer_size=2,
+        )
+        start = time.perf_counter()
+        assert await pipeline.run()
+        assert results == ['A', 'B', 'C', 'D', 'E']
+        assert time.perf_counter() - start < 0.03 + 0.01 * 5
+        report = pipeline.report()
+        assert report['segment']['items'] == 6
+        assert report['playback']['items'] == 5
+        assert report['tts']['busy_time'] > 0
+
+    asyncio.run(run())
+
+
+def test_transform_polls_while_input_stalls():
+    async def run():
+        results = []
+        held = []
+
+        async def source():
+            yield 'a'
+            await asyncio.sleep(0.1)
+            yield 'b'
+
+        def feed(item):
+            held.append(item)
+            return []
+
+        def poll():
+            released = list(held)
+            held.clear()
+            return released
+
+        pipeline = Pipeline(
+            [
+                Source('llm', source()),
+                Transform('segment', feed, poll, poll, poll_interval=0.01),
+                Sink('playback', lambda item: results.append((item, time.perf_counter()))),
+            ],
+        )
+        start = time.perf_counter()
+        assert await pipeline.run()
+        assert [item for item, _ in results] == ['a', 'b']
+        assert results[0][1] - start < 0.05
+
+    asyncio.run(run())
+
+
+def test_pipeline_cancel():
+    async def run():
+        results = []
+
+        async def source():
+            for idx in range(100):
+                await asyncio.sleep(0.01)
+                yield idx
+
+        pipeline = Pipeline([Source('source', source()), Sink('sink', results.append)])
+        task = asyncio.ensure_future(pipeline.run())
+        await asyncio.sleep(0.05)
+        pipeline.cancel()
+        assert await task is False
+        assert 0 < len(results) < 100
+
+    asyncio.run(run())
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+pytest.importorskip('simpleaudio')
+
+from utilities.sound_utilities import PlaybackScheduler
+
+
+def wait_until(predicate, timeout=1.0):
+    event = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if predicate():
+            return
+        event.wait(0.01)
+    raise TimeoutError
+
+
+def test_clips_played_in_order():
+    played = []
+    scheduler = PlaybackScheduler(lambda clip, on_done: (played.append(clip), on_done(True)))  # noqa: FBT003
+    futures = [scheduler.submit(i) for i in range(5)]
+    assert scheduler.all_done().result(timeout=1)
+    assert [f.result() for f in futures] == [True] * 5
+    assert played == list(range(5))
+    scheduler.close()
+
+
+def test_next_clip_waits_for_completion_callback():
+    pending = []
+    scheduler = PlaybackScheduler(lambda _clip, on_done: pending.append(on_done))
+    first = scheduler.submit('a')
+    second = scheduler.submit('b')
+    wait_until(lambda: len(pending) == 1)
+    assert len(pending) == 1
+    assert not second.done()
+    pending[0](True)  # noqa: FBT003
+    assert first.result(timeout=1)
+    wait_until(lambda: len(pending) == 2)
+    pending[1](True)  # noqa: FBT003
+    assert second.result(timeout=1)
+    scheduler.close()
+
+
+def test_cancel_flushes_and_stops():
+    pending = []
+
+    def stop():
+        for on_done in pending:
+            on_done(False)  # noqa: FBT003
+
+    scheduler = PlaybackScheduler(lambda _clip, on_done: pending.append(on_done), stop)
+    first = scheduler.submit('a')
+    second = scheduler.submit('b')
+    wait_until(lambda: len(pending) == 1)
+    scheduler.cancel()
+    assert first.result(timeout=1) is False
+    assert second.cancelled()
+    assert scheduler.all_done().result(timeout=1)
+    scheduler.close()
+
+
+def test_clip_passed_to_sink_during_cancel_is_stopped():
+    buffered = []
+
+    def stop():
+        for _, on_done in buffered:
+            on_done(False)  # noqa: FBT003
+        buffered.clear()
+
+    def sink(clip, on_done):
+        scheduler.cancel()  # NOTE: cancel() runs after the clip is taken from the queue, before the sink has it.
+        buffered.append((clip, on_done))
+
+    scheduler = PlaybackScheduler(sink, stop, max_in_flight=2)
+    assert scheduler.submit('a').result(timeout=1) is False
+    assert buffered == []
+    scheduler.close()
+
+
+def test_submit_after_close_is_cancelled():
+    scheduler = PlaybackScheduler(lambda _clip, on_done: on_done(True))  # noqa: FBT003
+    scheduler.close()
+    assert scheduler.submit('a').cancelled()
+    assert scheduler.all_done().result(timeout=1)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import time
+
+import pytest
+from utilities.profiler_utilities import SamplingProfiler
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profile_finds_busy_thread(tmp_path):
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop, args=(stop,), name='busy')
+    thread.start()
+    profiler = SamplingProfiler(0.005)
+    try:
+        asyncio.run(profiler.profile(0.3))
+    finally:
+        stop.set()
+        thread.join()
+
+    assert profiler.samples > 10
+    assert profiler.top_functions(1)[0][0].startswith('busy_loop (test_profiler.py:')
+    assert 'busy_loop' in profiler.summary()
+
+    profiler.write_collapsed(tmp_path / 'profile.collapsed')
+    lines = (tmp_path / 'profile.collapsed').read_text().splitlines()
+    assert any(line.startswith('busy;') and line.rsplit(' ', 1)[1].isdigit() for line in lines)
+
+
+def test_idle_threads_are_left_out_of_summary():
+    event = threading.Event()
+    thread = threading.Thread(target=event.wait, name='idle')
+    thread.start()
+    profiler = SamplingProfiler(0.005)
+    profiler.start()
+    time.sleep(0.1)
+    profiler.stop()
+    event.set()
+    thread.join()
+
+    assert any(stack[0] == 'idle' for stack in profiler.stacks)
+    assert all(not name.startswith('wait (threading.py:') for name, _, _ in profiler.top_functions())
+
+
+def test_start_twice_raises():
+    profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        with pytest.raises(RuntimeError):
+            profiler.start()
+    finally:
+        profiler.stop()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+from functools import partial
+
+from utilities.log_analysis_utilities import iter_log_lines, log_file_key
+from utilities.log_utilities import LogRotation, LogWriter
+from utilities.prompt_log_utilities import PromptDeltaEncoder, rebuild_prompts
+
+SYSTEM = {'role': 'system', 'content': 'あなたはのじゃロリです。'}
+
+
+def to_lines(encoded, time_str='2024-06-01 10:00:00'):
+    return [f'{time_str} [{status}] {text}' for status, text in encoded]
+
+
+def encode_lines(encoder, prompt, file_id):
+    return to_lines(encoder.encode(prompt, file_id))
+
+
+def test_messages_are_logged_once():
+    encoder = PromptDeltaEncoder()
+    first = encoder.encode([SYSTEM, {'role': 'user', 'content': 'こんにちは'}])
+    second = encoder.encode(
+        [SYSTEM, {'role': 'user', 'content': 'こんにちは'}, {'role': 'assistant', 'content': 'うむ'}],
+    )
+    assert [status for status, _ in first] == ['prompt:message', 'prompt:message', 'prompt']
+    assert [status for status, _ in second] == ['prompt:message', 'prompt']
+    assert f'base:{first[-1][1].split()[0][3:]}' in second[-1][1]
+
+
+def test_rebuild_prompts():
+    encoder = PromptDeltaEncoder()
+    prompts = [
+        [SYSTEM, {'role': 'user', 'content': 'a,\n"b"'}],
+        [SYSTEM, {'role': 'user', 'content': 'a,\n"b"'}, {'role': 'assistant', 'content': 'c'}],
+        [SYSTEM, {'role': 'user', 'content': 'd'}],
+    ]
+    lines = [line for prompt in prompts for line in to_lines(encoder.encode(prompt))]
+    assert [prompt for _, prompt in rebuild_prompts(lines)] == prompts
+
+
+def test_rebuild_legacy_prompts():
+    lines = [
+        '2024-06-01 10:00:00 [prompt] role:system content:x',
+        '2024-06-01 10:00:00 [prompt] role:user content:y',
+        '2024-06-01 10:00:00 [system] model_name:gpt-4o',
+        '2024-06-01 10:01:00 [prompt] role:system content:x',
+    ]
+    rebuilt = [prompt for _, prompt in rebuild_prompts(lines)]
+    assert rebuilt == [
+        [{'role': 'system', 'content': 'x'}, {'role': 'user', 'content': 'y'}],
+        [{'role': 'system', 'content': 'x'}],
+    ]
+
+
+def test_encoder_is_reset_per_file():
+    encoder = PromptDeltaEncoder()
+    prompt = [SYSTEM, {'role': 'user', 'content': 'a'}]
+    first = encoder.encode(prompt, 1)
+    prompt = [*prompt, {'role': 'assistant', 'content': 'b'}]
+    second = encoder.encode(prompt, 2)
+    assert [status for status, _ in second] == ['prompt:message'] * 3 + ['prompt']
+    assert 'base:-' in second[-1][1]
+    assert [p for _, p in rebuild_prompts(to_lines(second))] == [prompt]
+    assert len(first) == 3
+
+
+def test_rebuild_reports_missing_references():
+    encoder = PromptDeltaEncoder()
+    encoder.encode([SYSTEM])
+    lines = to_lines(encoder.encode([SYSTEM, {'role': 'user', 'content': 'a'}]))
+    rebuilt = [prompt for _, prompt in rebuild_prompts(lines)]
+    assert rebuilt[0][0]['role'] == 'missing'
+    assert rebuilt[0][0]['content'].startswith('base:')
+    assert rebuilt[0][1] == {'role': 'user', 'content': 'a'}
+
+
+def test_each_segment_is_rebuilt_when_rotated_while_queued(tmp_path):
+    log_file_name = tmp_path / '2024_0601.log'
+    encoder = PromptDeltaEncoder()
+    rotation = LogRotation(max_bytes=300, compression=None, retention_days=None)
+    writer = LogWriter(rotation=rotation)
+    writer._thread = object()  # NOTE: Do not start the writer thread, so all prompts are queued before writing.
+    prompt = [SYSTEM]
+    for idx in range(10):
+        prompt = [*prompt, {'role': 'user', 'content': f'質問{idx}'}]
+        writer.write_deferred(partial(encode_lines, encoder, prompt), str(log_file_name))
+
+    writer._thread = None
+    writer._start()
+    writer.close()
+    rotation.wait()
+    file_names = sorted(tmp_path.glob('*.log'), key=log_file_key)
+    assert len(file_names) > 2
+    for file_name in file_names:
+        rebuilt = [p for _, p in rebuild_prompts(iter_log_lines([file_name]))]
+        assert rebuilt
+        assert all(message['role'] != 'missing' for p in rebuilt for message in p)
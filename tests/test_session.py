@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from utilities.session_utilities import SessionManager
+
+
+def test_new_turn_cancels_running_turn():
+    async def scenario():
+        sessions = SessionManager()
+        stopped = []
+        first = await sessions.start('guild')
+        first.add_callback(lambda: stopped.append('playback'))
+
+        async def finish_first():
+            await asyncio.sleep(0)
+            assert first.is_cancelled
+            sessions.finish('guild', first)
+
+        task = asyncio.create_task(finish_first())
+        second = await sessions.start('guild')
+        await task
+        assert stopped == ['playback']
+        assert not second.is_cancelled
+        assert sessions.cancel('guild')
+        sessions.finish('guild', second)
+        assert not sessions.cancel('guild')
+
+    asyncio.run(scenario())
+
+
+def test_callback_added_after_cancel_is_called():
+    async def scenario():
+        sessions = SessionManager()
+        scope = await sessions.start('guild')
+        scope.cancel()
+        called = []
+        scope.add_callback(lambda: called.append(True))
+        assert called == [True]
+
+    asyncio.run(scenario())
+
+
+def test_cancel_only_the_turn_of_the_owner():
+    async def scenario():
+        sessions = SessionManager()
+        scope = await sessions.start('guild', 'alice')
+        assert not sessions.cancel('guild', 'bob')
+        assert not scope.is_cancelled
+        assert sessions.cancel('guild', 'alice')
+        assert scope.is_cancelled
+
+    asyncio.run(scenario())
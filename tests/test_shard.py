@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from utilities.shard_utilities import ShardConfig, split_shards
+
+
+def test_split_shards_round_robin():
+    assert split_shards(5, 2) == [[0, 2, 4], [1, 3]]
+    with pytest.raises(ValueError, match='number of processes'):
+        split_shards(2, 3)
+
+
+def test_shard_config_env_round_trip():
+    config = ShardConfig(is_sharded=True, shard_count=4, shard_ids=(1, 3), process_index=1)
+    environ = config.to_env()
+    assert environ == {'AICHAT_SHARD_COUNT': '4', 'AICHAT_SHARD_IDS': '1,3', 'AICHAT_PROCESS_INDEX': '1'}
+    assert ShardConfig.from_env(environ) == config
+    assert config.bot_options() == {'shard_count': 4, 'shard_ids': [1, 3]}
+    assert config.process_name() == 'p1'
+    assert ShardConfig.from_env({}) == ShardConfig()
+    assert ShardConfig.from_env({'AICHAT_SHARD_COUNT': 'auto'}).bot_options() == {}
+    with pytest.raises(ValueError, match='Invalid shard IDs'):
+        ShardConfig.from_env({'AICHAT_SHARD_COUNT': '2', 'AICHAT_SHARD_IDS': '2'})
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+import pytest
+from utilities.provider_utilities import get_llm_class, lazy_import
+from utilities.startup_utilities import StartupProfile
+
+
+def test_startup_profile_report():
+    profile = StartupProfile()
+    lines = [
+        'import time: self [us] | cumulative | imported package',
+        'import time:       200 |        200 |     yaml.error',
+        'import time:      1500 |       1700 |   yaml',
+        'import time:       300 |       2000 | utilities.config_utilities',
+        'aichat-startup: phase load config 0.250000',
+        'aichat-startup: ready',
+    ]
+    assert all(profile.feed(line) for line in lines)
+    assert not profile.feed('2024-01-01 INFO - other log')
+    assert profile.is_ready
+    assert [module for module, *_ in profile.imports] == ['yaml.error', 'yaml', 'utilities.config_utilities']
+    report = profile.report()
+    assert '0.002 sec  utilities.config_utilities' in report
+    assert '0.250 sec  load config' in report
+
+
+def test_lazy_import_and_provider_registry():
+    sys.modules.pop('colorsys', None)
+    module = lazy_import('colorsys')
+    assert module.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    with pytest.raises(ModuleNotFoundError):
+        lazy_import('aichat_not_installed_module')
+
+    with pytest.raises(ValueError, match='Invalid provider'):
+        get_llm_class('unknown')
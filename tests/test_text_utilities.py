@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from utilities.text_utilities import StreamingSegmenter, WordMarks
+
+TEXT = 'いろはにほへとちりぬるを！！？わかよたれそつねならむ。\nういのおくやまきょうこえて！\nあさきゆめみしえひもせす'  # noqa: RUF001
+
+
+def test_split_text_for_voice():
+    assert WordMarks().split_text_for_voice(TEXT) == [
+        'いろはにほへとちりぬるを！！？',  # noqa: RUF001
+        'わかよたれそつねならむ。',
+        'ういのおくやまきょうこえて！',  # noqa: RUF001
+        'あさきゆめみしえひもせす',
+    ]
+
+
+def test_split_text_keeps_new_line():
+    assert WordMarks().split_text(TEXT)[1] == 'わかよたれそつねならむ。\n'
+
+
+@pytest.mark.parametrize('chunk_len', [1, 2, 3, 7, 100])
+def test_chunk_boundaries_do_not_change_segments(chunk_len):
+    chunks = [TEXT[idx : idx + chunk_len] for idx in range(0, len(TEXT), chunk_len)]
+    segments = list(StreamingSegmenter().iter_segments(chunks))
+    assert segments == WordMarks().split_text_for_voice(TEXT)
+
+
+def test_segment_is_yielded_when_next_letter_arrives():
+    segmenter = StreamingSegmenter()
+    assert list(segmenter.feed('こんにちは。')) == []
+    assert list(segmenter.feed('げんき')) == ['こんにちは。']
+    assert list(segmenter.flush()) == ['げんき']
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import json
+from concurrent.futures import Future
+
+from utilities.trace_utilities import Tracer
+
+
+def read_events(trace_dir):
+    return [json.loads(line) for file_name in trace_dir.glob('*.jsonl') for line in file_name.read_text().splitlines()]
+
+
+def test_spans_are_written_as_jsonl(tmp_path):
+    tracer = Tracer(str(tmp_path))
+    tracer.open()
+    trace = tracer.start_trace(guild_id=1)
+    with trace.span('prompt_load'):
+        pass
+
+    span = trace.start_span('llm_ttft')
+    span.end()
+    span.end()
+    trace.event('token_chunk', length=3)
+    tracer.close()
+    events = read_events(tmp_path)
+    assert [event['name'] for event in events] == ['trace_start', 'prompt_load', 'llm_ttft', 'token_chunk']
+    assert {event['trace_id'] for event in events} == {trace.trace_id}
+    assert events[0]['guild_id'] == 1
+    assert events[3]['length'] == 3
+    assert all(event['duration_ms'] >= 0 for event in events)
+
+
+def test_playback_spans_and_gaps(tmp_path):
+    tracer = Tracer(str(tmp_path))
+    tracer.open()
+    trace = tracer.start_trace()
+    first, second, third = Future(), Future(), Future()
+    trace.playback(first)
+    trace.playback(second)
+    first.set_result(True)
+    second.set_result(True)
+    trace.playback(third)
+    third.cancel()
+    tracer.close()
+    events = read_events(tmp_path)
+    assert [event['name'] for event in events[1:]] == ['playback', 'playback', 'gap', 'playback']
+    assert events[2]['start_ms'] >= events[1]['start_ms'] + events[1]['duration_ms'] - 1e-6
+    assert events[-1]['played'] is False
+
+
+def test_disabled_tracer_writes_nothing(tmp_path):
+    tracer = Tracer(str(tmp_path / 'trace'), enabled=False)
+    tracer.open()
+    trace = tracer.start_trace()
+    trace.event('token_chunk')
+    trace.playback(Future())
+    tracer.close()
+    assert not (tmp_path / 'trace').exists()
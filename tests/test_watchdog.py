@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import utilities.metrics_utilities as metrics_util
+import utilities.watchdog_utilities as watchdog_util
+
+
+def block_loop(seconds):
+    time.sleep(seconds)
+
+
+def test_call_site_innermost_project_frame():
+    def inner():
+        return sys._getframe()
+
+    site, stack = watchdog_util.call_site(inner(), Path(__file__).parent)
+    assert site.startswith('inner (test_watchdog.py:')
+    assert stack[1].startswith('test_call_site_innermost_project_frame (test_watchdog.py:')
+
+    site, _ = watchdog_util.call_site(inner(), Path('/nonexistent'))
+    assert site == stack[0]
+    assert watchdog_util.call_site(None) == (watchdog_util.UNKNOWN_SITE, [])
+
+
+def test_watchdog_reports_blocking_call():
+    blocked = []
+    histogram = metrics_util.Histogram('lag', 'Lag.', buckets=metrics_util.LAG_BUCKETS)
+    watchdog = watchdog_util.LoopWatchdog(0.1, 0.02, lambda *args: blocked.append(args), histogram)
+
+    async def main():
+        task = asyncio.create_task(watchdog.run())
+        await asyncio.sleep(0.1)
+        block_loop(0.4)
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(main())
+    assert len(blocked) == 1
+    site, seconds, stack = blocked[0]
+    assert site.startswith('block_loop (test_watchdog.py:')
+    assert 0.3 < seconds < 1.0
+    assert any(name.startswith('main (test_watchdog.py:') for name in stack)
+    assert watchdog.counts[site] == 1
+    assert watchdog.blocked_time[site] == seconds
+    assert sum(histogram.labels().counts) > 5
+
+
+def test_watchdog_ignores_short_lag():
+    watchdog = watchdog_util.LoopWatchdog(0.1, 0.02)
+    watchdog.on_beat(0.05)
+    assert not watchdog.counts
+    watchdog.on_beat(0.2)
+    assert watchdog.counts[watchdog_util.UNKNOWN_SITE] == 1
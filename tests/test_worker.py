@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+from utilities.worker_utilities import WorkerPool
+
+
+def test_guilds_progress_independently():
+    async def run():
+        started = []
+        release = asyncio.Event()
+
+        async def handler(item):
+            key, name = item
+            started.append(name)
+            if key == 'slow':
+                await release.wait()
+
+        pool = WorkerPool(handler, max_concurrency=2)
+        pool.submit('slow', ('slow', 'a'))
+        pool.submit('slow', ('slow', 'b'))
+        pool.submit('fast', ('fast', 'c'))
+        pool.submit('fast', ('fast', 'd'))
+        await asyncio.sleep(0.05)
+        assert started == ['a', 'c', 'd']
+        assert pool.queue_depths() == {'slow': 2, 'fast': 0}
+        release.set()
+        await asyncio.sleep(0.05)
+        assert started == ['a', 'c', 'd', 'b']
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    ('policy', 'processed', 'rejected'),
+    [
+        ('drop_oldest', ['first', 'third'], ['second']),
+        ('merge', ['first', 'second+third'], []),
+        ('reply_busy', ['first', 'second'], ['third']),
+    ],
+)
+def test_overload_policy(policy, processed, rejected):
+    async def run():
+        done = []
+        dropped = []
+        release = asyncio.Event()
+
+        async def handler(item):
+            await release.wait()
+            done.append(item)
+
+        pool = WorkerPool(
+            handler,
+            max_queue=1,
+            policy=policy,
+            merge=lambda queued, item: f'{queued}+{item}',
+            on_rejected=dropped.append,
+        )
+        pool.submit('guild', 'first')
+        await asyncio.sleep(0)
+        assert pool.submit('guild', 'second')
+        assert pool.submit('guild', 'third') is (policy != 'reply_busy')
+        assert pool.overloads[policy] == 1
+        release.set()
+        await asyncio.sleep(0.05)
+        assert done == processed
+        assert dropped == rejected
+
+    asyncio.run(run())
+
+
+def test_idle_worker_exits():
+    async def run():
+        async def handler(_item):
+            return
+
+        pool = WorkerPool(handler, idle_timeout=0.01)
+        pool.submit('guild', 'item')
+        await asyncio.sleep(0.1)
+        assert pool.workers == {}
+
+    asyncio.run(run())